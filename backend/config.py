@@ -14,6 +14,14 @@ class Settings:
     
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
+    # Процессы-воркеры (0 — по числу ядер) и время на завершение текущих ответов при SIGTERM
+    WEB_WORKERS: int = int(os.getenv("WEB_WORKERS", "0"))
+    SHUTDOWN_DRAIN_TIMEOUT: float = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))
+    
+    # Метрики Prometheus на /metrics; каталог снимков воркеров задаёт backend.server при нескольких воркерах
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_MULTIPROC_DIR: str = os.getenv("METRICS_MULTIPROC_DIR", "")
+    METRICS_FLUSH_INTERVAL: float = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
     
     CORS_ORIGINS: list = [
         "http://localhost:5173",
@@ -24,12 +32,113 @@ class Settings:
     
     WHISPER_MODEL: str = "whisper-1"
     GPT_MODEL: str = "gpt-4"
+    LLM_STREAMING: bool = os.getenv("LLM_STREAMING", "true").lower() == "true"
+    
+    # Кэш ответов GPT на запросы без истории разговора. Кэш в памяти у каждого воркера свой
+    # (не общий через STATE_BACKEND): при нескольких воркерах повторный запрос попадает в кэш,
+    # только если пришёл в тот же воркер. Запросы о дате, времени, новостях и курсах не кэшируются
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL: float = float(os.getenv("LLM_CACHE_TTL", "3600"))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+    # Поиск похожих запросов в кэше LLM: выключен, по умолчанию только точное совпадение
+    LLM_CACHE_SIMILAR_ENABLED: bool = os.getenv("LLM_CACHE_SIMILAR_ENABLED", "false").lower() == "true"
+    LLM_CACHE_SIMILARITY: float = float(os.getenv("LLM_CACHE_SIMILARITY", "0.95"))
+    
+    SESSION_MAX_MESSAGES: int = int(os.getenv("SESSION_MAX_MESSAGES", "10"))
+    SESSION_MAX_BYTES: int = int(os.getenv("SESSION_MAX_BYTES", "32768"))
+    SESSION_STORE_MAX_MB: int = int(os.getenv("SESSION_STORE_MAX_MB", "64"))
+    SESSION_IDLE_TTL: float = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+    
+    # Общее состояние воркеров (история, соединения, рассылка): memory, sqlite или redis
+    STATE_BACKEND: str = os.getenv("STATE_BACKEND", "memory")
+    STATE_SQLITE_PATH: str = os.getenv("STATE_SQLITE_PATH", "data/state.db")
+    STATE_REDIS_URL: str = os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0")
+    STATE_REDIS_PREFIX: str = os.getenv("STATE_REDIS_PREFIX", "jarvis")
+    STATE_BROADCAST_POLL_MS: int = int(os.getenv("STATE_BROADCAST_POLL_MS", "200"))
+    
+    # Напоминания: файл SQLite (общий для воркеров хоста), час для "завтра" без времени, размер страницы списка
+    REMINDER_DB_PATH: str = os.getenv("REMINDER_DB_PATH", "data/reminders.db")
+    REMINDER_DEFAULT_HOUR: int = int(os.getenv("REMINDER_DEFAULT_HOUR", "9"))
+    REMINDER_PAGE_SIZE: int = int(os.getenv("REMINDER_PAGE_SIZE", "20"))
+    REMINDER_PAGE_MAX: int = int(os.getenv("REMINDER_PAGE_MAX", "100"))
+    
+    TTS_PIPELINE: bool = os.getenv("TTS_PIPELINE", "false").lower() == "true"
+    TTS_MAX_IN_FLIGHT: int = int(os.getenv("TTS_MAX_IN_FLIGHT", "3"))
+    
+    # base64 — аудио внутри JSON (data URI), binary — бинарные кадры WebSocket и ссылки /api/audio/{id}
+    AUDIO_DELIVERY: str = os.getenv("AUDIO_DELIVERY", "base64")
+    AUDIO_STORE_TTL: float = float(os.getenv("AUDIO_STORE_TTL", "300"))
+    AUDIO_STORE_MAX_MB: int = int(os.getenv("AUDIO_STORE_MAX_MB", "64"))
+    # Общий каталог для ссылок /api/audio/{id} при нескольких воркерах; пусто — память процесса
+    AUDIO_STORE_DIR: str = os.getenv("AUDIO_STORE_DIR", "")
+    
+    TTS_CACHE_ENABLED: bool = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+    TTS_CACHE_MEMORY_MB: int = int(os.getenv("TTS_CACHE_MEMORY_MB", "64"))
+    TTS_CACHE_DIR: str = os.getenv("TTS_CACHE_DIR", "cache/tts")
+    TTS_CACHE_DISK_MB: int = int(os.getenv("TTS_CACHE_DISK_MB", "512"))
+    TTS_CACHE_PREWARM: bool = os.getenv("TTS_CACHE_PREWARM", "true").lower() == "true"
+    
+    HTTP_POOL_LIMIT: int = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+    HTTP_POOL_LIMIT_PER_HOST: int = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+    HTTP_KEEPALIVE_TIMEOUT: float = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+    HTTP_DNS_CACHE_TTL: int = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+    ELEVENLABS_TIMEOUT: float = float(os.getenv("ELEVENLABS_TIMEOUT", "30"))
+    OPENWEATHERMAP_TIMEOUT: float = float(os.getenv("OPENWEATHERMAP_TIMEOUT", "5"))
+    
+    INTENT_FUZZY_ENABLED: bool = os.getenv("INTENT_FUZZY_ENABLED", "true").lower() == "true"
+    INTENT_FUZZY_THRESHOLD: float = float(os.getenv("INTENT_FUZZY_THRESHOLD", "0.7"))
+    INTENT_FUZZY_MARGIN: float = float(os.getenv("INTENT_FUZZY_MARGIN", "0.05"))
+    
+    WEATHER_DEFAULT_CITY: str = os.getenv("WEATHER_DEFAULT_CITY", "Moscow")
+    WEATHER_DEFAULT_CITY_LABEL: str = os.getenv("WEATHER_DEFAULT_CITY_LABEL", "Москве")
+    WEATHER_UNITS: str = os.getenv("WEATHER_UNITS", "metric")
+    WEATHER_CACHE_TTL: float = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+    WEATHER_CACHE_STALE_TTL: float = float(os.getenv("WEATHER_CACHE_STALE_TTL", "1800"))
     
     MAX_AUDIO_DURATION: int = 30
     SAMPLE_RATE: int = 16000
     
+    # Серверная детекция речи для потока сырого PCM (int16, SAMPLE_RATE, моно)
+    VAD_ENABLED: bool = os.getenv("VAD_ENABLED", "false").lower() == "true"
+    VAD_THRESHOLD_DB: float = float(os.getenv("VAD_THRESHOLD_DB", "-45"))
+    VAD_MIN_SPEECH_MS: int = int(os.getenv("VAD_MIN_SPEECH_MS", "120"))
+    VAD_HANGOVER_MS: int = int(os.getenv("VAD_HANGOVER_MS", "500"))
+    # Barge-in: начало речи пользователя (по VAD) прерывает текущий ответ ассистента
+    BARGE_IN_ENABLED: bool = os.getenv("BARGE_IN_ENABLED", "true").lower() == "true"
+    
+    # Телеметрия громкости: не чаще одного сообщения за интервал; "json", "binary" или "off"
+    TELEMETRY_INTERVAL_MS: int = int(os.getenv("TELEMETRY_INTERVAL_MS", "40"))
+    TELEMETRY_FORMAT: str = os.getenv("TELEMETRY_FORMAT", "json")
+    
+    # Протокол WebSocket по умолчанию: "json" или "msgpack" (клиент может выбрать ?protocol= или hello)
+    WS_PROTOCOL: str = os.getenv("WS_PROTOCOL", "json")
+    
+    # Исходящие очереди WebSocket: размер, ожидание места для важных сообщений
+    # и типы сообщений, которые при переполнении отбрасываются
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    WS_SEND_BLOCK_TIMEOUT: float = float(os.getenv("WS_SEND_BLOCK_TIMEOUT", "5"))
+    WS_DROPPABLE_TYPES: set = {
+        msg_type.strip()
+        for msg_type in os.getenv("WS_DROPPABLE_TYPES", "volume,partial_transcription").split(",")
+        if msg_type.strip()
+    }
+    
+    # Потоковое распознавание Vosk для каждого соединения (требует поток сырого PCM)
+    STREAMING_ASR_ENABLED: bool = os.getenv("STREAMING_ASR_ENABLED", "false").lower() == "true"
+    VOSK_MODEL_PATH: str = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-ru")
+    
+    # Пул процессов локального распознавания (0 — распознавать в потоке основного процесса)
+    ASR_POOL_SIZE: int = int(os.getenv("ASR_POOL_SIZE", str(os.cpu_count() or 1)))
+    ASR_QUEUE_SIZE: int = int(os.getenv("ASR_QUEUE_SIZE", "16"))
+    ASR_JOB_TIMEOUT: float = float(os.getenv("ASR_JOB_TIMEOUT", "10"))
+    
+    # Хеджирование: Whisper запускается параллельно, если локальный движок медлит или не уверен
+    ASR_HEDGE_ENABLED: bool = os.getenv("ASR_HEDGE_ENABLED", "false").lower() == "true"
+    ASR_HEDGE_DELAY: float = float(os.getenv("ASR_HEDGE_DELAY", "1.0"))
+    ASR_MIN_CONFIDENCE: float = float(os.getenv("ASR_MIN_CONFIDENCE", "0.6"))
+    
     LANGUAGE: str = os.getenv("LANGUAGE", "ru")
-
+    
     @staticmethod
     def validate_api_keys() -> tuple[bool, list[str]]:
         missing_keys = []
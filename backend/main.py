@@ -1,11 +1,14 @@
 import asyncio
 import logging
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import json
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import base64
+import uuid
+import secrets
+from contextlib import aclosing
 from datetime import datetime
-from typing import Dict, Set
+from typing import AsyncIterator, Dict, Optional, Set
 
 from backend.config import settings
 from backend.models import CommandRequest, CommandResponse
@@ -14,16 +17,44 @@ from backend.services import (
     SpeechRecognizer,
     CommandProcessor,
     LLMHandler,
-    TextToSpeech
+    TextToSpeech,
+    SpeechPipeline,
+    SentenceSplitter,
+    TTSCache,
+    AudioStore,
+    StreamingVAD,
+    StreamingRecognizer,
+    OpusStreamDecoder,
+    http_client
 )
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from backend.services.command_processor import CommandResult
+from backend.services.audio_delivery import pack_audio_frame, parse_range_header, iter_audio_chunks
+from backend.services.opus_ingest import is_compressed_audio
+from backend.services.dsp import PolyphaseResampler, pcm_samples
+from backend.services.telemetry import VolumeTelemetry
+from backend.services.connection_writer import ConnectionWriter, SlowConsumer
+from backend.services.connection_tasks import ConnectionTasks
+from backend.services.ws_codec import JSON_CODEC, MESSAGE_TYPES, create_codec
+from backend.services.state_backend import StateBackend, create_state_backend, worker_id
+from backend.services.reminders import Reminder, create_reminder_scheduler
+from backend.services.metrics import (
+    ACTIVE_CONNECTIONS,
+    ASR_TRANSCRIPTIONS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    STAGE_DURATION,
+    TURNS_IN_FLIGHT,
+    MultiprocessExporter,
+    registry as metrics_registry,
 )
+from backend.services.request_context import RequestIdMiddleware, configure_logging, new_request_id, request_id
+from backend.services.streaming_recognition import load_vosk_model
+
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Jarvis AI Assistant API", version="1.0.0")
+# Во время плавной остановки новые соединения отклоняются (см. drain)
+app.state.draining = False
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,50 +63,278 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
 
 audio_processor = AudioProcessor(sample_rate=settings.SAMPLE_RATE)
 speech_recognizer = SpeechRecognizer()
-command_processor = CommandProcessor()
-llm_handler = LLMHandler()
-text_to_speech = TextToSpeech()
+# История, реестр соединений и рассылка общие для всех воркеров
+state_backend = create_state_backend()
+reminder_scheduler = create_reminder_scheduler()
+command_processor = CommandProcessor(reminders=reminder_scheduler)
+llm_handler = LLMHandler(state=state_backend)
+tts_cache = TTSCache(
+    max_memory_bytes=settings.TTS_CACHE_MEMORY_MB * 1024 * 1024,
+    cache_dir=settings.TTS_CACHE_DIR or None,
+    max_disk_bytes=settings.TTS_CACHE_DISK_MB * 1024 * 1024,
+) if settings.TTS_CACHE_ENABLED else None
+text_to_speech = TextToSpeech(cache=tts_cache)
+speech_pipeline = SpeechPipeline(text_to_speech, max_in_flight=settings.TTS_MAX_IN_FLIGHT)
+# С несколькими воркерами аудио лежит в общем каталоге (его задаёт backend.server)
+audio_store = AudioStore(
+    ttl=settings.AUDIO_STORE_TTL,
+    max_bytes=settings.AUDIO_STORE_MAX_MB * 1024 * 1024,
+    directory=settings.AUDIO_STORE_DIR or None,
+)
 
-active_connections: Set[WebSocket] = set()
 
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, state: StateBackend):
+        # Сокеты есть только у своего воркера; реестр и рассылка идут через общий бэкенд
+        self.state = state
         self.active_connections: Dict[str, WebSocket] = {}
+        self.audio_delivery: Dict[str, str] = {}
+        # У каждого соединения своя задача записи с ограниченной очередью
+        self.writers: Dict[str, ConnectionWriter] = {}
+        # Владелец напоминаний соединения (постоянный id устройства) и его соединения на воркере
+        self.owners: Dict[str, str] = {}
+        self.owner_clients: Dict[str, Set[str]] = {}
+        self.slow_consumer_disconnects = 0
+        self.broadcast_dropped = 0
+        self._pending_deliveries: Set[asyncio.Task] = set()
     
-    async def connect(self, websocket: WebSocket, client_id: str):
+    async def connect(self, websocket: WebSocket, client_id: str, audio_delivery: str = "base64", protocol: str = "json", owner: Optional[str] = None):
         await websocket.accept()
         self.active_connections[client_id] = websocket
-        logger.info(f"Client {client_id} connected")
+        self.audio_delivery[client_id] = audio_delivery
+        owner = owner or client_id
+        self.owners[client_id] = owner
+        self.owner_clients.setdefault(owner, set()).add(client_id)
+        writer = ConnectionWriter(
+            websocket,
+            client_id,
+            max_queue=settings.WS_SEND_QUEUE_SIZE,
+            block_timeout=settings.WS_SEND_BLOCK_TIMEOUT,
+            drop_types=settings.WS_DROPPABLE_TYPES,
+            codec=create_codec(protocol) or JSON_CODEC,
+        )
+        writer.start()
+        self.writers[client_id] = writer
+        await self.state.register_connection(client_id)
+        logger.info(f"Client {client_id} connected (audio delivery: {audio_delivery}, protocol: {writer.codec.name})")
     
     def disconnect(self, client_id: str):
         if client_id in self.active_connections:
             del self.active_connections[client_id]
+            self.audio_delivery.pop(client_id, None)
+            owner = self.owners.pop(client_id, client_id)
+            clients = self.owner_clients.get(owner)
+            if clients is not None:
+                clients.discard(client_id)
+                if not clients:
+                    del self.owner_clients[owner]
+            writer = self.writers.pop(client_id, None)
+            if writer is not None:
+                writer.stop()
             logger.info(f"Client {client_id} disconnected")
     
     async def send_message(self, client_id: str, message: dict):
-        if client_id in self.active_connections:
-            await self.active_connections[client_id].send_json(message)
+        writer = self.writers.get(client_id)
+        if writer is None:
+            return
+        await self._enqueue(client_id, writer.encode(message), message.get("type", ""))
+    
+    async def send_bytes(self, client_id: str, data: bytes, msg_type: str = "audio"):
+        await self._enqueue(client_id, data, msg_type)
+    
+    async def _enqueue(self, client_id: str, frame, msg_type: str):
+        writer = self.writers.get(client_id)
+        if writer is None:
+            return
+        try:
+            await writer.send(frame, msg_type)
+        except SlowConsumer as e:
+            logger.warning(str(e))
+            await self.drop_slow_consumer(client_id)
+    
+    async def drop_slow_consumer(self, client_id: str):
+        writer = self.writers.get(client_id)
+        self.slow_consumer_disconnects += 1
+        self.disconnect(client_id)
+        if writer is not None:
+            await writer.abort()
+    
+    def is_congested(self, client_id: str) -> bool:
+        writer = self.writers.get(client_id)
+        return writer is not None and writer.is_congested()
+    
+    def owner(self, client_id: str) -> str:
+        return self.owners.get(client_id, client_id)
+    
+    def uses_binary_audio(self, client_id: str) -> bool:
+        return self.audio_delivery.get(client_id) == "binary"
+    
+    def codec(self, client_id: str):
+        writer = self.writers.get(client_id)
+        return writer.codec if writer is not None else JSON_CODEC
+    
+    def set_protocol(self, client_id: str, protocol: str):
+        """Переключает протокол соединения; неизвестный или недоступный оставляет текущий"""
+        writer = self.writers.get(client_id)
+        codec = create_codec(protocol)
+        if writer is not None and codec is not None:
+            writer.codec = codec
+        return self.codec(client_id)
     
     async def broadcast(self, message: dict):
-        for connection in self.active_connections.values():
-            await connection.send_json(message)
+        """Раздача всем клиентам всех воркеров"""
+        await self.state.publish(message)
+    
+    async def deliver(self, message: dict, client_id: Optional[str] = None):
+        """Доставка рассылки клиентам этого воркера; client_id — только одному, если он здесь"""
+        if client_id is not None:
+            if client_id in self.writers:
+                await self.send_message(client_id, message)
+            return
+        self.broadcast_local(message)
+    
+    def broadcast_local(self, message: dict):
+        """
+        Раздача клиентам воркера без ожидания отдельных сокетов: сообщение кодируется
+        один раз на протокол и кладётся в очереди. Отбрасываемое сообщение при полной
+        очереди теряется; остальные дожидаются места в фоне, не задерживая других клиентов.
+        """
+        msg_type = message.get("type", "")
+        frames = {}
+        for client_id, writer in list(self.writers.items()):
+            frame = frames.get(writer.codec.name)
+            if frame is None:
+                frame = frames[writer.codec.name] = writer.encode(message)
+            if writer.offer(frame, msg_type):
+                continue
+            if msg_type in writer.drop_types:
+                self.broadcast_dropped += 1
+                continue
+            task = asyncio.create_task(self._enqueue(client_id, frame, msg_type))
+            self._pending_deliveries.add(task)
+            task.add_done_callback(self._pending_deliveries.discard)
+    
+    def stats(self) -> dict:
+        writers = list(self.writers.values())
+        dropped: Dict[str, int] = {}
+        for writer in writers:
+            for msg_type, count in writer.dropped.items():
+                dropped[msg_type] = dropped.get(msg_type, 0) + count
+        return {
+            "connections": len(writers),
+            "queued": sum(writer.depth for writer in writers),
+            "max_depth": max((writer.depth for writer in writers), default=0),
+            "high_water": max((writer.high_water for writer in writers), default=0),
+            "dropped": dropped,
+            "broadcast_dropped": self.broadcast_dropped,
+            "broadcast_waiting": len(self._pending_deliveries),
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+        }
+
+
+manager = ConnectionManager(state_backend)
+
+vad_sessions: Dict[str, StreamingVAD] = {}
+streaming_recognizers: Dict[str, StreamingRecognizer] = {}
+audio_decoders: Dict[str, OpusStreamDecoder] = {}
+uplink_resamplers: Dict[str, PolyphaseResampler] = {}
+volume_meters: Dict[str, VolumeTelemetry] = {}
+connection_tasks: Dict[str, ConnectionTasks] = {}
+
+ACTIVE_CONNECTIONS.set_function(lambda: len(manager.active_connections))
+TURNS_IN_FLIGHT.set_function(lambda: sum(tasks.busy for tasks in connection_tasks.values()))
+# С несколькими воркерами /metrics суммирует снимки всех (каталог задаёт backend.server)
+metrics_exporter = MultiprocessExporter(
+    metrics_registry,
+    settings.METRICS_MULTIPROC_DIR,
+    interval=settings.METRICS_FLUSH_INTERVAL,
+) if settings.METRICS_MULTIPROC_DIR else None
 
 
-manager = ConnectionManager()
+def create_vad() -> StreamingVAD:
+    return StreamingVAD(
+        sample_rate=settings.SAMPLE_RATE,
+        threshold_db=settings.VAD_THRESHOLD_DB,
+        min_speech_ms=settings.VAD_MIN_SPEECH_MS,
+        hangover_ms=settings.VAD_HANGOVER_MS,
+        max_utterance_s=settings.MAX_AUDIO_DURATION,
+    )
+
+
+# Допустимые частоты дискретизации сырого PCM от клиента (?rate=)
+UPLINK_RATE_RANGE = (8000, 192000)
+
+
+def parse_uplink_rate(value: Optional[str]) -> Optional[int]:
+    """Частота из параметра запроса или None, если она не число или вне UPLINK_RATE_RANGE"""
+    if value is None:
+        return settings.SAMPLE_RATE
+    try:
+        rate = int(value)
+    except ValueError:
+        return None
+    low, high = UPLINK_RATE_RANGE
+    return rate if low <= rate <= high else None
+
+
+def parse_owner(value: Optional[str]) -> Optional[str]:
+    """Постоянный id владельца напоминаний из параметра запроса (как X-Request-ID: печатный, до 64 символов)"""
+    if value and len(value) <= 64 and value.isprintable():
+        return value
+    return None
+
+
+FALLBACK_RESPONSE = "Извините, не могу обработать этот запрос."
 
 
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting Jarvis AI Assistant API")
+    await http_client.start()
+    await state_backend.start(on_broadcast)
+    # Воркер планирует только напоминания подключённых к нему владельцев
+    await reminder_scheduler.start(
+        deliver_reminders,
+        announce=announce_reminder,
+        accepts=lambda owner: bool(manager.owner_clients.get(owner)),
+    )
+    if metrics_exporter is not None:
+        await metrics_exporter.start()
+    # Модели загружаются до того, как воркер начнёт принимать соединения
+    if speech_recognizer.asr_pool is not None:
+        await speech_recognizer.asr_pool.start()
+    else:
+        await asyncio.to_thread(speech_recognizer.fast_recognizer.preload_models)
+    if settings.STREAMING_ASR_ENABLED:
+        await asyncio.to_thread(load_vosk_model, settings.VOSK_MODEL_PATH)
     is_valid, missing_keys = settings.validate_api_keys()
     if not is_valid:
         logger.warning(f"Missing API keys: {', '.join(missing_keys)}")
     else:
         logger.info("All required API keys are configured")
+    
+    if tts_cache is not None and settings.TTS_CACHE_PREWARM:
+        # Прогрев идёт в фоне, чтобы не задерживать приём соединений
+        app.state.tts_prewarm_task = asyncio.create_task(text_to_speech.prewarm(
+            command_processor.get_static_responses() + [FALLBACK_RESPONSE]
+        ))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("Shutting down Jarvis AI Assistant API")
+    await http_client.close()
+    await reminder_scheduler.close()
+    await state_backend.close()
+    if metrics_exporter is not None:
+        await metrics_exporter.close()
+    if speech_recognizer.asr_pool is not None:
+        await speech_recognizer.asr_pool.close()
 
 
 @app.get("/")
@@ -89,6 +348,9 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    if app.state.draining:
+        # Балансировщик перестаёт направлять сюда новых клиентов
+        return JSONResponse(status_code=503, content={"status": "draining"})
     is_valid, missing_keys = settings.validate_api_keys()
     return {
         "status": "healthy" if is_valid else "degraded",
@@ -98,21 +360,97 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    others = await metrics_exporter.collect() if metrics_exporter is not None else []
+    return Response(content=metrics_registry.render(others), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/api/stats")
+async def service_stats():
+    return {
+        "tts_cache": tts_cache.stats() if tts_cache is not None else {"enabled": False},
+        "weather_cache": command_processor.weather_cache.stats(),
+        "sessions": await state_backend.stats(),
+        "reminders": {**await reminder_scheduler.store.stats(), **reminder_scheduler.stats()},
+        "llm_cache": llm_handler.response_cache.stats() if llm_handler.response_cache is not None else {"enabled": False},
+        "asr": speech_recognizer.stats(),
+        "telemetry": {
+            key: sum(meter.stats()[key] for meter in volume_meters.values())
+            for key in ("frames", "sent", "dropped")
+        },
+        "outbound": manager.stats(),
+        "turns": {
+            key: sum(tasks.stats()[key] for tasks in connection_tasks.values())
+            for key in ("turns", "cancelled", "failed", "busy")
+        },
+        "active_connections": len(manager.active_connections),
+    }
+
+
+@app.get("/api/audio/{audio_id}")
+async def get_audio(audio_id: str, request: Request):
+    entry = await audio_store.get(audio_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Audio not found or expired")
+    
+    audio, content_type = entry
+    size = len(audio)
+    start, end = 0, size - 1
+    status_code = 200
+    
+    range_header = request.headers.get("range")
+    if range_header:
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+    
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+        "Cache-Control": f"private, max-age={int(settings.AUDIO_STORE_TTL)}",
+    }
+    if status_code == 206:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    
+    return StreamingResponse(
+        iter_audio_chunks(audio, start, end),
+        status_code=status_code,
+        media_type=content_type,
+        headers=headers
+    )
+
+
 @app.post("/api/command")
 async def process_command(request: CommandRequest) -> CommandResponse:
     try:
-        response_text, command_type = await command_processor.process_command(request.command)
+        session_id = request.session_id or secrets.token_urlsafe(16)
+        result = await command_processor.process_command_detailed(request.command, owner=session_id)
+        response_text = result.response
         
-        if command_type == "gpt":
-            gpt_response = await llm_handler.get_response(request.command)
-            response_text = gpt_response if gpt_response else "Извините, не могу обработать этот запрос."
+        if result.command_type == "gpt":
+            gpt_response = await llm_handler.get_response(
+                request.command,
+                session_id=session_id,
+                use_cache=not request.no_cache
+            )
+            response_text = gpt_response if gpt_response else FALLBACK_RESPONSE
         
-        audio_base64 = await text_to_speech.synthesize_speech_base64(response_text)
+        audio_data = await text_to_speech.synthesize_speech(response_text)
         
         return CommandResponse(
             response=response_text,
-            audio_url=f"data:audio/mpeg;base64,{audio_base64}" if audio_base64 else None,
-            command_type=command_type,
+            audio_url=await make_audio_url(audio_data, settings.AUDIO_DELIVERY == "binary"),
+            command_type=result.command_type,
+            intent=result.intent,
+            intent_score=result.score,
+            session_id=session_id,
             timestamp=datetime.now()
         )
     except Exception as e:
@@ -122,95 +460,335 @@ async def process_command(request: CommandRequest) -> CommandResponse:
 
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
-    await manager.connect(websocket, client_id)
+    if app.state.draining:
+        # Воркер останавливается: клиент переподключится к другому (1012 — Service Restart)
+        await websocket.close(code=1012)
+        return
+    
+    # Сырой PCM с другой частотой дискретизации (?rate=48000) пересчитывается в SAMPLE_RATE;
+    # проверяется до регистрации соединения, чтобы отказ не оставлял его в manager
+    uplink_rate = parse_uplink_rate(websocket.query_params.get("rate"))
+    if uplink_rate is None:
+        logger.warning(f"Rejecting client {client_id}: invalid rate {websocket.query_params.get('rate')!r}")
+        # 1008 — Policy Violation
+        await websocket.close(code=1008)
+        return
+    
+    audio_delivery = websocket.query_params.get("audio", settings.AUDIO_DELIVERY)
+    protocol = websocket.query_params.get("protocol", settings.WS_PROTOCOL)
+    # client_id новый при каждой загрузке страницы, поэтому напоминания привязаны
+    # к постоянному id устройства (?owner=), если клиент его передал
+    owner = parse_owner(websocket.query_params.get("owner")) or client_id
+    await manager.connect(websocket, client_id, audio_delivery=audio_delivery, protocol=protocol, owner=owner)
+    
+    if websocket.query_params.get("vad", "1" if settings.VAD_ENABLED else "0") == "1":
+        vad_sessions[client_id] = create_vad()
+    
+    # ?asr=batch может только отключить потоковое распознавание: включает его настройка сервера,
+    # при которой модель загружается при старте воркера
+    if settings.STREAMING_ASR_ENABLED and websocket.query_params.get("asr", "stream") == "stream":
+        recognizer = await StreamingRecognizer.create(settings.VOSK_MODEL_PATH, settings.SAMPLE_RATE)
+        if recognizer is not None:
+            streaming_recognizers[client_id] = recognizer
+    
+    if uplink_rate != settings.SAMPLE_RATE:
+        uplink_resamplers[client_id] = PolyphaseResampler(uplink_rate, settings.SAMPLE_RATE)
+    
+    telemetry_format = websocket.query_params.get("telemetry", settings.TELEMETRY_FORMAT)
+    if telemetry_format != "off":
+        volume_meters[client_id] = VolumeTelemetry(
+            interval=settings.TELEMETRY_INTERVAL_MS / 1000,
+            binary=telemetry_format == "binary",
+        )
+    
+    connection_tasks[client_id] = ConnectionTasks(client_id)
+    
+    # Напоминания, наступившие, пока владелец был не в сети; будущие планируются на этом воркере
+    await deliver_reminders(owner)
+    await reminder_scheduler.watch(owner)
     
     try:
+        # Цикл только читает и раздаёт работу: ходы диалога выполняются задачами
+        # ConnectionTasks, поэтому кадры и команды читаются и во время ответа
         while True:
             data = await websocket.receive()
             
-            if "text" in data:
-                message = json.loads(data["text"])
+            if data["type"] == "websocket.disconnect":
+                logger.info(f"Client {client_id} disconnected")
+                break
+            
+            if data.get("text") is not None:
+                # Текстовые кадры всегда JSON: так можно прислать hello до переключения
+                message = JSON_CODEC.decode(data["text"])
                 await handle_websocket_message(websocket, client_id, message)
             
-            elif "bytes" in data:
-                audio_data = data["bytes"]
-                await handle_audio_data(websocket, client_id, audio_data)
-                
+            elif data.get("bytes") is not None:
+                codec = manager.codec(client_id)
+                if not codec.binary:
+                    await handle_audio_data(websocket, client_id, data["bytes"])
+                    continue
+                # В бинарном протоколе каждый кадр — сообщение, аудио приходит как {audio: bytes}
+                message = codec.decode(data["bytes"])
+                if message["type"] == "audio":
+                    await handle_audio_data(websocket, client_id, message["data"])
+                else:
+                    await handle_websocket_message(websocket, client_id, message)
+    
     except WebSocketDisconnect:
-        manager.disconnect(client_id)
         logger.info(f"Client {client_id} disconnected")
     except Exception as e:
         logger.error(f"WebSocket error for client {client_id}: {e}")
+    finally:
         manager.disconnect(client_id)
+        tasks = connection_tasks.pop(client_id, None)
+        if tasks is not None:
+            tasks.close()
+        vad_sessions.pop(client_id, None)
+        streaming_recognizers.pop(client_id, None)
+        audio_decoders.pop(client_id, None)
+        uplink_resamplers.pop(client_id, None)
+        volume_meters.pop(client_id, None)
+        await state_backend.unregister_connection(client_id)
 
 
 async def handle_websocket_message(websocket: WebSocket, client_id: str, message: dict):
     msg_type = message.get("type")
     
-    if msg_type == "text":
+    if msg_type == "hello":
+        # Ответ уже в выбранном протоколе: JSON приходит текстовым кадром, MessagePack — бинарным
+        protocol = (message.get("data") or {}).get("protocol", JSON_CODEC.name)
+        codec = manager.set_protocol(client_id, protocol)
+        await manager.send_message(client_id, {
+            "type": "hello",
+            "data": {"protocol": codec.name, "types": MESSAGE_TYPES}
+        })
+    
+    elif msg_type == "text":
         command_text = message.get("data", {}).get("text", "")
+        use_cache = not message.get("data", {}).get("no_cache", False)
         
         await manager.send_message(client_id, {
             "type": "status",
             "data": {"status": "processing", "message": "Обрабатываю команду..."}
         })
         
-        response_text, command_type = await command_processor.process_command(command_text)
-        
-        if command_type == "gpt":
-            gpt_response = await llm_handler.get_response(command_text)
-            response_text = gpt_response if gpt_response else "Извините, не могу обработать этот запрос."
-        
-        audio_base64 = await text_to_speech.synthesize_speech_base64(response_text)
-        
-        await manager.send_message(client_id, {
-            "type": "response",
-            "data": {
-                "text": response_text,
-                "audio": f"data:audio/mpeg;base64,{audio_base64}" if audio_base64 else None,
-                "command_type": command_type,
-                "timestamp": datetime.now().isoformat()
-            }
-        })
+        start_turn(client_id, respond_to_command(client_id, command_text, use_cache=use_cache))
     
     elif msg_type == "control":
         action = message.get("data", {}).get("action")
         
-        if action == "clear_history":
-            llm_handler.clear_history()
+        if action == "cancel":
+            await cancel_turn(client_id)
+        
+        elif action == "clear_history":
+            await llm_handler.clear_history(client_id)
             await manager.send_message(client_id, {
                 "type": "status",
                 "data": {"status": "success", "message": "История очищена"}
             })
         
         elif action == "get_reminders":
-            reminders = command_processor.get_reminders()
+            data = message.get("data", {})
+            try:
+                page = await command_processor.get_reminders(manager.owner(client_id), limit=data.get("limit"), cursor=data.get("cursor"))
+            except ValueError as e:
+                # Неверные limit/cursor от клиента не должны закрывать соединение
+                await manager.send_message(client_id, {
+                    "type": "error",
+                    "data": {"error": str(e)}
+                })
+                return
             await manager.send_message(client_id, {
                 "type": "reminders",
-                "data": {"reminders": reminders}
+                "data": page
             })
 
 
+async def deliver_reminders(owner: str):
+    """
+    Наступившие напоминания владельца уходят всем его соединениям на этом воркере.
+    Без соединений они не забираются из хранилища и дождутся подключения владельца.
+    """
+    clients = manager.owner_clients.get(owner)
+    if not clients:
+        return
+    for reminder in await reminder_scheduler.claim_due(owner):
+        for client_id in list(clients):
+            await manager.send_message(client_id, {"type": "reminder", "data": reminder.to_dict()})
+
+
+async def announce_reminder(reminder: Reminder):
+    """Напоминание планирует и тот воркер, к которому сейчас подключён владелец"""
+    await state_backend.publish({
+        "type": "reminder_scheduled",
+        "data": {"id": reminder.id, "owner": reminder.owner, "due_at": reminder.due_at, "origin": worker_id()},
+    })
+
+
+async def on_broadcast(message: dict, client_id: Optional[str] = None):
+    """Служебные сообщения воркеров обрабатываются здесь, остальные уходят клиентам"""
+    if message.get("type") == "reminder_scheduled":
+        data = message["data"]
+        if data["origin"] != worker_id():
+            reminder_scheduler.schedule(data["due_at"], data["id"], data["owner"])
+        return
+    await manager.deliver(message, client_id)
+
+
+def start_turn(client_id: str, coro):
+    """Новый ход диалога прерывает незавершённый предыдущий (barge-in)"""
+    tasks = connection_tasks.get(client_id)
+    if tasks is None:
+        coro.close()
+        return
+    tasks.start_turn(run_turn(coro))
+
+
+async def run_turn(coro):
+    """Ход диалога — отдельный запрос: свой идентификатор в логах"""
+    request_id.set(new_request_id())
+    await coro
+
+
+async def cancel_turn(client_id: str):
+    """Отменяет текущий ответ клиента: LLM поток и синтез останавливаются сразу"""
+    tasks = connection_tasks.get(client_id)
+    if tasks is None or not tasks.cancel_turn():
+        return
+    await manager.send_message(client_id, {
+        "type": "status",
+        "data": {"status": "cancelled", "message": "Ответ прерван"}
+    })
+
+
+async def decode_uplink(client_id: str, audio_data: bytes) -> bytes:
+    """Сжатый WebM/Ogg Opus поток декодируется в PCM; сырой PCM проходит как есть или ресемплируется"""
+    decoder = audio_decoders.get(client_id)
+    if decoder is None:
+        if not is_compressed_audio(audio_data):
+            resampler = uplink_resamplers.get(client_id)
+            if resampler is not None:
+                return resampler.process(pcm_samples(audio_data)).tobytes()
+            return audio_data
+        decoder = OpusStreamDecoder.create(settings.SAMPLE_RATE)
+        if decoder is None:
+            return audio_data
+        # Состояние декодера живёт всё соединение: куски MediaRecorder продолжают друг друга
+        audio_decoders[client_id] = decoder
+    # PyAV декодирует синхронно; куски одного соединения всё равно обрабатываются по очереди
+    return await asyncio.to_thread(decoder.feed, audio_data)
+
+
+async def report_volume(client_id: str, audio_data: bytes):
+    """Уровень громкости копится за интервал и отправляется не чаще TELEMETRY_INTERVAL_MS"""
+    meter = volume_meters.get(client_id)
+    if meter is None:
+        return
+    
+    rms, peak = audio_processor.measure_levels(audio_data)
+    levels = meter.add(rms, peak, len(audio_data) // 2)
+    if levels is None:
+        return
+    
+    if manager.is_congested(client_id):
+        # Телеметрия отбрасывается первой: сокет занят более важными сообщениями
+        meter.dropped += 1
+        return
+    
+    payload = meter.encode(levels)
+    if isinstance(payload, bytes):
+        await manager.send_bytes(client_id, payload, msg_type="volume")
+    else:
+        await manager.send_message(client_id, payload)
+    meter.sent += 1
+
+
 async def handle_audio_data(websocket: WebSocket, client_id: str, audio_data: bytes):
+    # Один замер на кусок — всё время, что кусок занимает цикл чтения соединения
+    # (декодирование, уровни, VAD, потоковое распознавание): отдельный замер только
+    # декодирования добавлял около 10% к самому дешёвому шагу
+    with STAGE_DURATION.time("audio_chunk"):
+        await process_audio_chunk(client_id, audio_data)
+
+
+async def process_audio_chunk(client_id: str, audio_data: bytes):
     try:
-        volume = audio_processor.calculate_volume(audio_data)
+        audio_data = await decode_uplink(client_id, audio_data)
+        if not audio_data:
+            # Кусок содержал только заголовок контейнера или неполный блок
+            return
         
-        await manager.send_message(client_id, {
-            "type": "volume",
-            "data": {"volume": volume}
-        })
+        await report_volume(client_id, audio_data)
+        
+        vad = vad_sessions.get(client_id)
+        recognizer = streaming_recognizers.get(client_id)
+        
+        if vad is not None:
+            # Фразы собираются на сервере: распознавание начинается сразу по окончании речи
+            events = vad.feed(audio_data)
+            
+            for event in events:
+                await manager.send_message(client_id, {
+                    "type": "vad",
+                    "data": {"state": event.kind}
+                })
+                if event.kind == "speech_start" and settings.BARGE_IN_ENABLED:
+                    # Пользователь заговорил поверх ответа — ответ больше не нужен
+                    await cancel_turn(client_id)
+            
+            if recognizer is not None:
+                if any(event.kind == "speech_start" for event in events):
+                    if vad.state == "speech":
+                        # Кадры до speech_start лежат в pre-roll VAD: без них терялся бы первый слог
+                        await feed_streaming_recognizer(client_id, recognizer, vad.buffered_speech())
+                elif vad.state == "speech" or events:
+                    await feed_streaming_recognizer(client_id, recognizer, audio_data)
+            
+            for event in events:
+                if event.kind != "speech_end":
+                    continue
+                
+                text = await recognizer.finish() if recognizer is not None else ""
+                if text:
+                    ASR_TRANSCRIPTIONS.inc("vosk_streaming")
+                    start_turn(client_id, handle_transcription(client_id, text))
+                elif event.utterance:
+                    start_turn(client_id, process_utterance(client_id, event.utterance))
+            return
+        
+        if recognizer is not None:
+            # Без серверной VAD окончание фразы определяет сам Kaldi
+            await feed_streaming_recognizer(client_id, recognizer, audio_data)
+            if recognizer.endpoint_reached():
+                text = await recognizer.finish()
+                if text:
+                    ASR_TRANSCRIPTIONS.inc("vosk_streaming")
+                    start_turn(client_id, handle_transcription(client_id, text))
+            return
         
         if len(audio_data) < 1000:
             return
         
+        start_turn(client_id, process_utterance(client_id, audio_data))
+    
+    except Exception as e:
+        logger.error(f"Error handling audio data: {e}")
+        await manager.send_message(client_id, {
+            "type": "error",
+            "data": {"error": str(e)}
+        })
+
+
+async def process_utterance(client_id: str, audio_data: bytes):
+    try:
         await manager.send_message(client_id, {
             "type": "status",
             "data": {"status": "transcribing", "message": "Распознаю речь..."}
         })
         
-        wav_data = audio_processor.convert_to_wav(audio_data)
+        audio = audio_processor.to_pcm_buffer(audio_data)
         
-        transcription = await speech_recognizer.transcribe_audio(wav_data, language=settings.LANGUAGE)
+        transcription = await speech_recognizer.transcribe_audio(audio, language=settings.LANGUAGE)
         
         if not transcription:
             await manager.send_message(client_id, {
@@ -219,50 +797,210 @@ async def handle_audio_data(websocket: WebSocket, client_id: str, audio_data: by
             })
             return
         
+        await handle_transcription(client_id, transcription)
+    
+    except Exception as e:
+        logger.error(f"Error processing utterance: {e}")
         await manager.send_message(client_id, {
-            "type": "transcription",
-            "data": {"text": transcription}
+            "type": "error",
+            "data": {"error": str(e)}
         })
-        
+
+
+async def feed_streaming_recognizer(client_id: str, recognizer: StreamingRecognizer, audio_data: bytes):
+    partial = await recognizer.accept(audio_data)
+    if partial:
         await manager.send_message(client_id, {
-            "type": "status",
-            "data": {"status": "processing", "message": "Обрабатываю команду..."}
+            "type": "partial_transcription",
+            "data": {"text": partial}
         })
+
+
+async def handle_transcription(client_id: str, transcription: str):
+    await manager.send_message(client_id, {
+        "type": "transcription",
+        "data": {"text": transcription}
+    })
+    
+    await manager.send_message(client_id, {
+        "type": "status",
+        "data": {"status": "processing", "message": "Обрабатываю команду..."}
+    })
+    
+    await respond_to_command(client_id, transcription)
+
+
+async def stream_gpt_response(client_id: str, command_text: str, use_cache: bool = True) -> AsyncIterator[str]:
+    if not settings.LLM_STREAMING:
+        gpt_response = await llm_handler.get_response(command_text, session_id=client_id, use_cache=use_cache)
+        yield gpt_response if gpt_response else FALLBACK_RESPONSE
+        return
+    
+    # Полный текст с аудио приходит одним сообщением response, которое отправляет вызывающий код
+    received = False
+    async with aclosing(llm_handler.stream_response(command_text, session_id=client_id, use_cache=use_cache)) as deltas:
+        async for delta in deltas:
+            received = True
+            await manager.send_message(client_id, {
+                "type": "response_delta",
+                "data": {"text": delta}
+            })
+            yield delta
+    
+    if not received:
+        yield FALLBACK_RESPONSE
+
+
+async def make_audio_url(audio: Optional[bytes], as_resource: bool) -> Optional[str]:
+    if not audio:
+        return None
+    if as_resource:
+        return f"/api/audio/{await audio_store.put(audio)}"
+    return f"data:audio/mpeg;base64,{base64.b64encode(audio).decode('utf-8')}"
+
+
+async def send_audio(client_id: str, message: dict, audio: Optional[bytes], response_id: uuid.UUID, index: int = 0, final: bool = True):
+    """
+    Отправка сообщения с аудио: в режиме binary JSON содержит только метаданные,
+    а само аудио уходит следом бинарным кадром с id ответа; в протоколе MessagePack
+    аудио лежит в сообщении сырыми байтами
+    """
+    message["data"]["response_id"] = response_id.hex
+    
+    if manager.uses_binary_audio(client_id):
+        message["data"]["audio"] = None
+        message["data"]["has_audio"] = bool(audio)
+        await manager.send_message(client_id, message)
+        if audio:
+            await manager.send_bytes(client_id, pack_audio_frame(response_id.bytes, audio, index, final))
+    elif manager.codec(client_id).binary:
+        # Компактный протокол передаёт байты как есть, без base64
+        message["data"]["audio"] = audio or None
+        await manager.send_message(client_id, message)
+    else:
+        message["data"]["audio"] = await make_audio_url(audio, as_resource=False)
+        await manager.send_message(client_id, message)
+
+
+async def send_response(client_id: str, response_id: uuid.UUID, response_text: str, result: CommandResult, audio: Optional[bytes] = None, segmented: bool = False):
+    await send_audio(client_id, {
+        "type": "response",
+        "data": {
+            "text": response_text,
+            "command_type": result.command_type,
+            "intent": result.intent,
+            "intent_score": result.score,
+            "segmented": segmented,
+            "timestamp": datetime.now().isoformat()
+        }
+    }, audio, response_id)
+
+
+async def respond_with_speech_pipeline(client_id: str, response_id: uuid.UUID, text_source: AsyncIterator[str], result: CommandResult, text: Optional[str] = None):
+    """
+    Текст уходит клиенту раньше аудио, а аудио синтезируется по предложениям
+    и отправляется сегментами audio_segment в исходном порядке. text — ответ
+    уже известен целиком (команда, GPT без потоковой передачи): сообщение response
+    отправляется до синтеза. Иначе текст уже ушёл дельтами response_delta,
+    а response с полным текстом отправляется, когда поток закончился.
+    """
+    if text is not None:
+        await send_response(client_id, response_id, text, result, segmented=True)
+    
+    async def sentences() -> AsyncIterator[str]:
+        splitter = SentenceSplitter()
+        parts = []
+        # Прерванный ответ закрывает и источник текста, не оставляя поток GPT сборщику мусора
+        async with aclosing(text_source) as deltas:
+            async for delta in deltas:
+                parts.append(delta)
+                for sentence in splitter.feed(delta):
+                    yield sentence
         
-        response_text, command_type = await command_processor.process_command(transcription)
-        
-        if command_type == "gpt":
-            gpt_response = await llm_handler.get_response(transcription)
-            response_text = gpt_response if gpt_response else "Извините, не могу обработать этот запрос."
-        
-        audio_base64 = await text_to_speech.synthesize_speech_base64(response_text)
+        tail = splitter.flush()
+        if tail:
+            yield tail
         
-        await manager.send_message(client_id, {
-            "type": "response",
+        if text is None:
+            await send_response(client_id, response_id, "".join(parts), result, segmented=True)
+    
+    segments = 0
+    async for index, sentence, audio in speech_pipeline.stream(sentences()):
+        await send_audio(client_id, {
+            "type": "audio_segment",
             "data": {
-                "text": response_text,
-                "audio": f"data:audio/mpeg;base64,{audio_base64}" if audio_base64 else None,
-                "command_type": command_type,
-                "timestamp": datetime.now().isoformat()
+                "index": index,
+                "text": sentence
             }
-        })
-        
-    except Exception as e:
-        logger.error(f"Error handling audio data: {e}")
-        await manager.send_message(client_id, {
-            "type": "error",
-            "data": {"error": str(e)}
-        })
+        }, audio, response_id, index=index, final=False)
+        segments += 1
+    
+    await manager.send_message(client_id, {
+        "type": "audio_done",
+        "data": {"segments": segments, "response_id": response_id.hex}
+    })
+
+
+async def single_text(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def respond_to_command(client_id: str, command_text: str, use_cache: bool = True):
+    # Полное время ответа: команда, GPT, синтез и постановка в очередь отправки
+    with STAGE_DURATION.time("response"):
+        await respond(client_id, command_text, use_cache)
+
+
+async def respond(client_id: str, command_text: str, use_cache: bool):
+    result = await command_processor.process_command_detailed(command_text, owner=manager.owner(client_id))
+    
+    if result.command_type == "gpt":
+        text_source = stream_gpt_response(client_id, command_text, use_cache=use_cache)
+    else:
+        text_source = single_text(result.response)
+    
+    response_id = uuid.uuid4()
+    
+    if settings.TTS_PIPELINE:
+        text = result.response if result.command_type != "gpt" else None
+        if result.command_type == "gpt" and not settings.LLM_STREAMING:
+            # Ответ GPT приходит целиком: текст можно отправить до синтеза первого предложения
+            text = "".join([delta async for delta in text_source])
+        if text is not None:
+            text_source = single_text(text)
+        await respond_with_speech_pipeline(client_id, response_id, text_source, result, text=text)
+        return
+    
+    response_text = "".join([delta async for delta in text_source])
+    
+    audio_data = await text_to_speech.synthesize_speech(response_text)
+    
+    await send_response(client_id, response_id, response_text, result, audio_data)
+
+
+async def drain(timeout: float):
+    """
+    Плавная остановка воркера: новые WebSocket соединения отклоняются, /health отвечает 503,
+    а начатые ответы и очереди отправки дорабатывают не дольше timeout.
+    """
+    app.state.draining = True
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    
+    in_flight = sum(tasks.busy for tasks in connection_tasks.values())
+    logger.info(f"Draining {len(manager.active_connections)} connections, {in_flight} responses in flight")
+    
+    while loop.time() < deadline:
+        busy = any(tasks.busy for tasks in connection_tasks.values())
+        if not busy and not any(manager.is_congested(client_id) for client_id in list(manager.writers)):
+            logger.info("Drain complete")
+            return
+        await asyncio.sleep(0.1)
+    
+    logger.warning(f"Drain timeout of {timeout:.0f}s exceeded, {sum(tasks.busy for tasks in connection_tasks.values())} responses cut off")
 
 
 if __name__ == "__main__":
-    import uvicorn
-    
-    logger.info(f"Starting server on {settings.HOST}:{settings.PORT}")
-    uvicorn.run(
-        "backend.main:app",
-        host=settings.HOST,
-        port=settings.PORT,
-        reload=True,
-        log_level="info"
-    )
+    from backend.server import main
+    
+    main()
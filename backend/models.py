@@ -16,6 +16,8 @@ class TranscriptionResponse(BaseModel):
 
 class CommandRequest(BaseModel):
     command: str
+    session_id: Optional[str] = None
+    no_cache: bool = False
     timestamp: datetime = datetime.now()
 
 
@@ -23,6 +25,9 @@ class CommandResponse(BaseModel):
     response: str
     audio_url: Optional[str] = None
     command_type: Literal["predefined", "gpt"] = "predefined"
+    intent: Optional[str] = None
+    intent_score: Optional[float] = None
+    session_id: Optional[str] = None
     timestamp: datetime = datetime.now()
 
 
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Производственный запуск API: uvloop и httptools (если установлены), несколько
+процессов-воркеров на общем сокете и плавная остановка по SIGTERM.
+
+Запуск из корня проекта:
+    python -m backend.server [--workers N] [--host HOST] [--port PORT]
+    python -m backend.server --reload    # разработка: один воркер с перезагрузкой
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import shutil
+import signal
+import tempfile
+from types import FrameType
+from typing import List, Optional
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from backend.config import settings
+from backend.services.request_context import configure_logging
+
+logger = logging.getLogger(__name__)
+
+APP = "backend.main:app"
+
+
+def select_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") is not None else "asyncio"
+
+
+def select_http() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") is not None else "h11"
+
+
+def worker_count(requested: int) -> int:
+    """
+    Число воркеров: явное значение или по числу ядер (0). С состоянием в памяти
+    воркеры не видят истории друг друга и не доставляют напоминания чужим
+    клиентам, поэтому автоматически запускается один.
+    """
+    shared_state = settings.STATE_BACKEND != "memory"
+    if requested > 0:
+        if requested > 1 and not shared_state:
+            logger.warning("STATE_BACKEND=memory with several workers: history and reminder delivery are not shared")
+        return requested
+    if not shared_state:
+        logger.warning("STATE_BACKEND=memory: starting a single worker, set sqlite or redis to use every core")
+        return 1
+    return os.cpu_count() or 1
+
+
+def shared_directory(variable: str, prefix: str) -> Optional[str]:
+    """Временный каталог для воркеров, если переменная окружения не задана; его нужно удалить"""
+    if os.environ.get(variable):
+        return None
+    directory = os.environ[variable] = tempfile.mkdtemp(prefix=prefix)
+    return directory
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    Первый SIGTERM/SIGINT не закрывает соединения сразу: приложение перестаёт
+    принимать новые WebSocket, текущие ответы (LLM/TTS) дорабатывают не дольше
+    drain_timeout, и только затем uvicorn выполняет обычное завершение.
+    Повторный Ctrl+C завершает работу немедленно.
+    """
+    
+    def __init__(self, config: uvicorn.Config, drain_timeout: float):
+        super().__init__(config)
+        self.drain_timeout = drain_timeout
+        self._drain_task: Optional[asyncio.Task] = None
+    
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if self._drain_task is None and self.drain_timeout > 0:
+            logger.info(f"Received {signal.Signals(sig).name}, draining for up to {self.drain_timeout:.0f}s")
+            self._drain_task = asyncio.get_event_loop().create_task(self._drain())
+            return
+        if self._drain_task is not None:
+            if sig != signal.SIGINT:
+                # SIGTERM приходит и от родителя, и от менеджера процессов всей группе — не повод прерывать
+                return
+            # Повторный Ctrl+C во время дренажа: не ждать ни ответов, ни соединений
+            self.force_exit = True
+        super().handle_exit(sig, frame)
+    
+    async def _drain(self):
+        try:
+            from backend.main import drain
+            await drain(self.drain_timeout)
+        except Exception as e:
+            logger.error(f"Error draining connections: {e}")
+        finally:
+            self.should_exit = True
+
+
+
+class DrainingMultiprocess(Multiprocess):
+    """Все воркеры получают SIGTERM сразу и дренируются параллельно, а не по очереди"""
+    
+    def shutdown(self) -> None:
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        logger.info(f"Stopping parent process [{self.pid}]")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Jarvis AI Assistant API server")
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS, help="0 — по числу ядер")
+    parser.add_argument("--drain-timeout", type=float, default=settings.SHUTDOWN_DRAIN_TIMEOUT)
+    parser.add_argument("--reload", action="store_true", help="перезагрузка при изменении кода (только разработка)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    
+    if args.reload:
+        uvicorn.run(APP, host=args.host, port=args.port, reload=True, log_level="info")
+        return
+    
+    workers = worker_count(args.workers)
+    if "ASR_POOL_SIZE" not in os.environ:
+        # Ядра делятся между воркерами, а не отдаются каждому пулу распознавания целиком
+        os.environ["ASR_POOL_SIZE"] = str(max(1, (os.cpu_count() or 1) // workers))
+    
+    config = uvicorn.Config(
+        APP,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=select_loop(),
+        http=select_http(),
+        lifespan="on",
+        log_level="info",
+        timeout_graceful_shutdown=5,
+    )
+    server = DrainingServer(config, drain_timeout=args.drain_timeout)
+    logger.info(f"Starting {workers} worker(s) on {args.host}:{args.port} (loop: {config.loop}, http: {config.http})")
+    
+    if workers == 1:
+        server.run()
+        return
+    
+    # Воркеры обмениваются снимками метрик, чтобы /metrics любого из них показывал сумму,
+    # и отдают ссылки /api/audio/{id}, сохранённые другим воркером
+    shared_dirs = [
+        shared_directory("METRICS_MULTIPROC_DIR", "jarvis-metrics-"),
+        shared_directory("AUDIO_STORE_DIR", "jarvis-audio-"),
+    ]
+    
+    # Сокет открывает родитель; каждый воркер начинает принимать соединения
+    # только после своего lifespan startup, где загружаются модели и пулы
+    sock = config.bind_socket()
+    try:
+        DrainingMultiprocess(config, target=server.run, sockets=[sock]).run()
+    finally:
+        for directory in shared_dirs:
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
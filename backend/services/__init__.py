@@ -1,15 +1,52 @@
 from .audio_processing import AudioProcessor
 from .speech_recognition import SpeechRecognizer
 from .fast_speech_recognition import FastSpeechRecognizer
+from .asr_pool import ASRWorkerPool
+from .vad import StreamingVAD
+from .streaming_recognition import StreamingRecognizer
+from .opus_ingest import OpusStreamDecoder
 from .command_processor import CommandProcessor
 from .llm_handler import LLMHandler
 from .text_to_speech import TextToSpeech
+from .session_store import SessionStore
+from .state_backend import StateBackend, create_state_backend
+from .reminders import ReminderScheduler, ReminderStore, create_reminder_scheduler
+from .metrics import MetricsRegistry
+from .response_cache import ResponseCache
+from .http_client import HTTPClientPool, http_client
+from .tts_cache import TTSCache
+from .audio_delivery import AudioStore
+from .command_matcher import CommandMatcher
+from .intent_matcher import IntentMatcher
+from .weather_cache import WeatherCache
+from .speech_pipeline import SpeechPipeline, SentenceSplitter
 
 __all__ = [
     "AudioProcessor",
     "SpeechRecognizer",
     "FastSpeechRecognizer",
+    "ASRWorkerPool",
+    "StreamingVAD",
+    "StreamingRecognizer",
+    "OpusStreamDecoder",
     "CommandProcessor",
     "LLMHandler",
     "TextToSpeech",
+    "SessionStore",
+    "StateBackend",
+    "create_state_backend",
+    "ReminderScheduler",
+    "ReminderStore",
+    "create_reminder_scheduler",
+    "MetricsRegistry",
+    "ResponseCache",
+    "HTTPClientPool",
+    "http_client",
+    "TTSCache",
+    "AudioStore",
+    "CommandMatcher",
+    "IntentMatcher",
+    "WeatherCache",
+    "SpeechPipeline",
+    "SentenceSplitter",
 ]
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, TYPE_CHECKING
+
+from .audio_buffer import PCMBuffer
+
+if TYPE_CHECKING:
+    from .fast_speech_recognition import RecognitionResult
+
+logger = logging.getLogger(__name__)
+
+# Распознаватель, созданный один раз в каждом процессе пула
+_worker_recognizer = None
+
+
+def _init_worker(vosk_model_path: Optional[str]):
+    """Инициализатор процесса: загружает модели один раз на весь срок жизни воркера"""
+    global _worker_recognizer
+    
+    from .fast_speech_recognition import FastSpeechRecognizer
+    
+    _worker_recognizer = FastSpeechRecognizer(vosk_model_path=vosk_model_path)
+    _worker_recognizer.preload_models()
+
+
+def _warmup_worker(delay: float) -> int:
+    """Пустая задача, заставляющая пул поднять все процессы заранее"""
+    time.sleep(delay)
+    return os.getpid()
+
+
+def _recognize_in_worker(pcm: bytes, sample_rate: int, language: str, expires_at: float) -> Optional["RecognitionResult"]:
+    """Выполняется в процессе пула; задания, просроченные в очереди, не декодируются"""
+    if time.time() > expires_at:
+        return None
+    return _worker_recognizer.recognize(PCMBuffer(pcm, sample_rate), language)
+
+
+class ASRPoolSaturated(Exception):
+    """Очередь пула заполнена, задание отклонено"""
+
+
+class ASRWorkerPool:
+    """
+    Пул процессов для локального распознавания речи. Каждый процесс держит
+    прогретые модели, поэтому декодирование не занимает event loop и не платит
+    за загрузку модели. Число ожидающих заданий ограничено: при переполнении
+    задание отклоняется сразу, а не копится в очереди.
+    """
+    
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int = 16,
+        job_timeout: float = 10.0,
+        vosk_model_path: Optional[str] = None,
+    ):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.capacity = self.workers + self.max_queue
+        self.job_timeout = job_timeout
+        self.vosk_model_path = vosk_model_path
+        
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Задания, отправленные в пул и ещё не завершённые (включая просроченные)
+        self._pending = 0
+        
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.total_latency = 0.0
+    
+    def is_running(self) -> bool:
+        return self._executor is not None
+    
+    async def start(self):
+        """Запускает процессы и дожидается загрузки моделей в каждом из них"""
+        if self._executor is not None:
+            return
+        
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.vosk_model_path,),
+        )
+        
+        loop = asyncio.get_running_loop()
+        try:
+            # Одновременные задачи заставляют пул поднять все процессы сразу
+            pids = await asyncio.gather(*[
+                loop.run_in_executor(self._executor, _warmup_worker, 0.2)
+                for _ in range(self.workers)
+            ])
+            logger.info(f"ASR worker pool started with {len(set(pids))} processes")
+        except Exception as e:
+            logger.error(f"Error starting ASR worker pool: {e}")
+            await self.close()
+    
+    async def close(self):
+        """Останавливает пул, отменяя задания, которые ещё не начались"""
+        executor = self._executor
+        if executor is None:
+            return
+        self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("ASR worker pool stopped")
+    
+    async def transcribe(
+        self,
+        audio: PCMBuffer,
+        language: str = "ru",
+        timeout: Optional[float] = None,
+    ) -> Optional["RecognitionResult"]:
+        """
+        Распознаёт фразу в одном из процессов пула.
+        Возвращает None по истечении срока; при переполнении очереди
+        выбрасывает ASRPoolSaturated.
+        """
+        if self._executor is None:
+            raise RuntimeError("ASR worker pool is not running")
+        
+        if self._pending >= self.capacity:
+            self.rejected += 1
+            raise ASRPoolSaturated(f"ASR queue is full ({self._pending} jobs)")
+        
+        timeout = timeout if timeout is not None else self.job_timeout
+        started = time.monotonic()
+        
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, _recognize_in_worker,
+            # Между процессами передаётся только PCM без заголовка
+            audio.to_bytes(), audio.sample_rate, language, time.time() + timeout,
+        )
+        self._pending += 1
+        # Слот освобождается, только когда процесс действительно закончил работу
+        future.add_done_callback(self._job_done)
+        
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout)
+            self.completed += 1
+            self.total_latency += time.monotonic() - started
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"ASR job exceeded its {timeout:.1f}s deadline")
+            return None
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"ASR worker error: {e}")
+            return None
+    
+    def _job_done(self, future: asyncio.Future):
+        self._pending -= 1
+        if not future.cancelled():
+            # Исключение уже учтено в transcribe или задание было просрочено
+            future.exception()
+    
+    def stats(self) -> Dict[str, float]:
+        """Глубина очереди и насыщенность пула"""
+        in_flight = min(self._pending, self.workers)
+        return {
+            "running": self.is_running(),
+            "workers": self.workers,
+            "in_flight": in_flight,
+            "queue_depth": self._pending - in_flight,
+            "capacity": self.capacity,
+            "saturation": round(self._pending / self.capacity, 3),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failed": self.failed,
+            "avg_latency_ms": round(self.total_latency / self.completed * 1000, 1) if self.completed else 0.0,
+        }
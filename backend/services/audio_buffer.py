@@ -0,0 +1,136 @@
+import io
+import struct
+from typing import Union
+
+import numpy as np
+
+# RIFF/WAVE заголовок PCM файла: 44 байта перед данными
+WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+
+
+def make_wav_header(data_size: int, sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    """Формирует заголовок WAV для PCM данных заданного размера без перекодирования самих данных"""
+    block_align = channels * sample_width
+    return WAV_HEADER.pack(
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8,
+        b"data", data_size,
+    )
+
+
+class PCMBuffer:
+    """
+    Фраза в памяти: представление (memoryview) над исходными байтами кадра
+    без копирования. Из него напрямую получаются numpy массив, sr.AudioData
+    и файлоподобный WAV для загрузки в Whisper — без временных файлов.
+    """
+    
+    def __init__(self, pcm: Union[bytes, bytearray, memoryview], sample_rate: int, channels: int = 1, sample_width: int = 2):
+        view = memoryview(pcm).cast("B")
+        # Неполный последний сэмпл отбрасываем срезом, а не копией
+        usable = len(view) - len(view) % (channels * sample_width)
+        self.pcm = view[:usable]
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+    
+    @classmethod
+    def from_audio(cls, data: Union[bytes, bytearray, memoryview], sample_rate: int) -> "PCMBuffer":
+        """Принимает сырой PCM или WAV; у WAV данные берутся срезом после заголовка"""
+        view = memoryview(data).cast("B")
+        if len(view) >= WAV_HEADER.size and view[:4] == b"RIFF" and view[8:12] == b"WAVE":
+            return cls._from_wav(view)
+        return cls(view, sample_rate)
+    
+    @classmethod
+    def _from_wav(cls, view: memoryview) -> "PCMBuffer":
+        channels, sample_rate, sample_width = 1, 16000, 2
+        offset = 12
+        while offset + 8 <= len(view):
+            chunk_id = bytes(view[offset:offset + 4])
+            chunk_size = struct.unpack_from("<I", view, offset + 4)[0]
+            body = offset + 8
+            if chunk_id == b"fmt ":
+                channels, sample_rate = struct.unpack_from("<HI", view, body + 2)
+                sample_width = struct.unpack_from("<H", view, body + 14)[0] // 8
+            elif chunk_id == b"data":
+                return cls(view[body:body + chunk_size], sample_rate, channels, sample_width)
+            offset = body + chunk_size + (chunk_size & 1)
+        raise ValueError("WAV data chunk not found")
+    
+    def __len__(self) -> int:
+        return len(self.pcm)
+    
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / (self.sample_rate * self.channels * self.sample_width)
+    
+    def samples(self) -> np.ndarray:
+        """int16 массив поверх буфера (без копирования, только для чтения)"""
+        return np.frombuffer(self.pcm, dtype=np.int16)
+    
+    def to_bytes(self) -> bytes:
+        """Байты PCM; если представление покрывает весь объект bytes, возвращается он сам"""
+        obj = self.pcm.obj
+        if isinstance(obj, bytes) and len(obj) == len(self.pcm):
+            return obj
+        return self.pcm.tobytes()
+    
+    def to_audio_data(self):
+        """sr.AudioData для движков SpeechRecognition вместо AudioFile + record"""
+        import speech_recognition as sr
+        return sr.AudioData(self.to_bytes(), self.sample_rate, self.sample_width)
+    
+    def wav_header(self) -> bytes:
+        return make_wav_header(len(self.pcm), self.sample_rate, self.channels, self.sample_width)
+    
+    def wav_file(self, name: str = "audio.wav") -> "WAVReader":
+        """Файлоподобный WAV: заголовок и данные читаются по очереди, без склейки в один буфер"""
+        return WAVReader(self.wav_header(), self.pcm, name)
+    
+    def to_wav(self) -> bytes:
+        """Полный WAV одним объектом (одна копия данных)"""
+        return self.wav_header() + self.pcm
+
+
+class WAVReader(io.RawIOBase):
+    """Поток только для чтения поверх заголовка и PCM данных с поддержкой seek"""
+    
+    def __init__(self, header: bytes, pcm: memoryview, name: str = "audio.wav"):
+        super().__init__()
+        self._parts = (memoryview(header), pcm)
+        self._size = len(header) + len(pcm)
+        self._position = 0
+        self.name = name
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = min(max(0, offset), self._size)
+        return self._position
+    
+    def readinto(self, buffer) -> int:
+        target = memoryview(buffer).cast("B")
+        written = 0
+        start = 0
+        for part in self._parts:
+            end = start + len(part)
+            if self._position < end and written < len(target):
+                local = self._position - start
+                count = min(len(part) - local, len(target) - written)
+                target[written:written + count] = part[local:local + count]
+                written += count
+                self._position += count
+            start = end
+        return written
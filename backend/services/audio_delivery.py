@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+import re
+import secrets
+import struct
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Заголовок бинарного аудио-кадра WebSocket:
+# магия b"JAUD", id ответа (16 байт UUID), индекс сегмента (uint16), флаги (uint8)
+AUDIO_FRAME_MAGIC = b"JAUD"
+AUDIO_FRAME_HEADER = struct.Struct("!4s16sHB")
+AUDIO_FRAME_FINAL = 0x01
+
+# Идентификаторы записей AudioStore (secrets.token_urlsafe)
+_AUDIO_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def pack_audio_frame(response_id: bytes, audio: bytes, index: int = 0, final: bool = True) -> bytes:
+    header = AUDIO_FRAME_HEADER.pack(
+        AUDIO_FRAME_MAGIC,
+        response_id,
+        index,
+        AUDIO_FRAME_FINAL if final else 0,
+    )
+    return b"".join((header, audio))
+
+
+def unpack_audio_frame(frame: bytes) -> Tuple[bytes, int, bool, memoryview]:
+    magic, response_id, index, flags = AUDIO_FRAME_HEADER.unpack_from(frame)
+    if magic != AUDIO_FRAME_MAGIC:
+        raise ValueError("Not an audio frame")
+    return response_id, index, bool(flags & AUDIO_FRAME_FINAL), memoryview(frame)[AUDIO_FRAME_HEADER.size:]
+
+
+def parse_range_header(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбор заголовка Range для одного диапазона байт.
+    Возвращает (start, end) включительно, None если заголовок нужно игнорировать
+    (неизвестная единица или несколько диапазонов), ValueError если диапазон невыполним.
+    """
+    unit, _, spec = range_header.strip().partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    
+    start_str, _, end_str = spec.strip().partition("-")
+    try:
+        if not start_str:
+            # Суффиксный диапазон: последние N байт
+            length = int(end_str)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            return max(0, size - length), size - 1
+        
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+    except ValueError:
+        raise ValueError(f"Malformed range: {range_header}")
+    
+    if start >= size or end < start:
+        raise ValueError(f"Unsatisfiable range: {range_header}")
+    
+    return start, min(end, size - 1)
+
+
+async def iter_audio_chunks(audio: bytes, start: int, end: int, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    view = memoryview(audio)
+    position = start
+    while position <= end:
+        stop = min(position + chunk_size, end + 1)
+        yield bytes(view[position:stop])
+        position = stop
+
+
+class AudioStore:
+    """
+    Краткоживущее хранилище синтезированного аудио для выдачи по /api/audio/{id}.
+    Ограничено по времени жизни записей и суммарному объёму.
+    С directory аудио лежит в файлах общего каталога: при нескольких воркерах
+    ссылку может обслужить любой из них, а не только сохранивший запись.
+    Свои истёкшие файлы воркер удаляет сразу, а раз в SWEEP_INTERVAL просматривает
+    весь каталог и удаляет любые истёкшие по mtime — в том числе оставшиеся
+    от перезапущенных воркеров.
+    """
+    
+    SWEEP_INTERVAL = 60.0
+    
+    def __init__(self, ttl: float = 300.0, max_bytes: int = 64 * 1024 * 1024, directory: Optional[str] = None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.directory = directory
+        # Собственные записи воркера: id -> (срок, аудио или None для файла, тип, размер)
+        self._entries: "OrderedDict[str, Tuple[float, Optional[bytes], str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._last_sweep = 0.0
+        
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+    
+    async def put(self, audio: bytes, content_type: str = "audio/mpeg") -> str:
+        expired = self._prune()
+        
+        audio_id = secrets.token_urlsafe(16)
+        self._entries[audio_id] = (time.monotonic() + self.ttl, None if self.directory else audio, content_type, len(audio))
+        self._bytes += len(audio)
+        
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            expired.append(self._pop_oldest())
+        
+        if self.directory:
+            await asyncio.to_thread(self._write_file, audio_id, audio, content_type, expired, self._sweep_due())
+        return audio_id
+    
+    async def get(self, audio_id: str) -> Optional[Tuple[bytes, str]]:
+        expired = self._prune()
+        if self.directory:
+            return await asyncio.to_thread(self._read_file, audio_id, expired, self._sweep_due())
+        
+        entry = self._entries.get(audio_id)
+        if entry is None:
+            return None
+        _, audio, content_type, _ = entry
+        return audio, content_type
+    
+    def _pop_oldest(self) -> str:
+        audio_id, (_, _, _, size) = self._entries.popitem(last=False)
+        self._bytes -= size
+        return audio_id
+    
+    def _prune(self) -> List[str]:
+        # Записи добавляются с одинаковым TTL, поэтому истёкшие всегда в начале
+        now = time.monotonic()
+        expired = []
+        while self._entries:
+            expires_at = next(iter(self._entries.values()))[0]
+            if expires_at > now:
+                break
+            expired.append(self._pop_oldest())
+        return expired
+    
+    def _sweep_due(self) -> bool:
+        now = time.monotonic()
+        if now - self._last_sweep < self.SWEEP_INTERVAL:
+            return False
+        self._last_sweep = now
+        return True
+    
+    def _sweep_directory(self):
+        """Удаляет истёкшие файлы любого воркера и брошенные временные файлы"""
+        expires_before = time.time() - self.ttl
+        removed = 0
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith((".audio", ".tmp")):
+                        continue
+                    try:
+                        if entry.stat().st_mtime < expires_before:
+                            os.unlink(entry.path)
+                            removed += 1
+                    except OSError:
+                        # Файл уже удалил другой воркер
+                        pass
+        except OSError as e:
+            logger.warning(f"Could not sweep audio directory {self.directory}: {e}")
+        if removed:
+            logger.info(f"Removed {removed} expired audio files")
+    
+    def _path(self, audio_id: str) -> str:
+        return os.path.join(self.directory, f"{audio_id}.audio")
+    
+    def _remove_files(self, audio_ids: List[str]):
+        for audio_id in audio_ids:
+            try:
+                os.unlink(self._path(audio_id))
+            except OSError:
+                pass
+    
+    def _write_file(self, audio_id: str, audio: bytes, content_type: str, expired: List[str], sweep: bool):
+        self._remove_files(expired)
+        if sweep:
+            self._sweep_directory()
+        path = self._path(audio_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content_type.encode("ascii") + b"\n")
+            f.write(audio)
+        os.replace(tmp_path, path)
+    
+    def _read_file(self, audio_id: str, expired: List[str], sweep: bool) -> Optional[Tuple[bytes, str]]:
+        self._remove_files(expired)
+        if sweep:
+            self._sweep_directory()
+        # id приходит из URL: только символы token_urlsafe, без выхода из каталога
+        if not _AUDIO_ID.fullmatch(audio_id):
+            return None
+        try:
+            path = self._path(audio_id)
+            # Запись другого воркера: срок жизни считается по времени создания файла
+            if os.stat(path).st_mtime + self.ttl < time.time():
+                return None
+            with open(path, "rb") as f:
+                content_type, _, audio = f.read().partition(b"\n")
+            return audio, content_type.decode("ascii")
+        except OSError:
+            return None
@@ -1,8 +1,10 @@
 import numpy as np
 import base64
-import io
 import logging
-from typing import Optional
+from typing import Optional, Tuple
+
+from .audio_buffer import PCMBuffer, make_wav_header
+from .dsp import DSPScratch, PolyphaseResampler, normalize_gain, pcm_samples, peak_int16, remove_dc, rms, rms_peak
 
 logger = logging.getLogger(__name__)
 
@@ -10,24 +12,32 @@ logger = logging.getLogger(__name__)
 class AudioProcessor:
     def __init__(self, sample_rate: int = 16000):
         self.sample_rate = sample_rate
+        # Рабочий буфер float32 только для уровней (rms): они синхронные, вызываются
+        # из event loop по очереди, и результат — скаляры, которые буфер не переживают
+        self.scratch = DSPScratch()
     
     def calculate_volume(self, audio_data: bytes) -> float:
         try:
-            audio_array = np.frombuffer(audio_data, dtype=np.int16)
+            audio_array = pcm_samples(audio_data)
             
             if len(audio_array) == 0:
                 return 0.0
             
-            rms = np.sqrt(np.mean(np.square(audio_array.astype(float))))
-            
-            max_amplitude = 32768.0
-            volume_normalized = min(100, (rms / max_amplitude) * 100)
+            volume_normalized = min(100, rms(audio_array, self.scratch) * 100)
             
             return round(volume_normalized, 2)
         except Exception as e:
             logger.error(f"Error calculating volume: {e}")
             return 0.0
     
+    def measure_levels(self, audio_data: bytes) -> Tuple[float, float]:
+        """RMS и пик кадра в долях полной шкалы (для телеметрии)"""
+        try:
+            return rms_peak(pcm_samples(audio_data), self.scratch)
+        except Exception as e:
+            logger.error(f"Error measuring audio levels: {e}")
+            return 0.0, 0.0
+    
     def decode_base64_audio(self, base64_audio: str) -> Optional[bytes]:
         try:
             if "," in base64_audio:
@@ -41,39 +51,50 @@ class AudioProcessor:
     
     def convert_to_wav(self, audio_data: bytes) -> bytes:
         try:
-            import wave
-            
-            wav_buffer = io.BytesIO()
-            
-            with wave.open(wav_buffer, 'wb') as wav_file:
-                wav_file.setnchannels(1)
-                wav_file.setsampwidth(2)
-                wav_file.setframerate(self.sample_rate)
-                wav_file.writeframes(audio_data)
-            
-            wav_buffer.seek(0)
-            return wav_buffer.read()
+            # Заголовок формируется напрямую, данные не проходят через wave
+            return make_wav_header(len(audio_data), self.sample_rate) + audio_data
         except Exception as e:
             logger.error(f"Error converting to WAV: {e}")
             return audio_data
     
-    def normalize_audio(self, audio_data: bytes) -> bytes:
+    def to_pcm_buffer(self, audio_data: bytes) -> PCMBuffer:
+        """Оборачивает кадр в PCMBuffer без копирования данных"""
+        return PCMBuffer.from_audio(audio_data, self.sample_rate)
+    
+    def normalize_audio(self, audio_data: bytes, remove_dc_offset: bool = False) -> bytes:
         try:
-            audio_array = np.frombuffer(audio_data, dtype=np.int16)
+            audio_array = pcm_samples(audio_data)
             
-            if len(audio_array) == 0:
+            peak = peak_int16(audio_array) if len(audio_array) else 0
+            if peak == 0:
                 return audio_data
             
-            max_val = np.max(np.abs(audio_array))
-            if max_val > 0:
-                normalized = (audio_array.astype(float) / max_val * 32767).astype(np.int16)
-                return normalized.tobytes()
+            # Свои массивы, а не общий scratch: результат всё равно копируется в bytes,
+            # и нормализацию можно вызывать из потоков, не деля буфер между соединениями
+            signal = audio_array.astype(np.float32)
+            if remove_dc_offset:
+                normalize_gain(remove_dc(signal))
+                np.clip(signal, -32768.0, 32767.0, out=signal)
+                return signal.astype(np.int16).tobytes()
             
-            return audio_data
+            # Усиление известно по пику int16: без повторного поиска пика и без клиппинга
+            signal *= np.float32(32767.0 / peak)
+            return signal.astype(np.int16).tobytes()
         except Exception as e:
             logger.error(f"Error normalizing audio: {e}")
             return audio_data
     
+    def resample(self, audio_data: bytes, source_rate: int) -> bytes:
+        """Однократный пересчёт целого фрагмента в sample_rate; для потока нужен свой PolyphaseResampler"""
+        if source_rate == self.sample_rate:
+            return audio_data
+        try:
+            resampler = PolyphaseResampler(source_rate, self.sample_rate)
+            return resampler.process(pcm_samples(audio_data)).tobytes()
+        except Exception as e:
+            logger.error(f"Error resampling audio: {e}")
+            return audio_data
+    
     def detect_speech(self, audio_data: bytes, threshold: float = 10.0) -> bool:
         volume = self.calculate_volume(audio_data)
         return volume > threshold
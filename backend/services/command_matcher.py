@@ -0,0 +1,178 @@
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CommandMatch:
+    phrase: str
+    handler: Any
+    start: int
+    end: int
+    priority: int = 0
+
+
+class CommandMatcher:
+    """
+    Многошаблонный поиск командных фраз (автомат Ахо-Корасик).
+    Текст просматривается за один проход независимо от числа фраз.
+    При пересечении совпадений выбор детерминирован: выше priority,
+    затем длиннее фраза, затем более раннее вхождение, затем порядок регистрации.
+    
+    Проход автомата — цикл Python по символам, а str.find для каждой фразы
+    выполняется в C, поэтому небольшая таблица (меньше linear_max фраз)
+    просматривается перебором с тем же правилом выбора. По
+    benchmarks/bench_command_matcher.py перебор быстрее примерно до 30-40 фраз
+    (в таблице CommandProcessor их 16).
+    """
+    
+    # Размер таблицы, с которого строится автомат
+    LINEAR_MAX = 32
+    
+    def __init__(self, linear_max: int = LINEAR_MAX):
+        self.linear_max = linear_max
+        self._patterns: List[Tuple[str, Any, int]] = []
+        self._index: Dict[str, int] = {}
+        self._compiled = False
+        self._linear = False
+        
+        self._goto: List[Dict[str, int]] = []
+        self._fail: List[int] = []
+        # Лучший шаблон среди всех, оканчивающихся в данном состоянии (с учётом суффиксных ссылок)
+        self._best: List[int] = []
+        self._rank: List[Tuple[int, int]] = []
+    
+    def __len__(self) -> int:
+        return len(self._patterns)
+    
+    def register(self, phrase: str, handler: Any, priority: int = 0):
+        phrase = phrase.lower().strip()
+        if not phrase:
+            raise ValueError("Command phrase must not be empty")
+        
+        if phrase in self._index:
+            # Повторная регистрация заменяет обработчик, сохраняя порядок
+            self._patterns[self._index[phrase]] = (phrase, handler, priority)
+        else:
+            self._index[phrase] = len(self._patterns)
+            self._patterns.append((phrase, handler, priority))
+        
+        self._compiled = False
+    
+    def compile(self):
+        self._rank = [(priority, len(phrase)) for phrase, _, priority in self._patterns]
+        self._linear = len(self._patterns) < self.linear_max
+        if self._linear:
+            self._goto, self._fail, self._best = [], [], []
+            self._compiled = True
+            logger.info(f"Command matcher compiled: {len(self._patterns)} phrases, linear scan")
+            return
+        
+        goto: List[Dict[str, int]] = [{}]
+        terminal: List[int] = [-1]
+        
+        for pattern_id, (phrase, _, _) in enumerate(self._patterns):
+            state = 0
+            for char in phrase:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    terminal.append(-1)
+                state = next_state
+            terminal[state] = pattern_id
+        
+        fail = [0] * len(goto)
+        best = list(terminal)
+        queue = deque(goto[0].values())
+        
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                best[next_state] = self._better(best[next_state], best[fail[next_state]])
+                queue.append(next_state)
+        
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+        self._compiled = True
+        logger.info(f"Command matcher compiled: {len(self._patterns)} phrases, {len(goto)} states")
+    
+    def match(self, text: str) -> Optional[CommandMatch]:
+        if not self._compiled:
+            self.compile()
+        if self._linear:
+            return self._match_linear(text.lower())
+        
+        goto = self._goto
+        fail = self._fail
+        best = self._best
+        rank = self._rank
+        
+        state = 0
+        found = -1
+        found_end = -1
+        
+        for position, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            
+            candidate = best[state]
+            # Строгое сравнение: при равенстве остаётся более раннее вхождение
+            if candidate != -1 and (found == -1 or rank[candidate] > rank[found]):
+                found = candidate
+                found_end = position + 1
+        
+        return self._result(found, found_end)
+    
+    def _match_linear(self, text: str) -> Optional[CommandMatch]:
+        rank = self._rank
+        found = -1
+        found_end = -1
+        
+        for pattern_id, (phrase, _, _) in enumerate(self._patterns):
+            start = text.find(phrase)
+            if start < 0:
+                continue
+            end = start + len(phrase)
+            # То же правило, что у автомата: выше ранг, при равном — раньше конец вхождения
+            if found == -1 or rank[pattern_id] > rank[found] or (rank[pattern_id] == rank[found] and end < found_end):
+                found = pattern_id
+                found_end = end
+        
+        return self._result(found, found_end)
+    
+    def _result(self, found: int, found_end: int) -> Optional[CommandMatch]:
+        if found == -1:
+            return None
+        
+        phrase, handler, priority = self._patterns[found]
+        return CommandMatch(
+            phrase=phrase,
+            handler=handler,
+            start=found_end - len(phrase),
+            end=found_end,
+            priority=priority,
+        )
+    
+    def _better(self, first: int, second: int) -> int:
+        if first == -1:
+            return second
+        if second == -1:
+            return first
+        
+        first_phrase, _, first_priority = self._patterns[first]
+        second_phrase, _, second_priority = self._patterns[second]
+        
+        if (first_priority, len(first_phrase)) >= (second_priority, len(second_phrase)):
+            return first
+        return second
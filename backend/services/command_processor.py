@@ -1,15 +1,62 @@
 import logging
+from contextvars import ContextVar
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, Tuple
-import re
+from functools import partial
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple, Union
+import random
 import asyncio
-import aiohttp
+from backend.config import settings
+from .http_client import http_client
+from .command_matcher import CommandMatcher
+from .intent_matcher import IntentMatcher
+from .weather_cache import WeatherCache, extract_city
+from .reminders import ReminderScheduler, create_reminder_scheduler, parse_reminder
+from .metrics import COMMANDS, STAGE_DURATION, UPSTREAM_ERRORS
 
 logger = logging.getLogger(__name__)
 
+# Владелец текущей команды (client_id соединения или сессия REST): обработчики
+# получают только текст, а напоминанию нужно знать, кому его доставить
+current_owner: ContextVar[str] = ContextVar("current_owner", default="default")
+
+
+@dataclass
+class CommandResult:
+    response: str
+    command_type: str
+    intent: Optional[str] = None
+    score: Optional[float] = None
+    fuzzy: bool = False
+
 
 class CommandProcessor:
-    def __init__(self):
+    GREETING_RESPONSES = [
+        "Здравствуйте, сэр. Чем могу помочь?",
+        "Приветствую вас. Готов к работе.",
+        "Добрый день. Жду ваших указаний.",
+        "Всегда к вашим услугам, сэр."
+    ]
+    LIGHT_ON_RESPONSES = [
+        "Свет включён, сэр.",
+        "Освещение активировано.",
+        "Конечно, включаю свет."
+    ]
+    LIGHT_OFF_RESPONSES = [
+        "Свет выключен, сэр.",
+        "Освещение деактивировано.",
+        "Выключаю свет."
+    ]
+    SHUTDOWN_RESPONSE = "До свидания, сэр. Перехожу в режим ожидания."
+    WEATHER_NO_KEY_RESPONSE = "К сожалению, API ключ для получения погоды не настроен."
+    WEATHER_FAILED_RESPONSE = "Не удалось получить данные о погоде."
+    WEATHER_TIMEOUT_RESPONSE = "Превышено время ожидания при получении данных о погоде."
+    WEATHER_ERROR_RESPONSE = "Произошла ошибка при получении информации о погоде."
+    WEATHER_CITY_NOT_FOUND_RESPONSE = "Не удалось найти погоду в {city}: город не найден."
+    REMINDER_NOT_UNDERSTOOD_RESPONSE = "Извините, я не понял, о чём вам напомнить."
+    REMINDER_FAILED_RESPONSE = "Не удалось сохранить напоминание."
+    
+    def __init__(self, reminders: Optional[ReminderScheduler] = None):
         self.predefined_commands = {
             "привет джарвис": self.greeting_command,
             "hello jarvis": self.greeting_command,
@@ -27,33 +74,92 @@ class CommandProcessor:
             "shutdown": self.shutdown_command,
         }
         
-        self.reminders = []
+        self.matcher = CommandMatcher()
+        self.intent_matcher = IntentMatcher(
+            threshold=settings.INTENT_FUZZY_THRESHOLD,
+            margin=settings.INTENT_FUZZY_MARGIN,
+        )
+        self.fuzzy_enabled = settings.INTENT_FUZZY_ENABLED
+        for phrase, handler in self.predefined_commands.items():
+            self.register_command(phrase, handler)
+        
+        # Напоминание оборачивает произвольный текст ("напомни выключить свет"),
+        # поэтому имеет приоритет над командами внутри него
+        self.register_command(["напомни", "remind me"], self.reminder_command, priority=1)
+        
+        # Напоминания хранятся в SQLite и срабатывают по времени (см. ReminderScheduler)
+        self.reminders = reminders or create_reminder_scheduler()
+        
+        self.weather_url = "http://api.openweathermap.org/data/2.5/weather"
+        self.weather_cache = WeatherCache(
+            ttl=settings.WEATHER_CACHE_TTL,
+            stale_ttl=settings.WEATHER_CACHE_STALE_TTL,
+        )
+    
+    def register_command(self, phrases: Union[str, Iterable[str]], handler: Callable[[str], Awaitable[str]], priority: int = 0):
+        if isinstance(phrases, str):
+            phrases = [phrases]
+        for phrase in phrases:
+            self.matcher.register(phrase, handler, priority=priority)
+            self.intent_matcher.register(phrase, self._intent_name(handler), handler)
+    
+    @staticmethod
+    def _intent_name(handler: Callable) -> str:
+        name = getattr(handler, "__name__", str(handler))
+        return name[:-len("_command")] if name.endswith("_command") else name
     
     async def process_command(self, text: str) -> Tuple[str, str]:
+        result = await self.process_command_detailed(text)
+        return result.response, result.command_type
+    
+    async def process_command_detailed(self, text: str, owner: str = "default") -> CommandResult:
+        token = current_owner.set(owner)
+        try:
+            with STAGE_DURATION.time("command"):
+                result = await self._process(text)
+        finally:
+            current_owner.reset(token)
+        COMMANDS.inc(result.command_type)
+        return result
+    
+    async def _process(self, text: str) -> CommandResult:
         text_lower = text.lower().strip()
         
         logger.info(f"Processing command: {text_lower}")
         
-        for command_pattern, handler in self.predefined_commands.items():
-            if command_pattern in text_lower:
-                response = await handler(text)
-                return response, "predefined"
+        match = self.matcher.match(text_lower)
+        if match:
+            response = await match.handler(text)
+            return CommandResult(response, "predefined", intent=self._intent_name(match.handler), score=1.0)
         
-        if "напомни" in text_lower or "remind me" in text_lower:
-            response = await self.reminder_command(text)
-            return response, "predefined"
+        # Нечёткое совпадение перед обращением к GPT: ошибки распознавания речи
+        # не должны стоить полноценного запроса к LLM
+        if self.fuzzy_enabled:
+            fuzzy_match = self.intent_matcher.match(text_lower)
+            if fuzzy_match:
+                logger.info(f"Fuzzy intent match: {fuzzy_match.intent} ('{fuzzy_match.phrase}', score {fuzzy_match.score})")
+                response = await fuzzy_match.handler(text)
+                return CommandResult(response, "predefined", intent=fuzzy_match.intent, score=fuzzy_match.score, fuzzy=True)
         
-        return "", "gpt"
+        return CommandResult("", "gpt")
     
-    async def greeting_command(self, text: str) -> str:
-        greetings = [
-            "Здравствуйте, сэр. Чем могу помочь?",
-            "Приветствую вас. Готов к работе.",
-            "Добрый день. Жду ваших указаний.",
-            "Всегда к вашим услугам, сэр."
+    def get_static_responses(self) -> List[str]:
+        """Все фиксированные фразы ответов — используются для прогрева кэша TTS"""
+        return [
+            *self.GREETING_RESPONSES,
+            *self.LIGHT_ON_RESPONSES,
+            *self.LIGHT_OFF_RESPONSES,
+            self.SHUTDOWN_RESPONSE,
+            self.WEATHER_NO_KEY_RESPONSE,
+            self.WEATHER_FAILED_RESPONSE,
+            self.WEATHER_TIMEOUT_RESPONSE,
+            self.WEATHER_ERROR_RESPONSE,
+            self.REMINDER_NOT_UNDERSTOOD_RESPONSE,
+            self.REMINDER_FAILED_RESPONSE,
         ]
-        import random
-        return random.choice(greetings)
+    
+    async def greeting_command(self, text: str) -> str:
+        return random.choice(self.GREETING_RESPONSES)
     
     async def time_command(self, text: str) -> str:
         now = datetime.now()
@@ -66,63 +172,117 @@ class CommandProcessor:
     
     async def light_on_command(self, text: str) -> str:
         logger.info("Light ON command executed")
-        responses = [
-            "Свет включён, сэр.",
-            "Освещение активировано.",
-            "Конечно, включаю свет."
-        ]
-        import random
-        return random.choice(responses)
+        return random.choice(self.LIGHT_ON_RESPONSES)
     
     async def light_off_command(self, text: str) -> str:
         logger.info("Light OFF command executed")
-        responses = [
-            "Свет выключен, сэр.",
-            "Освещение деактивировано.",
-            "Выключаю свет."
-        ]
-        import random
-        return random.choice(responses)
+        return random.choice(self.LIGHT_OFF_RESPONSES)
     
     async def weather_command(self, text: str) -> str:
-        from backend.config import settings
-        
         if not settings.OPENWEATHERMAP_API_KEY:
-            return "К сожалению, API ключ для получения погоды не настроен."
+            return self.WEATHER_NO_KEY_RESPONSE
+        
+        # Варианты именительного падежа проверяются по порядку. Город по умолчанию —
+        # только если город не назван: спросившему про Казань нельзя отвечать про Москву
+        extracted = extract_city(text)
+        if extracted:
+            cities, city_label = extracted
+            candidates = [(city, city_label) for city in cities]
+        else:
+            candidates = [(settings.WEATHER_DEFAULT_CITY, settings.WEATHER_DEFAULT_CITY_LABEL)]
         
         try:
-            city = "Moscow"
-            url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={settings.OPENWEATHERMAP_API_KEY}&units=metric&lang=ru"
+            for city, city_label in candidates:
+                data = await self.weather_cache.get(
+                    city,
+                    settings.WEATHER_UNITS,
+                    partial(self._fetch_weather, city, settings.WEATHER_UNITS),
+                )
+                if data is not None:
+                    break
+                logger.info(f"No weather for '{city}', trying next candidate")
+            else:
+                if extracted:
+                    return self.WEATHER_CITY_NOT_FOUND_RESPONSE.format(city=city_label)
+                UPSTREAM_ERRORS.inc("openweathermap")
+                return self.WEATHER_FAILED_RESPONSE
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        temp = data["main"]["temp"]
-                        description = data["weather"][0]["description"]
-                        return f"Сейчас в Москве {temp:.1f} градусов, {description}."
-                    else:
-                        return "Не удалось получить данные о погоде."
+            temp = data["main"]["temp"]
+            description = data["weather"][0]["description"]
+            return f"Сейчас в {city_label} {temp:.1f} градусов, {description}."
         except asyncio.TimeoutError:
-            return "Превышено время ожидания при получении данных о погоде."
+            UPSTREAM_ERRORS.inc("openweathermap")
+            return self.WEATHER_TIMEOUT_RESPONSE
         except Exception as e:
             logger.error(f"Error fetching weather: {e}")
-            return "Произошла ошибка при получении информации о погоде."
+            UPSTREAM_ERRORS.inc("openweathermap")
+            return self.WEATHER_ERROR_RESPONSE
+    
+    async def _fetch_weather(self, city: str, units: str) -> Optional[dict]:
+        params = {
+            "q": city,
+            "appid": settings.OPENWEATHERMAP_API_KEY,
+            "units": units,
+            "lang": "ru",
+        }
+        
+        session = await http_client.get_session()
+        async with session.get(self.weather_url, params=params, timeout=http_client.timeout("openweathermap")) as response:
+            if response.status == 200:
+                return await response.json()
+            if response.status == 404:
+                # Город не найден: пробуется следующий вариант названия
+                logger.info(f"OpenWeatherMap has no city '{city}'")
+                return None
+            # Прочие ошибки (ключ, лимит, сбой сервиса) — не повод считать город ненайденным
+            raise RuntimeError(f"OpenWeatherMap error for {city}: {response.status}")
     
     async def reminder_command(self, text: str) -> str:
-        reminder_text = re.sub(r"(напомни|remind me|мне|о|about)", "", text, flags=re.IGNORECASE).strip()
+        reminder_text, due = parse_reminder(text, default_hour=settings.REMINDER_DEFAULT_HOUR)
         
-        if reminder_text:
-            self.reminders.append({
-                "text": reminder_text,
-                "created_at": datetime.now()
-            })
+        if not reminder_text:
+            return self.REMINDER_NOT_UNDERSTOOD_RESPONSE
+        
+        try:
+            await self.reminders.add(current_owner.get(), reminder_text, due)
+        except Exception as e:
+            logger.error(f"Error saving reminder: {e}")
+            return self.REMINDER_FAILED_RESPONSE
+        
+        if due is None:
             return f"Хорошо, я напомню вам о: {reminder_text}"
-        else:
-            return "Извините, я не понял, о чём вам напомнить."
+        return f"Хорошо, напомню {self._format_due(due)}: {reminder_text}"
+    
+    @staticmethod
+    def _format_due(due: datetime) -> str:
+        days = (due.date() - datetime.now().date()).days
+        if days == 0:
+            return f"сегодня в {due:%H:%M}"
+        if days == 1:
+            return f"завтра в {due:%H:%M}"
+        return f"{due:%d.%m} в {due:%H:%M}"
     
     async def shutdown_command(self, text: str) -> str:
-        return "До свидания, сэр. Перехожу в режим ожидания."
+        return self.SHUTDOWN_RESPONSE
+    
+    async def get_reminders(self, owner: str, limit: Optional[int] = None, cursor: Optional[int] = None) -> dict:
+        """
+        Страница напоминаний владельца; next_cursor передаётся в следующий запрос.
+        ValueError, если limit или cursor не целые неотрицательные числа.
+        """
+        limit = self._page_param("limit", limit, settings.REMINDER_PAGE_SIZE)
+        limit = min(max(1, limit), settings.REMINDER_PAGE_MAX)
+        cursor = self._page_param("cursor", cursor, 0)
+        reminders, next_cursor = await self.reminders.page(owner, limit, cursor)
+        return {"reminders": [reminder.to_dict() for reminder in reminders], "next_cursor": next_cursor}
     
-    def get_reminders(self) -> list:
-        return self.reminders
+    @staticmethod
+    def _page_param(name: str, value, default: int) -> int:
+        """Параметр страницы от клиента: целое число или строка из цифр"""
+        if value is None or value == "":
+            return default
+        if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+            return value
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+        raise ValueError(f"Invalid {name}: expected a non-negative integer")
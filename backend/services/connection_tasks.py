@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from typing import Any, Coroutine, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionTasks:
+    """
+    Задачи одного соединения. Цикл приёма только читает сокет и раздаёт работу,
+    а ход диалога (распознавание → команда → GPT → TTS) выполняется отдельной задачей.
+    У клиента одновременно идёт не более одного хода: новый ход или отмена
+    прерывают текущий (barge-in), и устаревший ответ не тратит токены и синтез.
+    """
+    
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self._turn: Optional[asyncio.Task] = None
+        
+        self.turns = 0
+        self.cancelled = 0
+        self.failed = 0
+    
+    @property
+    def busy(self) -> bool:
+        return self._turn is not None and not self._turn.done()
+    
+    def start_turn(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """Запускает новый ход; незавершённый предыдущий отменяется"""
+        self.cancel_turn()
+        task = asyncio.create_task(coro)
+        task.add_done_callback(self._turn_done)
+        self._turn = task
+        self.turns += 1
+        return task
+    
+    def cancel_turn(self) -> bool:
+        """Отменяет текущий ход; False, если отменять нечего"""
+        if not self.busy:
+            return False
+        self._turn.cancel()
+        self.cancelled += 1
+        return True
+    
+    def _turn_done(self, task: asyncio.Task):
+        if self._turn is task:
+            self._turn = None
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.failed += 1
+            logger.error(f"Turn for client {self.client_id} failed: {error}")
+    
+    def close(self):
+        """Соединение закрыто: незавершённый ход больше некому доставлять"""
+        if self.busy:
+            self._turn.cancel()
+    
+    def stats(self) -> Dict[str, int]:
+        return {"turns": self.turns, "cancelled": self.cancelled, "failed": self.failed, "busy": int(self.busy)}
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+from fastapi import WebSocket
+
+from .metrics import STAGE_DURATION
+from .ws_codec import JSON_CODEC, Frame
+
+logger = logging.getLogger(__name__)
+
+# Код закрытия для клиента, который не успевает читать (RFC 6455: Try Again Later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class SlowConsumer(Exception):
+    """Очередь клиента переполнена сообщением, которое нельзя отбросить"""
+
+
+class ConnectionWriter:
+    """
+    Отдельная задача записи для одного WebSocket соединения. Обработчики кладут
+    сообщения в ограниченную очередь и не ждут сокет. Для сообщений из drop_types
+    (телеметрия, промежуточный текст) при заполненной очереди действует политика
+    «отбросить»; остальные ждут места не дольше block_timeout, после чего клиент
+    считается медленным и отключается. Сообщения кодируются кодеком соединения
+    при постановке в очередь, поэтому смена протокола не затрагивает уже
+    поставленные кадры.
+    """
+    
+    def __init__(
+        self,
+        websocket: WebSocket,
+        client_id: str,
+        max_queue: int = 256,
+        block_timeout: float = 5.0,
+        drop_types: Optional[Set[str]] = None,
+        codec=JSON_CODEC,
+    ):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.block_timeout = block_timeout
+        self.drop_types = drop_types or set()
+        self.codec = codec
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._sending = False
+        self.closed = False
+        
+        self.sent = 0
+        self.dropped: Dict[str, int] = {}
+        self.high_water = 0
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+    
+    def is_congested(self) -> bool:
+        # Остановленный после ошибки writer кадров уже не отправит, оставшиеся в очереди не в счёт
+        if self.closed:
+            return False
+        return self._sending or not self._queue.empty()
+    
+    def encode(self, message: Dict[str, Any]) -> Frame:
+        return self.codec.encode(message)
+    
+    async def send(self, frame: Frame, msg_type: str):
+        """
+        Ставит кадр в очередь: str уходит текстовым кадром, bytes — бинарным.
+        Отбрасываемые типы при переполнении теряются; остальные ждут места,
+        а по истечении block_timeout выбрасывают SlowConsumer.
+        """
+        if self.closed:
+            return
+        if self.offer(frame, msg_type):
+            return
+        if msg_type in self.drop_types:
+            return
+        try:
+            await asyncio.wait_for(self._queue.put(frame), self.block_timeout)
+        except asyncio.TimeoutError:
+            raise SlowConsumer(f"Outbound queue of {self.client_id} stayed full for {self.block_timeout:.1f}s")
+        self._track_depth()
+    
+    def offer(self, frame: Frame, msg_type: str) -> bool:
+        """Неблокирующая постановка в очередь; False, если места нет"""
+        if self.closed:
+            return True
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            if msg_type in self.drop_types:
+                self.dropped[msg_type] = self.dropped.get(msg_type, 0) + 1
+            return False
+        self._track_depth()
+        return True
+    
+    def _track_depth(self):
+        self.high_water = max(self.high_water, self._queue.qsize())
+    
+    async def _run(self):
+        try:
+            while True:
+                frame = await self._queue.get()
+                self._sending = True
+                try:
+                    with STAGE_DURATION.time("ws_send"):
+                        if isinstance(frame, str):
+                            await self.websocket.send_text(frame)
+                        else:
+                            await self.websocket.send_bytes(frame)
+                finally:
+                    # Иначе после ошибки отправки соединение навсегда считалось бы перегруженным
+                    self._sending = False
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Сокет закрыт на стороне клиента: цикл приёма сам завершит соединение
+            logger.warning(f"Writer for client {self.client_id} stopped: {e}")
+            self.closed = True
+    
+    def stop(self):
+        """Останавливает запись; неотправленные сообщения отбрасываются"""
+        self.closed = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+    
+    async def abort(self, code: int = SLOW_CONSUMER_CLOSE_CODE):
+        """Останавливает запись и закрывает сокет (отключение медленного клиента)"""
+        self.stop()
+        try:
+            await self.websocket.close(code=code)
+        except Exception as e:
+            logger.debug(f"Error closing websocket for {self.client_id}: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "high_water": self.high_water,
+            "sent": self.sent,
+            "dropped": dict(self.dropped),
+        }
@@ -0,0 +1,151 @@
+import logging
+from math import gcd
+from typing import Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FULL_SCALE = 32768.0
+
+
+class DSPScratch:
+    """
+    Рабочие буферы float32, переиспользуемые между кадрами. Буфер растёт
+    до самого длинного кадра и дальше не перевыделяется. Не потокобезопасен:
+    один экземпляр на соединение или на event loop. Сигнал хранится в единицах
+    int16 — масштаб применяется к скалярным результатам, а не к каждому отсчёту.
+    """
+    
+    def __init__(self, capacity: int = 4096):
+        self._buffer = np.zeros(capacity, dtype=np.float32)
+        self._int16 = np.zeros(capacity, dtype=np.int16)
+    
+    def floats(self, samples: np.ndarray) -> np.ndarray:
+        """Копия int16 отсчётов в float32 внутри рабочего буфера"""
+        n = len(samples)
+        if n > len(self._buffer):
+            self._buffer = np.zeros(max(n, 2 * len(self._buffer)), dtype=np.float32)
+        view = self._buffer[:n]
+        view[:] = samples
+        return view
+    
+    def int16(self, signal: np.ndarray, clip: bool = True) -> np.ndarray:
+        """
+        Перевод float32 сигнала в int16 с отбрасыванием дробной части (результат — вид
+        на буфер). clip=False допустим, если сигнал заведомо в пределах шкалы.
+        """
+        n = len(signal)
+        if n > len(self._int16):
+            self._int16 = np.zeros(max(n, 2 * len(self._int16)), dtype=np.int16)
+        if clip:
+            np.clip(signal, -32768.0, 32767.0, out=signal)
+        view = self._int16[:n]
+        np.copyto(view, signal, casting="unsafe")
+        return view
+
+
+def pcm_samples(audio_data: bytes) -> np.ndarray:
+    """int16 вид на байты PCM без копирования (неполный последний сэмпл отбрасывается)"""
+    return np.frombuffer(audio_data, dtype=np.int16, count=len(audio_data) // 2)
+
+
+def peak_int16(samples: np.ndarray) -> int:
+    """Пиковая амплитуда без np.abs (abs(-32768) переполняет int16)"""
+    if len(samples) == 0:
+        return 0
+    return max(int(samples.max()), -int(samples.min()))
+
+
+def rms(samples: np.ndarray, scratch: DSPScratch) -> float:
+    """RMS кадра в долях полной шкалы; сумма квадратов считается одним dot"""
+    if len(samples) == 0:
+        return 0.0
+    signal = scratch.floats(samples)
+    return float(np.sqrt(np.dot(signal, signal) / len(signal))) / FULL_SCALE
+
+
+def rms_peak(samples: np.ndarray, scratch: DSPScratch) -> Tuple[float, float]:
+    """RMS и пик кадра в долях полной шкалы"""
+    return rms(samples, scratch), peak_int16(samples) / FULL_SCALE
+
+
+def remove_dc(signal: np.ndarray) -> np.ndarray:
+    """Вычитает постоянную составляющую на месте"""
+    if len(signal):
+        signal -= np.float32(signal.mean())
+    return signal
+
+
+def normalize_gain(signal: np.ndarray, target_peak: float = 32767.0) -> np.ndarray:
+    """Масштабирует сигнал на месте так, чтобы пик стал target_peak"""
+    if len(signal) == 0:
+        return signal
+    peak = max(float(signal.max()), -float(signal.min()))
+    if peak > 0:
+        signal *= np.float32(target_peak / peak)
+    return signal
+
+
+class PolyphaseResampler:
+    """
+    Потоковый полифазный ресемплер int16 PCM с целым отношением up/down.
+    Фильтр — окно Кайзера над sinc; хвост предыдущего куска хранится, поэтому
+    на стыках кусков нет разрывов. Один экземпляр на поток (соединение).
+    """
+    
+    def __init__(self, src_rate: int, dst_rate: int, zero_crossings: int = 10, rolloff: float = 0.9, beta: float = 6.0):
+        divisor = gcd(src_rate, dst_rate)
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.up = dst_rate // divisor
+        self.down = src_rate // divisor
+        
+        # Фильтр нижних частот на частоте up * src, срез чуть ниже меньшей из двух Найквистов;
+        # длина — zero_crossings нулей sinc в каждую сторону, округлённая до целого числа фаз
+        self.taps = -(-2 * zero_crossings * max(self.up, self.down) // self.up)
+        length = self.up * self.taps
+        cutoff = rolloff * 0.5 / max(self.up, self.down)
+        n = np.arange(length) - (length - 1) / 2.0
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta)
+        prototype *= self.up / prototype.sum()
+        # Фазы: phases[p, k] = h[p + k * up]; развёрнуты под скользящее окно по входу
+        self._phases = prototype.reshape(self.taps, self.up).T[:, ::-1].astype(np.float32).copy()
+        
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        # Позиция следующего выходного отсчёта в единицах 1/up входного отсчёта
+        self._position = 0
+        self._scratch = DSPScratch()
+        self._input = np.zeros(0, dtype=np.float32)
+    
+    def reset(self):
+        self._history[:] = 0
+        self._position = 0
+    
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Принимает кусок int16, возвращает ресемплированный int16 (новый массив)"""
+        if self.up == self.down:
+            return samples.copy()
+        
+        history = len(self._history)
+        total = history + len(samples)
+        if len(self._input) < total:
+            self._input = np.zeros(max(total, 2 * len(self._input)), dtype=np.float32)
+        signal = self._input[:total]
+        signal[:history] = self._history
+        signal[history:] = samples
+        
+        # Выходной отсчёт с позицией t использует входные отсчёты t // up - taps + 1 ... t // up
+        # (индексы считаются от начала текущего куска, история лежит перед ним)
+        available = len(samples) * self.up
+        count = max(0, -(-(available - self._position) // self.down))
+        positions = self._position + self.down * np.arange(count)
+        bases = positions // self.up
+        phases = positions % self.up
+        
+        windows = np.lib.stride_tricks.sliding_window_view(signal, self.taps)
+        output = np.einsum("ij,ij->i", windows[bases], self._phases[phases])
+        
+        self._position += self.down * count - available
+        self._history[:] = signal[total - history:]
+        return self._scratch.int16(output).copy()
@@ -1,76 +1,91 @@
+import asyncio
+import importlib.util
+import json
 import logging
-import tempfile
-import os
 import speech_recognition as sr
-from typing import Optional
-import numpy as np
-import wave
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from .audio_buffer import PCMBuffer
+from .asr_pool import ASRWorkerPool, ASRPoolSaturated
+from .streaming_recognition import load_vosk_model
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class RecognitionResult:
+    """Текст фразы, движок, который его дал, и уверенность (None если движок её не сообщает)"""
+    text: str
+    engine: str
+    confidence: Optional[float] = None
+
+
 class FastSpeechRecognizer:
     """
     Быстрое локальное распознавание речи используя SpeechRecognition библиотеку
     с поддержкой Vosk или Sphinx для офлайн распознавания
     """
     
-    def __init__(self):
+    def __init__(self, pool: Optional[ASRWorkerPool] = None, vosk_model_path: Optional[str] = None):
+        self.pool = pool
         self.recognizer = sr.Recognizer()
         self.recognizer.energy_threshold = 300
         self.recognizer.dynamic_energy_threshold = True
         self.recognizer.pause_threshold = 0.8
         self.recognizer.phrase_threshold = 0.3
         
-        # Попытка загрузить Vosk модель для русского языка
-        self.vosk_available = False
-        try:
-            # Создаем временную директорию для модели
-            self.vosk_model_path = None
-            self.vosk_available = True
+        # Модель загружается лениво при первом распознавании или через preload_models
+        self.vosk_model_path = vosk_model_path
+        self.vosk_model = None
+        self.vosk_available = importlib.util.find_spec("vosk") is not None
+        if self.vosk_available:
             logger.info("FastSpeechRecognizer initialized with Vosk support")
-        except Exception as e:
-            logger.warning(f"Vosk not available: {e}")
-            self.vosk_available = False
+        else:
+            logger.warning("Vosk library not installed, local recognition falls back to other engines")
     
-    async def transcribe_audio_fast(self, audio_data: bytes, language: str = "ru") -> Optional[str]:
+    async def transcribe_audio_fast(self, audio: PCMBuffer, language: str = "ru") -> Optional[str]:
         """
         Быстрое распознавание речи с использованием локальных моделей
         """
+        result = await self.transcribe_detailed(audio, language)
+        return result.text if result is not None else None
+    
+    async def transcribe_detailed(self, audio: PCMBuffer, language: str = "ru") -> Optional[RecognitionResult]:
+        """
+        Локальное распознавание с указанием движка и уверенности
+        """
         try:
-            # Сохраняем аудио во временный файл
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                # Записываем WAV данные
-                temp_file.write(audio_data)
-                temp_file.flush()
+            if self.pool is not None and self.pool.is_running():
+                # Декодирование в пуле процессов с прогретыми моделями
+                result = await self.pool.transcribe(audio, language)
+            else:
+                # CPU-тяжёлые движки не должны блокировать event loop
+                result = await asyncio.to_thread(self.recognize, audio, language)
+            
+            if result is not None and result.text.strip():
+                logger.info(f"Fast transcription result: {result.text}")
+                result.text = result.text.strip()
+                return result
+            else:
+                logger.warning("Fast recognition failed, will fall back to OpenAI")
+                return None
                 
-                try:
-                    with sr.AudioFile(temp_file.name) as source:
-                        # Записываем аудио
-                        audio = self.recognizer.record(source)
-                    
-                    # Пытаемся использовать различные движки распознавания
-                    text = await self._try_recognition_engines(audio, language)
-                    
-                    if text and text.strip():
-                        logger.info(f"Fast transcription result: {text}")
-                        return text.strip()
-                    else:
-                        logger.warning("Fast recognition failed, will fall back to OpenAI")
-                        return None
-                        
-                finally:
-                    # Удаляем временный файл
-                    try:
-                        os.unlink(temp_file.name)
-                    except Exception as e:
-                        logger.warning(f"Could not delete temp file: {e}")
-                        
+        except ASRPoolSaturated as e:
+            logger.warning(f"Local recognition skipped: {e}")
+            return None
         except Exception as e:
             logger.error(f"Error in fast transcription: {e}")
             return None
     
-    async def _try_recognition_engines(self, audio, language: str) -> Optional[str]:
+    def recognize(self, audio: PCMBuffer, language: str = "ru") -> Optional[RecognitionResult]:
+        """
+        Синхронное распознавание фразы из памяти (выполняется в потоке или процессе пула)
+        """
+        # AudioData строится прямо из буфера, без временного файла и AudioFile
+        return self._try_recognition_engines(audio.to_audio_data(), language)
+    
+    def _try_recognition_engines(self, audio, language: str) -> Optional[RecognitionResult]:
         """
         Пытаемся использовать различные движки распознавания в порядке приоритета
         """
@@ -92,50 +107,54 @@ class FastSpeechRecognizer:
         
         for engine_name, engine_func in engines_to_try:
             try:
-                result = engine_func(audio, language)
-                if result and result.strip():
-                    logger.info(f"Successfully recognized with {engine_name}: {result}")
-                    return result
+                text, confidence = engine_func(audio, language)
+                if text and text.strip():
+                    logger.info(f"Successfully recognized with {engine_name}: {text}")
+                    return RecognitionResult(text, engine_name, confidence)
             except Exception as e:
                 logger.warning(f"{engine_name} recognition failed: {e}")
                 continue
         
         return None
     
-    def _recognize_vosk(self, audio, language: str) -> str:
+    def preload_models(self):
+        """Загружает модели заранее, чтобы первый запрос не платил за инициализацию"""
+        if self.vosk_available and self.vosk_model_path and self.vosk_model is None:
+            self.vosk_model = load_vosk_model(self.vosk_model_path)
+    
+    def _recognize_vosk(self, audio, language: str) -> Tuple[str, Optional[float]]:
         """Распознавание с использованием Vosk"""
         if not self.vosk_available:
             raise Exception("Vosk not available")
         
-        try:
-            import vosk
-            import json
-            
-            # Для Vosk нужен специальный формат аудио
-            # Здесь можно добавить конвертацию если нужно
-            result = self.recognizer.recognize_vosk(audio, language=language)
-            
-            if isinstance(result, str):
-                # Парсим JSON ответ от Vosk
-                try:
-                    parsed = json.loads(result)
-                    return parsed.get("text", "")
-                except json.JSONDecodeError:
-                    return result
-            else:
-                return str(result)
-                
-        except ImportError:
-            logger.warning("Vosk library not installed")
-            raise Exception("Vosk not available")
+        self.preload_models()
+        if self.vosk_model is None:
+            raise Exception("Vosk model not loaded")
+        
+        from vosk import KaldiRecognizer
+        
+        # Распознаватель дешёвый, модель переиспользуется между вызовами
+        recognizer = KaldiRecognizer(self.vosk_model, 16000)
+        recognizer.SetWords(True)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=16000, convert_width=2))
+        parsed = json.loads(recognizer.FinalResult())
+        
+        words = parsed.get("result") or []
+        confidence = sum(word.get("conf", 0.0) for word in words) / len(words) if words else None
+        return parsed.get("text", ""), confidence
     
-    def _recognize_sphinx(self, audio, language: str) -> str:
+    def _recognize_sphinx(self, audio, language: str) -> Tuple[str, Optional[float]]:
         """Распознавание с использованием CMU Sphinx"""
-        return self.recognizer.recognize_sphinx(audio, language=language)
+        return self.recognizer.recognize_sphinx(audio, language=language), None
     
-    def _recognize_google_fallback(self, audio, language: str) -> str:
+    def _recognize_google_fallback(self, audio, language: str) -> Tuple[str, Optional[float]]:
         """Google распознавание как запасной вариант (может требовать интернет)"""
-        return self.recognizer.recognize_google(audio, language=language)
+        response = self.recognizer.recognize_google(audio, language=language, show_all=True)
+        alternatives = response.get("alternative", []) if isinstance(response, dict) else []
+        if not alternatives:
+            return "", None
+        best = max(alternatives, key=lambda alternative: alternative.get("confidence", 0.0))
+        return best.get("transcript", ""), best.get("confidence")
     
     def is_available(self) -> bool:
         """Проверяет доступность локального распознавания"""
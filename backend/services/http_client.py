@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+import aiohttp
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClientPool:
+    """
+    Общий для процесса пул HTTP соединений (aiohttp) для внешних API:
+    keep-alive, кэш DNS, лимиты соединений на хост и таймауты для каждого upstream
+    """
+    
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = 30.0,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+    
+    async def start(self):
+        await self.get_session()
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self._session is not None and not self._session.closed:
+            return self._session
+        
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                    use_dns_cache=True,
+                    ttl_dns_cache=self.dns_cache_ttl,
+                )
+                self._session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=aiohttp.ClientTimeout(total=self.default_timeout),
+                )
+                logger.info(
+                    f"HTTP client pool started (limit={self.limit}, "
+                    f"per_host={self.limit_per_host}, keepalive={self.keepalive_timeout}s)"
+                )
+        
+        return self._session
+    
+    def timeout(self, upstream: str) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=self.timeouts.get(upstream, self.default_timeout))
+    
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP client pool closed")
+        self._session = None
+
+
+http_client = HTTPClientPool(
+    limit=settings.HTTP_POOL_LIMIT,
+    limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+    keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+    dns_cache_ttl=settings.HTTP_DNS_CACHE_TTL,
+    timeouts={
+        "elevenlabs": settings.ELEVENLABS_TIMEOUT,
+        "openweathermap": settings.OPENWEATHERMAP_TIMEOUT,
+    },
+)
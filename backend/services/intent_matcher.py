@@ -0,0 +1,119 @@
+import logging
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Вежливые слова не меняют команду, но уменьшают сходство с фразой
+FILLER_WORDS = frozenset({"пожалуйста", "please"})
+
+
+def hashed_ngrams(text: str, dimensions: int, sizes: Tuple[int, ...] = (2, 3)) -> Tuple[np.ndarray, np.ndarray]:
+    """Хэшированные символьные n-граммы текста: (номера корзин, количества)"""
+    padded = f" {text} "
+    buckets = [
+        zlib.crc32(padded[i:i + n].encode("utf-8")) % dimensions
+        for n in sizes
+        for i in range(len(padded) - n + 1)
+    ]
+    return np.unique(np.array(buckets, dtype=np.int64), return_counts=True)
+
+
+@dataclass(frozen=True)
+class IntentMatch:
+    intent: str
+    phrase: str
+    handler: Any
+    score: float
+
+
+class IntentMatcher:
+    """
+    Нечёткое сопоставление фраз с намерениями, устойчивое к ошибкам распознавания речи.
+    Фразы представлены хэшированными векторами символьных 2- и 3-грамм,
+    оценка — коэффициент Дайса между наборами n-грамм текста и фразы (векторизовано в NumPy).
+    Мера симметрична: n-граммы текста, которых нет во фразе, снижают оценку, поэтому
+    длинный вопрос, содержащий слова команды ("какая разница между погодой и климатом"),
+    не перехватывается локальным намерением.
+    """
+    
+    def __init__(self, threshold: float = 0.7, margin: float = 0.05, dimensions: int = 4096, min_phrase_length: int = 6):
+        self.threshold = threshold
+        # Минимальный отрыв лучшего намерения от ближайшего другого, иначе совпадение неоднозначно
+        self.margin = margin
+        self.dimensions = dimensions
+        # Короткие фразы ("стоп") слишком легко совпадают случайно — только точное совпадение
+        self.min_phrase_length = min_phrase_length
+        
+        self._phrases: List[Tuple[str, str, Any]] = []
+        self._index: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._totals: Optional[np.ndarray] = None
+        self._intent_ids: Optional[np.ndarray] = None
+    
+    def __len__(self) -> int:
+        return len(self._phrases)
+    
+    def register(self, phrase: str, intent: str, handler: Any):
+        phrase = self._normalize(phrase)
+        if len(phrase) < self.min_phrase_length:
+            return
+        
+        if phrase in self._index:
+            self._phrases[self._index[phrase]] = (phrase, intent, handler)
+        else:
+            self._index[phrase] = len(self._phrases)
+            self._phrases.append((phrase, intent, handler))
+        self._matrix = None
+    
+    def compile(self):
+        matrix = np.zeros((len(self._phrases), self.dimensions), dtype=np.uint8)
+        for row, (phrase, _, _) in enumerate(self._phrases):
+            columns, counts = self._hashed_ngrams(phrase)
+            matrix[row, columns] = np.minimum(counts, 255)
+        
+        intents = {intent: index for index, intent in enumerate(dict.fromkeys(i for _, i, _ in self._phrases))}
+        
+        self._matrix = matrix
+        self._totals = matrix.sum(axis=1, dtype=np.float32)
+        self._intent_ids = np.array([intents[intent] for _, intent, _ in self._phrases], dtype=np.int32)
+        logger.info(f"Intent matcher compiled: {len(self._phrases)} phrases, {len(intents)} intents")
+    
+    def match(self, text: str) -> Optional[IntentMatch]:
+        if not self._phrases:
+            return None
+        if self._matrix is None:
+            self.compile()
+        
+        words = [word for word in self._normalize(text).split(" ") if word not in FILLER_WORDS]
+        columns, counts = self._hashed_ngrams(" ".join(words))
+        if len(columns) == 0:
+            return None
+        
+        # Пересечение считается только по столбцам, присутствующим в тексте
+        counts = np.minimum(counts, 255).astype(np.uint8)
+        overlap = np.minimum(self._matrix[:, columns], counts).sum(axis=1, dtype=np.float32)
+        scores = 2 * overlap / (self._totals + float(counts.sum(dtype=np.float32)))
+        
+        best = int(np.argmax(scores))
+        best_score = float(scores[best])
+        if best_score < self.threshold:
+            return None
+        
+        others = scores[self._intent_ids != self._intent_ids[best]]
+        if others.size and best_score - float(others.max()) < self.margin:
+            logger.info(f"Ambiguous fuzzy intent match for '{text}' (score {best_score:.2f})")
+            return None
+        
+        phrase, intent, handler = self._phrases[best]
+        return IntentMatch(intent=intent, phrase=phrase, handler=handler, score=round(best_score, 3))
+    
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text.lower().replace("ё", "е")).strip()
+    
+    def _hashed_ngrams(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        return hashed_ngrams(text, self.dimensions)
@@ -1,16 +1,40 @@
 import logging
-from openai import OpenAI
-from typing import Optional, List, Dict
+import re
+from time import perf_counter
+from openai import AsyncOpenAI
+from typing import Optional, List, Dict, AsyncIterator
 from backend.config import settings
+from .response_cache import ResponseCache
+from .state_backend import StateBackend, create_state_backend
+from .metrics import STAGE_DURATION, UPSTREAM_ERRORS
 
 logger = logging.getLogger(__name__)
 
+# Ответ на такие запросы зависит от момента (дата, время, новости, курсы, погода)
+# и устаревает раньше LLM_CACHE_TTL, поэтому в кэш они не попадают
+_TIME_SENSITIVE = re.compile(
+    r"\b(?:сегодн|завтр|вчер|сейчас|новост|курс|погод|котировк|текущ|нынешн|последн"
+    r"|today|tomorrow|yesterday|news|weather|current|latest)\w*"
+    r"|\b(?:который час|сколько времени|время|дата|дату|число|день недели"
+    r"|now|time|date|rates?|prices?)\b",
+    re.IGNORECASE,
+)
+
 
 class LLMHandler:
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, state: Optional[StateBackend] = None):
+        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.GPT_MODEL
-        self.conversation_history: List[Dict[str, str]] = []
+        self.max_tokens = 500
+        self.temperature = 0.7
+        # История разговоров живёт в общем бэкенде состояния, чтобы её видели все воркеры
+        self.state = state or create_state_backend()
+        self.response_cache = ResponseCache(
+            ttl=settings.LLM_CACHE_TTL,
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            similar=settings.LLM_CACHE_SIMILAR_ENABLED,
+            similarity_threshold=settings.LLM_CACHE_SIMILARITY,
+        ) if settings.LLM_CACHE_ENABLED else None
         
         self.system_prompt = """Ты — Джарвис, высокоинтеллектуальный AI-ассистент, созданный по образу Джарвиса из вселенной Marvel. 
 Твои характеристики:
@@ -23,56 +47,154 @@ class LLMHandler:
 - Отвечай на том же языке, на котором задан вопрос (русский или английский)
 
 Будь полезным и эффективным помощником!"""
+
+    def _build_messages(self, user_message: str, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        messages = []
+        
+        messages.append({
+            "role": "system",
+            "content": self.system_prompt
+        })
+        
+        messages.extend(history)
+        
+        messages.append({
+            "role": "user",
+            "content": user_message
+        })
+        
+        return messages
+    
+    async def _load_history(self, use_history: bool, session_id: str) -> List[Dict[str, str]]:
+        return await self.state.history(session_id) if use_history else []
+    
+    async def _commit_history(self, session_id: str, user_message: str, assistant_message: str):
+        await self.state.append_history(session_id, [
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": assistant_message},
+        ])
+    
+    def _is_context_free(self, user_message: str, history: List[Dict[str, str]]) -> bool:
+        # Кэшируются только запросы без истории разговора и без привязки ко времени:
+        # ответ не зависит ни от контекста, ни от момента запроса
+        return (
+            self.response_cache is not None
+            and not history
+            and not _TIME_SENSITIVE.search(user_message)
+        )
     
-    async def get_response(self, user_message: str, use_history: bool = True) -> Optional[str]:
+    def _cached_response(self, user_message: str) -> Optional[str]:
+        cached = self.response_cache.get(user_message)
+        if cached is None:
+            return None
+        response, score = cached
+        logger.info(f"LLM response cache hit (score {score}): {user_message}")
+        return response
+    
+    async def get_response(self, user_message: str, use_history: bool = True, session_id: str = "default", use_cache: bool = True) -> Optional[str]:
         try:
-            messages = []
-            
-            messages.append({
-                "role": "system",
-                "content": self.system_prompt
-            })
+            history = await self._load_history(use_history, session_id)
+            context_free = self._is_context_free(user_message, history)
+            if context_free and use_cache:
+                cached = self._cached_response(user_message)
+                if cached is not None:
+                    if use_history:
+                        await self._commit_history(session_id, user_message, cached)
+                    return cached
             
-            if use_history and self.conversation_history:
-                messages.extend(self.conversation_history[-10:])
-            
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
+            messages = self._build_messages(user_message, history)
             
             logger.info(f"Sending request to GPT-4: {user_message}")
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7,
-            )
+            with STAGE_DURATION.time("llm"):
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=self.max_tokens,
+                    temperature=self.temperature,
+                )
             
             assistant_message = response.choices[0].message.content
             
             if use_history:
-                self.conversation_history.append({
-                    "role": "user",
-                    "content": user_message
-                })
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": assistant_message
-                })
+                await self._commit_history(session_id, user_message, assistant_message)
+            
+            if context_free:
+                self.response_cache.put(user_message, assistant_message)
             
             logger.info(f"GPT-4 response: {assistant_message}")
             
             return assistant_message
-            
+        
         except Exception as e:
             logger.error(f"Error getting GPT-4 response: {e}")
+            UPSTREAM_ERRORS.inc("openai_chat")
             return None
     
-    def clear_history(self):
-        self.conversation_history = []
-        logger.info("Conversation history cleared")
+    async def stream_response(self, user_message: str, use_history: bool = True, session_id: str = "default", use_cache: bool = True) -> AsyncIterator[str]:
+        """
+        Потоковый ответ GPT: отдаёт фрагменты текста по мере генерации.
+        История разговора пополняется только после полного завершения потока.
+        """
+        parts: List[str] = []
+        
+        history = await self._load_history(use_history, session_id)
+        context_free = self._is_context_free(user_message, history)
+        if context_free and use_cache:
+            cached = self._cached_response(user_message)
+            if cached is not None:
+                if use_history:
+                    await self._commit_history(session_id, user_message, cached)
+                yield cached
+                return
+        
+        try:
+            messages = self._build_messages(user_message, history)
+            
+            logger.info(f"Streaming request to GPT-4: {user_message}")
+            
+            started = perf_counter()
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stream=True,
+            )
+            
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not parts:
+                            STAGE_DURATION.observe(perf_counter() - started, "llm_first_token")
+                        parts.append(delta)
+                        yield delta
+            finally:
+                # Прерванный ответ (barge-in) закрывает соединение, и модель перестаёт генерировать
+                await stream.close()
+        
+        except Exception as e:
+            logger.error(f"Error streaming GPT-4 response: {e}")
+            UPSTREAM_ERRORS.inc("openai_chat")
+            return
+        
+        STAGE_DURATION.observe(perf_counter() - started, "llm")
+        assistant_message = "".join(parts)
+        
+        if use_history and assistant_message:
+            await self._commit_history(session_id, user_message, assistant_message)
+        
+        if context_free and assistant_message:
+            self.response_cache.put(user_message, assistant_message)
+        
+        logger.info(f"GPT-4 streamed response: {assistant_message}")
+    
+    async def clear_history(self, session_id: str = "default"):
+        await self.state.clear_history(session_id)
+        logger.info(f"Conversation history cleared for session {session_id}")
     
-    def get_history(self) -> List[Dict[str, str]]:
-        return self.conversation_history
+    async def get_history(self, session_id: str = "default") -> List[Dict[str, str]]:
+        return await self.state.history(session_id)
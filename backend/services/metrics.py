@@ -0,0 +1,321 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин задержек в секундах: от декодирования куска аудио до ответа GPT
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Starlette сам добавляет charset=utf-8 к текстовым типам
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+Labels = Tuple[str, ...]
+
+
+class Counter:
+    """Монотонный счётчик; значения меток передаются позиционно в порядке labelnames"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+    
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+    
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+    
+    def series(self) -> List[Tuple[Labels, Any]]:
+        return list(self._values.items())
+
+
+class Gauge:
+    """Текущее значение; func — вычислять при каждом сборе (например, число соединений)"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), func: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._func = func
+    
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+    
+    def set_function(self, func: Callable[[], float]):
+        self._func = func
+    
+    def series(self) -> List[Tuple[Labels, Any]]:
+        if self._func is not None:
+            try:
+                return [((), float(self._func()))]
+            except Exception as e:
+                logger.error(f"Error collecting gauge {self.name}: {e}")
+                return []
+        return list(self._values.items())
+
+
+class Timer:
+    """
+    Контекстный менеджер замера: длительность блока уходит в гистограмму.
+    Отменённый блок (barge-in, отключение клиента) не записывается, ошибка — записывается.
+    """
+    
+    __slots__ = ("_buckets", "_series", "_started")
+    
+    def __init__(self, buckets: Tuple[float, ...], series: List[float]):
+        # Серия найдена заранее: на выходе из блока остаются бисекция и два сложения
+        self._buckets = buckets
+        self._series = series
+    
+    def __enter__(self) -> "Timer":
+        self._started = perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None or issubclass(exc_type, Exception):
+            elapsed = perf_counter() - self._started
+            series = self._series
+            series[bisect_left(self._buckets, elapsed)] += 1
+            series[-1] += elapsed
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными корзинами: наблюдение — поиск корзины бисекцией
+    и два сложения, без блокировок (метрики живут в одном event loop процесса).
+    Серия хранится списком [счётчики корзин..., +Inf, сумма].
+    """
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, List[float]] = {}
+    
+    def _get_series(self, labels: Labels) -> List[float]:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        return series
+    
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels) or self._get_series(labels)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+    
+    def time(self, *labels: str) -> Timer:
+        return Timer(self.buckets, self._series.get(labels) or self._get_series(labels))
+    
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series is not None else 0
+    
+    def series(self) -> List[Tuple[Labels, Any]]:
+        return [(labels, list(values)) for labels, values in self._series.items()]
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса и их вывод в текстовом формате Prometheus. С несколькими
+    воркерами каждый периодически сохраняет снимок в общий каталог, а /metrics
+    любого воркера суммирует свои значения со снимками остальных.
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+    
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), func: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, func))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "type": metric.kind,
+                "help": metric.documentation,
+                "labels": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "series": [[list(labels), value] for labels, value in metric.series()],
+            }
+            for name, metric in self._metrics.items()
+        }
+    
+    def render(self, others: Sequence[Dict[str, Any]] = ()) -> str:
+        """Текст для Prometheus; others — снимки других воркеров"""
+        return render_snapshot(merge_snapshots([self.snapshot(), *others]))
+
+
+def merge_snapshots(snapshots: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Суммирует серии с одинаковыми метками (счётчики, корзины гистограмм, датчики)"""
+    merged: Dict[str, Any] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "series": {}})
+            for labels, value in metric["series"]:
+                key = tuple(labels)
+                current = target["series"].get(key)
+                if current is None:
+                    target["series"][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target["series"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["series"][key] = current + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], le: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_snapshot(snapshot: Dict[str, Any]) -> str:
+    lines: List[str] = []
+    for name, metric in snapshot.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric["labels"]
+        for labels, value in sorted(metric["series"].items()):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(names, labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip([*metric["buckets"], "+Inf"], value[:-1]):
+                cumulative += count
+                le = bound if isinstance(bound, str) else _format_value(bound)
+                lines.append(f"{name}_bucket{_format_labels(names, labels, le)} {_format_value(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(names, labels)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(names, labels)} {_format_value(cumulative)}")
+    return "\n".join(lines) + "\n"
+
+
+class MultiprocessExporter:
+    """
+    Обмен снимками метрик между воркерами через каталог: каждый воркер раз
+    в interval записывает свой снимок в <pid>.json. Счётчики завершившихся
+    воркеров продолжают учитываться (иначе суммы в Prometheus уменьшались бы),
+    а датчики — только у воркеров, обновлявших снимок недавно.
+    """
+    
+    def __init__(self, registry: MetricsRegistry, directory: str, interval: float = 5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{os.getpid()}.json")
+    
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._task = asyncio.create_task(self._run())
+    
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self._write, self.registry.snapshot())
+    
+    async def collect(self) -> List[Dict[str, Any]]:
+        """Снимки остальных воркеров"""
+        return await asyncio.to_thread(self._read_others)
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._write, self.registry.snapshot())
+            except Exception as e:
+                logger.error(f"Error writing metrics snapshot: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def _write(self, snapshot: Dict[str, Any]):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file, ensure_ascii=False)
+        os.replace(temporary, self.path)
+    
+    def _read_others(self) -> List[Dict[str, Any]]:
+        snapshots = []
+        own = os.path.basename(self.path)
+        stale_before = time.time() - 3 * self.interval
+        for entry in os.scandir(self.directory):
+            if entry.name == own or not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as file:
+                    snapshot = json.load(file)
+                stale = entry.stat().st_mtime < stale_before
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics snapshot {entry.name}: {e}")
+                continue
+            if stale:
+                snapshot = {name: metric for name, metric in snapshot.items() if metric["type"] != "gauge"}
+            snapshots.append(snapshot)
+        return snapshots
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "jarvis_stage_duration_seconds",
+    "Duration of voice pipeline stages",
+    ["stage"],
+)
+COMMANDS = registry.counter(
+    "jarvis_commands_total",
+    "Processed commands by handling path (predefined or gpt)",
+    ["type"],
+)
+ASR_TRANSCRIPTIONS = registry.counter(
+    "jarvis_asr_transcriptions_total",
+    "Transcriptions by the engine whose result was used",
+    ["engine"],
+)
+UPSTREAM_ERRORS = registry.counter(
+    "jarvis_upstream_errors_total",
+    "Failed requests to external APIs",
+    ["upstream"],
+)
+ACTIVE_CONNECTIONS = registry.gauge(
+    "jarvis_websocket_connections",
+    "Open WebSocket connections",
+)
+TURNS_IN_FLIGHT = registry.gauge(
+    "jarvis_turns_in_flight",
+    "Dialogue turns currently being answered",
+)
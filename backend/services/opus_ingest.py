@@ -0,0 +1,292 @@
+import logging
+import struct
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+OGG_MAGIC = b"OggS"
+
+# Элементы Matroska/WebM, нужные для извлечения Opus пакетов
+SEGMENT = 0x18538067
+CLUSTER = 0x1F43B675
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+BLOCK_GROUP = 0xA0
+SIMPLE_BLOCK = 0xA3
+BLOCK = 0xA1
+TRACK_NUMBER = 0xD7
+CODEC_ID = 0x86
+CODEC_PRIVATE = 0x63A2
+
+# Контейнерные элементы: разбираем их содержимое, не дожидаясь конца
+MASTER_ELEMENTS = {SEGMENT, CLUSTER, TRACKS, TRACK_ENTRY, BLOCK_GROUP}
+# Листовые элементы, содержимое которых нужно целиком
+LEAF_ELEMENTS = {SIMPLE_BLOCK, BLOCK, TRACK_NUMBER, CODEC_ID, CODEC_PRIVATE}
+
+OGG_PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+
+
+def is_compressed_audio(chunk: bytes) -> bool:
+    """Начало WebM или Ogg потока (MediaRecorder отдаёт заголовок в первом куске)"""
+    return chunk[:4] in (EBML_MAGIC, OGG_MAGIC)
+
+
+def _read_vint(data: bytearray, offset: int, keep_marker: bool) -> Optional[Tuple[int, int]]:
+    """Читает EBML число переменной длины: (значение, длина) или None, если данных мало"""
+    if offset >= len(data):
+        return None
+    first = data[offset]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("Invalid EBML variable-length integer")
+    if offset + length > len(data):
+        return None
+    value = first if keep_marker else first & (mask - 1)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        # Все единицы — неизвестный размер (так MediaRecorder пишет Segment и Cluster)
+        value = -1
+    return value, length
+
+
+class WebMDemuxer:
+    """
+    Инкрементальный разбор WebM: на вход куски в любом разбиении, на выход —
+    Opus пакеты аудио дорожки. Вложенность элементов не отслеживается: контейнеры
+    просто «раскрываются», поэтому работают и элементы неизвестного размера.
+    """
+    
+    def __init__(self):
+        self._buffer = bytearray()
+        self._skip = 0
+        self._track_number: Optional[int] = None
+        self._entry_number: Optional[int] = None
+        self._entry_codec: Optional[str] = None
+        self.codec_private: Optional[bytes] = None
+    
+    def feed(self, chunk: bytes) -> List[bytes]:
+        self._buffer += chunk
+        packets: List[bytes] = []
+        offset = 0
+        
+        while True:
+            if self._skip:
+                # Ненужный элемент может тянуться через несколько кусков
+                skipped = min(self._skip, len(self._buffer) - offset)
+                offset += skipped
+                self._skip -= skipped
+                if self._skip:
+                    break
+            
+            element_id = _read_vint(self._buffer, offset, keep_marker=True)
+            if element_id is None:
+                break
+            size = _read_vint(self._buffer, offset + element_id[1], keep_marker=False)
+            if size is None:
+                break
+            
+            element, header_length = element_id[0], element_id[1] + size[1]
+            body = offset + header_length
+            
+            if element in MASTER_ELEMENTS:
+                offset = body
+                continue
+            if size[0] < 0:
+                raise ValueError(f"Unknown-size leaf element 0x{element:X}")
+            if element not in LEAF_ELEMENTS:
+                offset = body
+                self._skip = size[0]
+                continue
+            if body + size[0] > len(self._buffer):
+                break
+            
+            payload = bytes(self._buffer[body:body + size[0]])
+            offset = body + size[0]
+            packet = self._handle_leaf(element, payload)
+            if packet is not None:
+                packets.append(packet)
+        
+        del self._buffer[:offset]
+        return packets
+    
+    def _handle_leaf(self, element: int, payload: bytes) -> Optional[bytes]:
+        if element == TRACK_NUMBER:
+            self._entry_number = int.from_bytes(payload, "big")
+        elif element == CODEC_ID:
+            self._entry_codec = payload.decode("ascii", "ignore").rstrip("\x00")
+        elif element == CODEC_PRIVATE:
+            if self._entry_codec == "A_OPUS" or payload.startswith(b"OpusHead"):
+                self.codec_private = payload
+        
+        if self._track_number is None and self._entry_codec == "A_OPUS" and self._entry_number is not None:
+            self._track_number = self._entry_number
+        
+        if element in (SIMPLE_BLOCK, BLOCK):
+            return self._block_payload(payload)
+        return None
+    
+    def _block_payload(self, block: bytes) -> Optional[bytes]:
+        track = _read_vint(bytearray(block[:8]), 0, keep_marker=False)
+        if track is None:
+            return None
+        if self._track_number is not None and track[0] != self._track_number:
+            return None
+        flags = block[track[1] + 2]
+        if flags & 0x06:
+            # Браузеры не используют lacing для Opus; такие блоки пропускаем
+            logger.warning("Laced WebM blocks are not supported, block skipped")
+            return None
+        return block[track[1] + 3:]
+
+
+class OggDemuxer:
+    """Инкрементальный разбор Ogg страниц в Opus пакеты"""
+    
+    def __init__(self):
+        self._buffer = bytearray()
+        self._packet = bytearray()
+        self.codec_private: Optional[bytes] = None
+        self._headers_seen = 0
+    
+    def feed(self, chunk: bytes) -> List[bytes]:
+        self._buffer += chunk
+        packets: List[bytes] = []
+        offset = 0
+        
+        while len(self._buffer) - offset >= OGG_PAGE_HEADER.size:
+            if self._buffer[offset:offset + 4] != OGG_MAGIC:
+                # Потеря синхронизации: ищем следующую страницу
+                found = self._buffer.find(OGG_MAGIC, offset + 1)
+                offset = found if found >= 0 else len(self._buffer) - 3
+                continue
+            
+            segments = self._buffer[offset + 26]
+            table_end = offset + OGG_PAGE_HEADER.size + segments
+            if table_end > len(self._buffer):
+                break
+            lacing = self._buffer[offset + OGG_PAGE_HEADER.size:table_end]
+            page_end = table_end + sum(lacing)
+            if page_end > len(self._buffer):
+                break
+            
+            position = table_end
+            for value in lacing:
+                self._packet += self._buffer[position:position + value]
+                position += value
+                if value < 255:
+                    packets.extend(self._complete_packet(bytes(self._packet)))
+                    self._packet.clear()
+            offset = page_end
+        
+        del self._buffer[:offset]
+        return packets
+    
+    def _complete_packet(self, packet: bytes) -> List[bytes]:
+        if self._headers_seen < 2:
+            # Первые два пакета потока — OpusHead и OpusTags
+            self._headers_seen += 1
+            if packet.startswith(b"OpusHead"):
+                self.codec_private = packet
+            return []
+        return [packet]
+
+
+class OpusStreamDecoder:
+    """
+    Декодер сжатого микрофонного потока одного соединения: WebM или Ogg Opus
+    куски превращаются в 16-битный моно PCM нужной частоты по мере поступления.
+    Новый заголовок контейнера (следующая запись MediaRecorder) сбрасывает состояние.
+    """
+    
+    def __init__(self, sample_rate: int = 16000):
+        import av
+        
+        self._av = av
+        self.sample_rate = sample_rate
+        self._demuxer = None
+        self._codec = None
+        self._resampler = None
+        self._resync = False
+        self.decoded_bytes = 0
+        self.compressed_bytes = 0
+    
+    @classmethod
+    def create(cls, sample_rate: int = 16000) -> Optional["OpusStreamDecoder"]:
+        try:
+            return cls(sample_rate)
+        except ImportError:
+            logger.warning("PyAV is not installed, compressed audio cannot be decoded")
+            return None
+    
+    def feed(self, chunk: bytes) -> bytes:
+        """
+        Принимает кусок контейнера, возвращает декодированный PCM (может быть пустым).
+        Декодирование синхронное и занимает сотни микросекунд на кусок, поэтому
+        вызывающий код выполняет его вне цикла событий.
+        """
+        self.compressed_bytes += len(chunk)
+        if chunk[:4] == EBML_MAGIC:
+            self._start(WebMDemuxer())
+        elif chunk[:4] == OGG_MAGIC and (self._demuxer is None or (len(chunk) >= 6 and chunk[5] & 0x02)):
+            # Флаг BOS означает начало нового логического потока
+            self._start(OggDemuxer())
+        if self._demuxer is None:
+            if self._resync:
+                # После испорченного куска ждём заголовок следующей записи, не сообщая об ошибке на каждый кусок
+                return b""
+            raise ValueError("Compressed stream must start with a WebM or Ogg header")
+        
+        try:
+            packets = self._demuxer.feed(chunk)
+        except (ValueError, IndexError) as e:
+            # Иначе буфер демультиплексора застревал бы на испорченных данных навсегда
+            self.reset()
+            self._resync = True
+            raise ValueError(f"Malformed compressed stream, waiting for the next header: {e}") from e
+        
+        pcm = bytearray()
+        for packet in packets:
+            pcm += self._decode(packet)
+        self.decoded_bytes += len(pcm)
+        return bytes(pcm)
+    
+    def reset(self):
+        self._demuxer = None
+        self._codec = None
+        self._resampler = None
+    
+    def _start(self, demuxer):
+        self.reset()
+        self._resync = False
+        self._demuxer = demuxer
+    
+    def _open_codec(self):
+        head = self._demuxer.codec_private
+        channels = head[9] if head and len(head) >= 19 else 1
+        codec = self._av.CodecContext.create("opus", "r")
+        codec.sample_rate = 48000
+        codec.layout = "stereo" if channels == 2 else "mono"
+        if head:
+            codec.extradata = head
+        self._codec = codec
+        self._resampler = self._av.AudioResampler(format="s16", layout="mono", rate=self.sample_rate)
+    
+    def _decode(self, packet: bytes) -> bytes:
+        if self._codec is None:
+            self._open_codec()
+        pcm = bytearray()
+        try:
+            frames = self._codec.decode(self._av.Packet(packet))
+        except self._av.FFmpegError as e:
+            logger.warning(f"Dropping undecodable Opus packet: {e}")
+            return b""
+        for frame in frames:
+            for resampled in self._resampler.resample(frame):
+                pcm += resampled.to_ndarray().tobytes()
+        return bytes(pcm)
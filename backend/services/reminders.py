@@ -0,0 +1,408 @@
+import asyncio
+import heapq
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "ten": 10, "fifteen": 15, "twenty": 20, "thirty": 30, "forty": 40,
+    "один": 1, "одну": 1, "одна": 1, "два": 2, "две": 2, "три": 3, "четыре": 4,
+    "пять": 5, "шесть": 6, "семь": 7, "восемь": 8, "девять": 9, "десять": 10,
+    "пятнадцать": 15, "двадцать": 20, "тридцать": 30, "сорок": 40, "пятьдесят": 50,
+}
+
+# Срок напоминаний владельца наступил: доставить их, если владелец подключён к этому воркеру
+ReminderHandler = Callable[[str], Awaitable[None]]
+# Сообщить остальным воркерам о новом напоминании, чтобы они тоже его запланировали
+ReminderAnnouncer = Callable[["Reminder"], Awaitable[None]]
+# Может ли этот воркер доставить напоминания владельца (владелец подключён к нему)
+ReminderFilter = Callable[[str], bool]
+
+# Длительность единицы по началу слова: "минут", "минуты", "minutes" и т.д.
+UNIT_SECONDS = [
+    ("сек", 1), ("second", 1),
+    ("мин", 60), ("minute", 60),
+    ("час", 3600), ("hour", 3600),
+    ("д", 86400), ("сут", 86400), ("day", 86400),
+    ("недел", 604800), ("week", 604800),
+]
+
+DAY_OFFSETS = {"сегодня": 0, "today": 0, "завтра": 1, "tomorrow": 1, "послезавтра": 2}
+
+RELATIVE_RE = re.compile(
+    r"\b(?:через|in)\s+"
+    r"(?:(\d+|" + "|".join(NUMBER_WORDS) + r")\s+)?"
+    r"(секунд\w*|сек\b|минут\w*|мин\b|час\w*|дн\w*|день|сутки|недел\w*|"
+    r"seconds?|minutes?|hours?|days?|weeks?)",
+    re.IGNORECASE,
+)
+HALF_HOUR_RE = re.compile(r"\b(?:через\s+полчаса|in\s+half\s+an\s+hour)\b", re.IGNORECASE)
+ABSOLUTE_RE = re.compile(
+    r"\b(?:(сегодня|завтра|послезавтра|today|tomorrow)\s+)?"
+    r"(?:в|at)\s+(\d{1,2})(?:[:.](\d{2}))?(?:\s*час\w*)?"
+    r"(?:\s*(утра|дня|вечера|ночи|am|pm)\b)?",
+    re.IGNORECASE,
+)
+DAY_RE = re.compile(r"\b(послезавтра|завтра|tomorrow)\b", re.IGNORECASE)
+# Служебные слова в начале: "напомни мне о ...", "remind me to ..."
+PREFIX_RE = re.compile(r"^(?:\s*\b(?:напомни(?:те)?|remind\s+me|мне|об?|про|about|to|that)\b)+", re.IGNORECASE)
+
+
+def _unit_seconds(unit: str) -> int:
+    unit = unit.lower()
+    for prefix, seconds in UNIT_SECONDS:
+        if unit.startswith(prefix):
+            return seconds
+    return 60
+
+
+def parse_reminder(text: str, now: Optional[datetime] = None, default_hour: int = 9) -> Tuple[str, Optional[datetime]]:
+    """
+    Разбирает фразу напоминания на текст и время срабатывания: "через 10 минут",
+    "через полчаса", "в 18:30", "завтра в 9 утра", "in 2 hours", "tomorrow at 7 pm".
+    Прошедшее сегодня время переносится на завтра; "завтра" без часа — default_hour.
+    Без указания времени возвращается None: напоминание сохраняется, но не срабатывает.
+    """
+    now = now or datetime.now()
+    due: Optional[datetime] = None
+    
+    match = HALF_HOUR_RE.search(text)
+    if match:
+        due = now + timedelta(minutes=30)
+    else:
+        match = RELATIVE_RE.search(text)
+        if match:
+            amount = match.group(1)
+            count = int(amount) if amount and amount.isdigit() else NUMBER_WORDS.get((amount or "").lower(), 1)
+            due = now + timedelta(seconds=count * _unit_seconds(match.group(2)))
+    
+    if due is None:
+        match = ABSOLUTE_RE.search(text)
+        if match:
+            day, hour, minute, period = match.group(1), int(match.group(2)), int(match.group(3) or 0), (match.group(4) or "").lower()
+            if period in ("pm", "дня", "вечера") and hour < 12:
+                hour += 12
+            elif period in ("am", "ночи", "утра") and hour == 12:
+                hour = 0
+            if hour > 23 or minute > 59:
+                match = None
+            else:
+                due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+                if day:
+                    due += timedelta(days=DAY_OFFSETS[day.lower()])
+                elif due <= now:
+                    due += timedelta(days=1)
+    
+    if due is None:
+        match = DAY_RE.search(text)
+        if match:
+            due = now.replace(hour=default_hour, minute=0, second=0, microsecond=0)
+            due += timedelta(days=DAY_OFFSETS[match.group(1).lower()])
+    
+    if match is not None:
+        text = text[:match.start()] + " " + text[match.end():]
+    text = PREFIX_RE.sub("", text)
+    text = re.sub(r"\s+", " ", text).strip(" ,.!?")
+    return text, due
+
+
+@dataclass
+class Reminder:
+    id: int
+    owner: str
+    text: str
+    created_at: float
+    due_at: Optional[float] = None
+    fired_at: Optional[float] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "text": self.text,
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
+            "due_at": datetime.fromtimestamp(self.due_at).isoformat() if self.due_at is not None else None,
+            "fired": self.fired_at is not None,
+        }
+
+
+class ReminderStore:
+    """
+    Напоминания в файле SQLite (WAL): переживают перезапуск и общие для воркеров
+    одного хоста. Список владельца читается по индексу (owner, id) постранично,
+    ожидающие — по частичному индексу due_at. fired_at ставится атомарно в момент
+    доставки подключённому владельцу, поэтому каждое напоминание доставляет ровно
+    один воркер, а напоминание отключённого владельца ждёт его подключения.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner TEXT NOT NULL,
+            text TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            due_at REAL,
+            fired_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS reminders_owner ON reminders (owner, id);
+        CREATE INDEX IF NOT EXISTS reminders_pending ON reminders (due_at)
+            WHERE fired_at IS NULL AND due_at IS NOT NULL;
+    """
+    COLUMNS = "id, owner, text, created_at, due_at, fired_at"
+    
+    def __init__(self, path: str):
+        self.path = path
+        # Соединение открывается при первом запросе, уже в процессе воркера
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+    
+    async def add(self, owner: str, text: str, due_at: Optional[float] = None) -> Reminder:
+        return await self._run(self._add_sync, owner, text, due_at)
+    
+    async def page(self, owner: str, limit: int, cursor: int = 0) -> Tuple[List[Reminder], Optional[int]]:
+        """Страница напоминаний владельца после cursor (id) и курсор следующей страницы"""
+        rows = await self._run(
+            self._fetch,
+            f"SELECT {self.COLUMNS} FROM reminders WHERE owner = ? AND id > ? ORDER BY id LIMIT ?",
+            (owner, cursor, limit + 1),
+        )
+        reminders = [Reminder(*row) for row in rows[:limit]]
+        next_cursor = reminders[-1].id if len(rows) > limit else None
+        return reminders, next_cursor
+    
+    async def pending(self, owner: Optional[str] = None) -> List[Tuple[float, int, str]]:
+        """(due_at, id, owner) недоставленных напоминаний со временем (всех или владельца) — для загрузки в кучу"""
+        if owner is None:
+            return await self._run(
+                self._fetch,
+                "SELECT due_at, id, owner FROM reminders WHERE fired_at IS NULL AND due_at IS NOT NULL",
+                (),
+            )
+        return await self._run(
+            self._fetch,
+            "SELECT due_at, id, owner FROM reminders WHERE owner = ? AND fired_at IS NULL AND due_at IS NOT NULL",
+            (owner,),
+        )
+    
+    async def claim_due(self, owner: str, now: float) -> List[Reminder]:
+        """
+        Помечает наступившие напоминания владельца доставленными и возвращает их;
+        забранные другим воркером (или другим соединением) не возвращаются
+        """
+        return await self._run(self._claim_due_sync, owner, now)
+    
+    async def stats(self) -> Dict[str, int]:
+        rows = await self._run(
+            self._fetch,
+            "SELECT COUNT(*), (SELECT COUNT(*) FROM reminders WHERE fired_at IS NULL AND due_at IS NOT NULL) FROM reminders",
+            (),
+        )
+        total, pending = rows[0]
+        return {"total": total, "pending": pending}
+    
+    async def close(self):
+        await self._run(self._close_sync)
+    
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(self._locked, func, *args)
+    
+    def _locked(self, func, *args):
+        with self._lock:
+            if self._db is None:
+                self._connect_sync()
+            return func(*args)
+    
+    def _connect_sync(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(self.SCHEMA)
+    
+    def _close_sync(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+    
+    def _fetch(self, sql: str, params: tuple) -> List[tuple]:
+        return self._db.execute(sql, params).fetchall()
+    
+    def _add_sync(self, owner: str, text: str, due_at: Optional[float]) -> Reminder:
+        created_at = time.time()
+        cursor = self._db.execute(
+            "INSERT INTO reminders (owner, text, created_at, due_at) VALUES (?, ?, ?, ?)",
+            (owner, text, created_at, due_at),
+        )
+        return Reminder(cursor.lastrowid, owner, text, created_at, due_at)
+    
+    def _claim_due_sync(self, owner: str, now: float) -> List[Reminder]:
+        rows = self._db.execute(
+            f"UPDATE reminders SET fired_at = ? WHERE owner = ? AND fired_at IS NULL AND due_at <= ? RETURNING {self.COLUMNS}",
+            (now, owner, now),
+        ).fetchall()
+        return sorted((Reminder(*row) for row in rows), key=lambda reminder: (reminder.due_at, reminder.id))
+
+
+class ReminderScheduler:
+    """
+    Планировщик напоминаний: min-куча (due_at, id, owner) и одна спящая задача, которая
+    ждёт ровно до ближайшего срока. Новое напоминание раньше текущей вершины будит
+    её через Event, так что опроса нет, а планирование стоит O(log n) при любом
+    числе ожидающих. На старте куча заполняется из хранилища, просроченные за время
+    простоя срабатывают сразу.
+    
+    Срок напоминания только будит обработчик владельца: напоминание помечается
+    доставленным (claim_due), когда его забирает соединение владельца. Если владелец
+    не подключён, оно остаётся в хранилище и уходит при следующем подключении.
+    
+    С фильтром accepts воркер держит в куче только напоминания владельцев, которых
+    может доставить: они загружаются при подключении владельца (watch), новые
+    с других воркеров приходят через announce и отбрасываются, если владелец не здесь.
+    Без фильтра (один процесс) в куче все ожидающие напоминания.
+    """
+    
+    # Сон ограничен, чтобы перевод системных часов не откладывал срабатывание надолго
+    MAX_SLEEP = 3600.0
+    # Повтор после ошибки обработчика (например, занятой базы)
+    RETRY_DELAY = 1.0
+    
+    def __init__(self, store: ReminderStore, batch_size: int = 500):
+        self.store = store
+        # Сколько владельцев обрабатывается одновременно
+        self.batch_size = batch_size
+        self._handler: Optional[ReminderHandler] = None
+        self._announce: Optional[ReminderAnnouncer] = None
+        self._accepts: Optional[ReminderFilter] = None
+        
+        self._heap: List[Tuple[float, int, str]] = []
+        # id в куче: повторное подключение владельца не дублирует его напоминания
+        self._queued: Set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        
+        self.fired = 0
+    
+    async def start(
+        self,
+        handler: Optional[ReminderHandler] = None,
+        announce: Optional[ReminderAnnouncer] = None,
+        accepts: Optional[ReminderFilter] = None,
+    ):
+        self._handler = handler
+        self._announce = announce
+        self._accepts = accepts
+        if accepts is None:
+            self._heap = await self.store.pending()
+            heapq.heapify(self._heap)
+            self._queued = {reminder_id for _, reminder_id, _ in self._heap}
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Reminder scheduler started with {len(self._heap)} pending reminders")
+    
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.store.close()
+    
+    async def add(self, owner: str, text: str, due_at: Optional[datetime] = None) -> Reminder:
+        reminder = await self.store.add(owner, text, due_at.timestamp() if due_at is not None else None)
+        if reminder.due_at is not None:
+            # Владелец может быть подключён к другому воркеру: там напоминание запланирует announce
+            self.schedule(reminder.due_at, reminder.id, reminder.owner)
+            if self._announce is not None:
+                try:
+                    await self._announce(reminder)
+                except Exception as e:
+                    # Напоминание сохранено; остальные воркеры загрузят его при перезапуске
+                    logger.error(f"Error announcing reminder {reminder.id}: {e}")
+        return reminder
+    
+    async def watch(self, owner: str):
+        """Владелец подключился: его ожидающие напоминания попадают в кучу, просроченные срабатывают сразу"""
+        for due_at, reminder_id, _ in await self.store.pending(owner):
+            self.schedule(due_at, reminder_id, owner)
+    
+    def schedule(self, due_at: float, reminder_id: int, owner: str):
+        if reminder_id in self._queued:
+            return
+        if self._accepts is not None and not self._accepts(owner):
+            # Владелец не подключён к этому воркеру: напоминание загрузит watch при подключении
+            return
+        self._queued.add(reminder_id)
+        heapq.heappush(self._heap, (due_at, reminder_id, owner))
+        if self._heap[0][1] == reminder_id:
+            # Новая вершина кучи: спящая задача пересчитывает время пробуждения
+            self._wakeup.set()
+    
+    async def claim_due(self, owner: str) -> List[Reminder]:
+        """Наступившие недоставленные напоминания владельца; вызывается, когда есть куда их отправить"""
+        reminders = await self.store.claim_due(owner, time.time())
+        self.fired += len(reminders)
+        return reminders
+    
+    async def page(self, owner: str, limit: int, cursor: int = 0) -> Tuple[List[Reminder], Optional[int]]:
+        return await self.store.page(owner, limit, cursor)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "scheduled": len(self._heap),
+            "fired": self.fired,
+            "next_due_in": round(self._heap[0][0] - time.time(), 1) if self._heap else None,
+        }
+    
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._heap[0][0] - time.time() if self._heap else self.MAX_SLEEP
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, self.MAX_SLEEP))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            # Обработчик забирает все наступившие напоминания владельца сразу,
+            # поэтому владелец вызывается один раз, сколько бы их ни было
+            now = time.time()
+            due: Dict[str, List[Tuple[float, int, str]]] = {}
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                self._queued.discard(entry[1])
+                if self._accepts is None or self._accepts(entry[2]):
+                    due.setdefault(entry[2], []).append(entry)
+            
+            if self._handler is None:
+                continue
+            owners = list(due.items())
+            for start in range(0, len(owners), self.batch_size):
+                # Владельцы обрабатываются параллельно: медленный клиент не задерживает остальных
+                await asyncio.gather(*(self._fire(owner, entries) for owner, entries in owners[start:start + self.batch_size]))
+    
+    async def _fire(self, owner: str, entries: List[Tuple[float, int, str]]):
+        try:
+            await self._handler(owner)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error delivering reminders of {owner}: {e}")
+            retry_at = time.time() + self.RETRY_DELAY
+            for _, reminder_id, _ in entries:
+                self.schedule(retry_at, reminder_id, owner)
+
+
+def create_reminder_scheduler() -> ReminderScheduler:
+    """Планировщик с хранилищем по настройкам (REMINDER_DB_PATH)"""
+    return ReminderScheduler(ReminderStore(settings.REMINDER_DB_PATH))
@@ -0,0 +1,62 @@
+import logging
+import uuid
+from contextvars import ContextVar
+
+# Идентификатор текущего HTTP запроса или хода диалога; задачи asyncio наследуют его при создании
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def configure_logging(level: int = logging.INFO):
+    """
+    Формат логов с идентификатором запроса. Атрибут добавляется фабрикой записей,
+    а не фильтром обработчика, поэтому он есть у любой записи, включая логи uvicorn.
+    """
+    factory = logging.getLogRecordFactory()
+    if not getattr(factory, "with_request_id", False):
+        def record_factory(*args, **kwargs) -> logging.LogRecord:
+            record = factory(*args, **kwargs)
+            record.request_id = request_id.get()
+            return record
+        
+        record_factory.with_request_id = True
+        logging.setLogRecordFactory(record_factory)
+    
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware: каждый HTTP запрос и WebSocket соединение получают идентификатор
+    (из заголовка X-Request-ID клиента или новый), который попадает в логи;
+    HTTP ответ возвращает его в том же заголовке.
+    """
+    
+    HEADER = b"x-request-id"
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        
+        incoming = dict(scope.get("headers") or ()).get(self.HEADER, b"").decode("latin-1")
+        current = incoming[:64] if incoming and incoming.isprintable() else new_request_id()
+        token = request_id.set(current)
+        
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (self.HEADER, current.encode("latin-1"))]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_id if scope["type"] == "http" else send)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,146 @@
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+from .intent_matcher import hashed_ngrams
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+class ResponseCache:
+    """
+    Кэш ответов LLM для запросов без контекста разговора.
+    Точное совпадение нормализованного запроса; с similar=True дополнительно поиск
+    похожего запроса по косинусной близости хэшированных векторов символьных n-грамм (NumPy).
+    Записи живут ttl секунд, при переполнении вытесняется давно не использованная.
+    """
+    
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 2048, similar: bool = False, similarity_threshold: float = 0.95, dimensions: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Похожий запрос может означать другое ("austria"/"australia"), поэтому поиск включается явно
+        self.similar = similar
+        self.similarity_threshold = similarity_threshold
+        self.dimensions = dimensions
+        
+        # Векторы хранятся в заранее выделенной матрице, запись занимает один слот
+        self._vectors = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._entries: Dict[int, Tuple[str, str]] = {}
+        self._free = list(range(max_entries - 1, -1, -1))
+        
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def normalize(query: str) -> str:
+        query = _PUNCTUATION.sub(" ", query.lower().replace("ё", "е"))
+        return re.sub(r"\s+", " ", query).strip()
+    
+    def get(self, query: str) -> Optional[Tuple[str, float]]:
+        key = self.normalize(query)
+        if not key:
+            return None
+        now = time.monotonic()
+        
+        slot = self._slots.get(key)
+        if slot is not None:
+            if self._expires[slot] > now:
+                self._slots.move_to_end(key)
+                self.hits += 1
+                return self._entries[slot][1], 1.0
+            self._release(key)
+        
+        if self.similar and self._slots:
+            vector = self._vectorize(key)
+            scores = self._vectors @ vector
+            scores[self._expires <= now] = -1.0
+            slot = int(np.argmax(scores))
+            score = float(scores[slot])
+            
+            if score >= self.similarity_threshold:
+                cached_key, response = self._entries[slot]
+                if self._same_words(key, cached_key):
+                    self._slots.move_to_end(cached_key)
+                    self.hits += 1
+                    self.similar_hits += 1
+                    logger.info(f"LLM cache near-duplicate hit: '{key}' ~ '{cached_key}' ({score:.2f})")
+                    return response, round(score, 3)
+        
+        self.misses += 1
+        return None
+    
+    def put(self, query: str, response: str):
+        key = self.normalize(query)
+        if not key or not response:
+            return
+        
+        if key in self._slots:
+            self._release(key)
+        
+        if not self._free:
+            oldest_key = next(iter(self._slots))
+            self._release(oldest_key)
+            self.evictions += 1
+        
+        slot = self._free.pop()
+        self._vectors[slot] = self._vectorize(key)
+        self._expires[slot] = time.monotonic() + self.ttl
+        self._entries[slot] = (key, response)
+        self._slots[key] = slot
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._slots),
+        }
+    
+    def _vectorize(self, key: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        columns, counts = hashed_ngrams(key, self.dimensions, sizes=(3,))
+        vector[columns] = counts
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+    
+    @staticmethod
+    def _same_words(key: str, cached_key: str) -> bool:
+        """
+        Запросы различаются только окончаниями слов ("погода"/"погоду").
+        Близкие по n-граммам запросы с другим числом ("2 плюс 3"), отрицанием ("unsafe",
+        "не") или названием ("austria"/"australia") считаются разными.
+        """
+        words = key.split(" ")
+        cached = cached_key.split(" ")
+        if len(words) != len(cached):
+            return False
+        for word, other in zip(words, cached):
+            if word == other:
+                continue
+            prefix = 0
+            for a, b in zip(word, other):
+                if a != b:
+                    break
+                prefix += 1
+            if prefix < max(3, max(len(word), len(other)) - 2):
+                return False
+        return True
+    
+    def _release(self, key: str):
+        slot = self._slots.pop(key)
+        self._vectors[slot] = 0.0
+        self._expires[slot] = 0.0
+        del self._entries[slot]
+        self._free.append(slot)
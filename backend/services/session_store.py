@@ -0,0 +1,126 @@
+import logging
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationSession:
+    def __init__(self, max_messages: int):
+        self.messages: Deque[Dict[str, str]] = deque()
+        self.max_messages = max_messages
+        self.bytes = 0
+        self.last_active = time.monotonic()
+    
+    @staticmethod
+    def message_size(message: Dict[str, str]) -> int:
+        return sys.getsizeof(message["content"]) + sys.getsizeof(message["role"])
+    
+    def append(self, message: Dict[str, str]) -> int:
+        size = self.message_size(message)
+        self.messages.append(message)
+        self.bytes += size
+        freed = 0
+        while len(self.messages) > self.max_messages:
+            freed += self.pop_oldest()
+        return size - freed
+    
+    def pop_oldest(self) -> int:
+        size = self.message_size(self.messages.popleft())
+        self.bytes -= size
+        return size
+
+
+class SessionStore:
+    """
+    Хранилище истории разговоров по сессиям (client_id для WebSocket, токен для REST).
+    История каждой сессии — кольцевой буфер последних сообщений с ограничением по байтам,
+    сессии без активности дольше idle_ttl вытесняются, общий объём ограничен max_total_bytes.
+    """
+    
+    def __init__(
+        self,
+        max_messages: int = 10,
+        max_session_bytes: int = 32 * 1024,
+        max_total_bytes: int = 64 * 1024 * 1024,
+        idle_ttl: float = 1800.0,
+    ):
+        self.max_messages = max_messages
+        self.max_session_bytes = max_session_bytes
+        self.max_total_bytes = max_total_bytes
+        self.idle_ttl = idle_ttl
+        
+        # Порядок — от давно неактивных к недавно активным
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._total_bytes = 0
+        
+        self.evicted_idle = 0
+        self.evicted_memory = 0
+    
+    def history(self, session_id: str) -> List[Dict[str, str]]:
+        self.evict_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            return []
+        self._touch(session_id, session)
+        return list(session.messages)
+    
+    def append(self, session_id: str, role: str, content: str):
+        self.evict_idle()
+        
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = ConversationSession(self.max_messages)
+            self._sessions[session_id] = session
+        self._touch(session_id, session)
+        
+        self._total_bytes += session.append({"role": role, "content": content})
+        while session.bytes > self.max_session_bytes and len(session.messages) > 1:
+            self._total_bytes -= session.pop_oldest()
+        
+        # При превышении общего объёма вытесняются наименее активные сессии
+        while self._total_bytes > self.max_total_bytes and len(self._sessions) > 1:
+            oldest_id = next(iter(self._sessions))
+            if oldest_id == session_id:
+                break
+            self._drop(oldest_id)
+            self.evicted_memory += 1
+    
+    def clear(self, session_id: str):
+        if session_id in self._sessions:
+            self._drop(session_id)
+    
+    def evict_idle(self) -> int:
+        deadline = time.monotonic() - self.idle_ttl
+        evicted = 0
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_active > deadline:
+                break
+            self._drop(session_id)
+            evicted += 1
+        
+        if evicted:
+            self.evicted_idle += evicted
+            logger.info(f"Evicted {evicted} idle conversation sessions")
+        return evicted
+    
+    def stats(self) -> Dict[str, int]:
+        self.evict_idle()
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self._total_bytes,
+            "messages": sum(len(session.messages) for session in self._sessions.values()),
+            "evicted_idle": self.evicted_idle,
+            "evicted_memory": self.evicted_memory,
+        }
+    
+    def _touch(self, session_id: str, session: ConversationSession):
+        session.last_active = time.monotonic()
+        self._sessions.move_to_end(session_id)
+    
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._total_bytes -= session.bytes
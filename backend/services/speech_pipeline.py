@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import re
+from typing import AsyncIterable, AsyncIterator, List, Optional, Tuple
+
+from .text_to_speech import TextToSpeech
+
+logger = logging.getLogger(__name__)
+
+# Граница предложения: знак конца предложения (с закрывающими кавычками/скобками) и пробел,
+# либо перевод строки
+_SENTENCE_BOUNDARY = re.compile(r"[.!?…]+[\"»')\]]*\s+|\n+")
+
+
+class SentenceSplitter:
+    """
+    Инкрементальное разбиение текста на предложения.
+    Фрагменты (например, дельты потокового ответа GPT) подаются через feed(),
+    готовые предложения возвращаются сразу, хвост — через flush().
+    """
+    
+    def __init__(self, min_length: int = 12):
+        # Слишком короткие предложения склеиваются со следующими,
+        # чтобы не тратить отдельный вызов синтеза на "Да."
+        self.min_length = min_length
+        self._buffer = ""
+    
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        
+        sentences = []
+        start = 0
+        for match in _SENTENCE_BOUNDARY.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) < self.min_length:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        
+        self._buffer = self._buffer[start:]
+        return sentences
+    
+    def flush(self) -> Optional[str]:
+        tail = self._buffer.strip()
+        self._buffer = ""
+        return tail or None
+
+
+def split_sentences(text: str, min_length: int = 12) -> List[str]:
+    splitter = SentenceSplitter(min_length=min_length)
+    sentences = splitter.feed(text)
+    tail = splitter.flush()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+class SpeechPipeline:
+    """
+    Конвейерный синтез речи: предложения отправляются в TTS по мере поступления,
+    одновременно выполняется не более max_in_flight запросов,
+    а готовые аудио-сегменты отдаются строго в исходном порядке.
+    """
+    
+    def __init__(self, tts: TextToSpeech, max_in_flight: int = 3):
+        self.tts = tts
+        self.max_in_flight = max(1, max_in_flight)
+    
+    async def stream(self, sentences: AsyncIterable[str]) -> AsyncIterator[Tuple[int, str, Optional[bytes]]]:
+        # Слот окна занимается до запуска синтеза и освобождается, когда синтез сегмента
+        # дождались по порядку — до его выдачи (в finally), поэтому одновременно
+        # запущено не более max_in_flight запросов, а отправка сегмента не держит слот
+        slots = asyncio.Semaphore(self.max_in_flight)
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def produce():
+            try:
+                async for sentence in sentences:
+                    await slots.acquire()
+                    task = asyncio.create_task(self.tts.synthesize_speech(sentence))
+                    queue.put_nowait((sentence, task))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reading sentences for speech pipeline: {e}")
+            finally:
+                # Отмена во время ожидания слота не должна оставлять генератор (и поток GPT
+                # за ним) на финализацию сборщику мусора
+                aclose = getattr(sentences, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+            queue.put_nowait(None)
+        
+        producer = asyncio.create_task(produce())
+        index = 0
+        
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                
+                sentence, task = item
+                try:
+                    audio = await task
+                except Exception as e:
+                    logger.error(f"Error synthesizing sentence {index}: {e}")
+                    audio = None
+                finally:
+                    slots.release()
+                
+                yield index, sentence, audio
+                index += 1
+        finally:
+            producer.cancel()
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None:
+                    item[1].cancel()
@@ -1,62 +1,193 @@
+import asyncio
 import logging
-from openai import OpenAI
-from typing import Optional
-import io
+import time
+from collections import deque
+from openai import AsyncOpenAI
+from typing import Deque, Dict, Optional, Union
 from backend.config import settings
-from .fast_speech_recognition import FastSpeechRecognizer
+from .audio_buffer import PCMBuffer
+from .asr_pool import ASRWorkerPool
+from .fast_speech_recognition import FastSpeechRecognizer, RecognitionResult
+from .metrics import ASR_TRANSCRIPTIONS, STAGE_DURATION, UPSTREAM_ERRORS
 
 logger = logging.getLogger(__name__)
 
 
+class EngineStats:
+    """Победы и задержки одного движка в гонке распознавания"""
+    
+    def __init__(self, window: int = 256):
+        self.attempts = 0
+        self.wins = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+    
+    def record(self, latency: float, ok: bool):
+        self.attempts += 1
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.failures += 1
+    
+    def snapshot(self) -> Dict[str, float]:
+        ordered = sorted(self.latencies)
+        
+        def percentile(q: float) -> float:
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+        
+        return {
+            "attempts": self.attempts,
+            "wins": self.wins,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+            "win_rate": round(self.wins / self.attempts, 3) if self.attempts else 0.0,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+        }
+
+
 class SpeechRecognizer:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.WHISPER_MODEL
-        self.fast_recognizer = FastSpeechRecognizer()
+        self.asr_pool = ASRWorkerPool(
+            workers=settings.ASR_POOL_SIZE,
+            max_queue=settings.ASR_QUEUE_SIZE,
+            job_timeout=settings.ASR_JOB_TIMEOUT,
+            vosk_model_path=settings.VOSK_MODEL_PATH,
+        ) if settings.ASR_POOL_SIZE > 0 else None
+        self.fast_recognizer = FastSpeechRecognizer(pool=self.asr_pool, vosk_model_path=settings.VOSK_MODEL_PATH)
+        
+        # Хеджирование: Whisper стартует, если локальный результат запаздывает или неуверен
+        self.hedge_enabled = settings.ASR_HEDGE_ENABLED
+        self.hedge_delay = settings.ASR_HEDGE_DELAY
+        self.min_confidence = settings.ASR_MIN_CONFIDENCE
+        self.engine_stats: Dict[str, EngineStats] = {"local": EngineStats(), "whisper": EngineStats()}
+        self.hedges_launched = 0
     
-    async def transcribe_audio(self, audio_data: bytes, language: str = "ru") -> Optional[str]:
+    async def transcribe_audio(self, audio_data: Union[bytes, PCMBuffer], language: str = "ru") -> Optional[str]:
         """
         Быстрое распознавание сначала локально, затем через OpenAI как запасной вариант
         """
+        if not isinstance(audio_data, PCMBuffer):
+            # WAV или сырой PCM оборачиваются без копирования
+            audio_data = PCMBuffer.from_audio(audio_data, settings.SAMPLE_RATE)
+        
+        if self.hedge_enabled:
+            return await self._transcribe_hedged(audio_data, language)
+        
         try:
             # Сначала пробуем быстрое локальное распознавание
-            fast_result = await self.fast_recognizer.transcribe_audio_fast(audio_data, language)
+            fast_result = await self._timed("local", self._transcribe_local(audio_data, language))
             
-            if fast_result and fast_result.strip():
-                logger.info(f"Fast local transcription successful: {fast_result}")
-                return fast_result
+            if fast_result is not None:
+                logger.info(f"Fast local transcription successful: {fast_result.text}")
+                self.engine_stats["local"].wins += 1
+                ASR_TRANSCRIPTIONS.inc(fast_result.engine)
+                return fast_result.text
             
             # Если локальное распознавание не удалось, используем OpenAI
             logger.info("Fast recognition failed, falling back to OpenAI Whisper")
-            return await self._transcribe_with_openai(audio_data, language)
-            
+            text = await self._timed("whisper", self._transcribe_with_openai(audio_data, language))
+            if text:
+                self.engine_stats["whisper"].wins += 1
+                ASR_TRANSCRIPTIONS.inc("whisper")
+            return text
+        
         except Exception as e:
             logger.error(f"Error in hybrid transcription: {e}")
             # В случае ошибки всегда возвращаемся к OpenAI
             return await self._transcribe_with_openai(audio_data, language)
     
-    async def _transcribe_with_openai(self, audio_data: bytes, language: str = "ru") -> Optional[str]:
-        """Оригинальное распознавание через OpenAI Whisper"""
+    async def _transcribe_hedged(self, audio_data: PCMBuffer, language: str) -> Optional[str]:
+        """
+        Локальный движок стартует сразу; Whisper — если локальный результат не пришёл
+        за hedge_delay или пришёл с низкой уверенностью. Побеждает первый приемлемый
+        ответ, проигравший отменяется.
+        """
+        local = asyncio.create_task(self._timed("local", self._transcribe_local(audio_data, language)))
+        whisper: Optional[asyncio.Task] = None
+        # Неуверенный локальный ответ лучше, чем ничего, если Whisper тоже не справится
+        fallback: Optional[RecognitionResult] = None
+        
         try:
-            import asyncio
+            done, _ = await asyncio.wait({local}, timeout=self.hedge_delay)
+            if local in done:
+                result = local.result()
+                if self._acceptable(result):
+                    return self._win("local", result.text, result.engine)
+                fallback = result
+                if result is not None:
+                    logger.info(f"Low-confidence local result ({result.confidence}), asking Whisper")
+            else:
+                logger.info(f"Local recognition exceeded {self.hedge_delay:.2f}s, hedging with Whisper")
             
-            audio_file = io.BytesIO(audio_data)
-            audio_file.name = "audio.wav"
+            self.hedges_launched += 1
+            whisper = asyncio.create_task(self._timed("whisper", self._transcribe_with_openai(audio_data, language)))
+            pending = {whisper} if local.done() else {local, whisper}
             
-            logger.info(f"Transcribing audio with OpenAI (size: {len(audio_data)} bytes)")
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if local in done:
+                    result = local.result()
+                    if self._acceptable(result):
+                        return self._win("local", result.text, result.engine)
+                    if result is not None:
+                        fallback = result
+                if whisper in done and whisper.result():
+                    return self._win("whisper", whisper.result())
             
-            # Запуск синхронного API вызова в отдельном потоке
-            def transcribe_sync():
-                return self.client.audio.transcriptions.create(
-                    model=self.model,
-                    file=audio_file,
-                    language=language,
-                    response_format="text"
-                )
+            if fallback is None:
+                return None
+            ASR_TRANSCRIPTIONS.inc(fallback.engine)
+            return fallback.text
+        finally:
+            for name, task in (("local", local), ("whisper", whisper)):
+                if task is not None and not task.done():
+                    task.cancel()
+                    self.engine_stats[name].cancelled += 1
+    
+    def _acceptable(self, result: Optional[RecognitionResult]) -> bool:
+        # Движки без оценки уверенности (Sphinx) принимаются как есть
+        return result is not None and (result.confidence is None or result.confidence >= self.min_confidence)
+    
+    def _win(self, engine: str, text: str, used: Optional[str] = None) -> str:
+        """used — конкретный локальный движок (vosk, sphinx...) для счётчика метрик"""
+        self.engine_stats[engine].wins += 1
+        ASR_TRANSCRIPTIONS.inc(used or engine)
+        logger.info(f"Transcription won by {engine}: {text}")
+        return text
+    
+    async def _timed(self, engine: str, coro):
+        """Выполняет распознавание и записывает его задержку в статистику движка"""
+        started = time.monotonic()
+        result = await coro
+        elapsed = time.monotonic() - started
+        self.engine_stats[engine].record(elapsed, bool(result))
+        STAGE_DURATION.observe(elapsed, f"asr_{engine}")
+        return result
+    
+    async def _transcribe_local(self, audio_data: PCMBuffer, language: str) -> Optional[RecognitionResult]:
+        return await self.fast_recognizer.transcribe_detailed(audio_data, language)
+    
+    async def _transcribe_with_openai(self, audio_data: PCMBuffer, language: str = "ru") -> Optional[str]:
+        """Оригинальное распознавание через OpenAI Whisper"""
+        try:
+            # Заголовок WAV и PCM отдаются потоком, без сборки файла в памяти
+            audio_file = audio_data.wav_file("audio.wav")
+            
+            logger.info(f"Transcribing audio with OpenAI (size: {len(audio_data)} bytes)")
             
-            # Выполнение в thread pool для избежания блокировки event loop
-            loop = asyncio.get_event_loop()
-            transcript = await loop.run_in_executor(None, transcribe_sync)
+            # Асинхронный клиент: отмена задачи обрывает HTTP запрос
+            transcript = await self.client.audio.transcriptions.create(
+                model=self.model,
+                file=audio_file,
+                language=language,
+                response_format="text"
+            )
             
             if isinstance(transcript, str):
                 text = transcript
@@ -65,7 +196,20 @@ class SpeechRecognizer:
             
             logger.info(f"OpenAI transcription result: {text}")
             return text.strip() if text else None
-            
+        
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Error transcribing audio with OpenAI: {e}")
+            UPSTREAM_ERRORS.inc("openai_whisper")
             return None
+    
+    def stats(self) -> Dict[str, object]:
+        """Доли побед и задержки движков для подбора ASR_HEDGE_DELAY"""
+        return {
+            "hedge_enabled": self.hedge_enabled,
+            "hedge_delay_ms": round(self.hedge_delay * 1000),
+            "hedges_launched": self.hedges_launched,
+            "engines": {name: engine.snapshot() for name, engine in self.engine_stats.items()},
+            "pool": self.asr_pool.stats() if self.asr_pool is not None else {"enabled": False},
+        }
@@ -0,0 +1,536 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from backend.config import settings
+from .session_store import ConversationSession, SessionStore
+
+try:
+    from redis.exceptions import WatchError
+except ImportError:
+    # Без пакета redis RedisStateBackend не создаётся (create_state_backend выберет память)
+    WatchError = None
+
+logger = logging.getLogger(__name__)
+
+# Обработчик рассылки: (сообщение, client_id или None — всем клиентам воркера)
+BroadcastHandler = Callable[[Dict[str, Any], Optional[str]], Awaitable[None]]
+
+
+def worker_id() -> str:
+    """Идентификатор процесса-воркера в реестре соединений и в рассылке (после fork — свой)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def history_overflow(messages: List[Dict[str, str]], max_messages: int, max_bytes: int) -> int:
+    """Сколько самых старых сообщений отбросить, чтобы история уложилась в лимиты SessionStore"""
+    drop = max(0, len(messages) - max_messages)
+    size = sum(ConversationSession.message_size(message) for message in messages[drop:])
+    while size > max_bytes and len(messages) - drop > 1:
+        size -= ConversationSession.message_size(messages[drop])
+        drop += 1
+    return drop
+
+
+class StateBackend(ABC):
+    """
+    Общее состояние API для нескольких процессов-воркеров: история разговоров,
+    реестр соединений (какой воркер держит клиента) и рассылка сообщений
+    всем воркерам. Методы асинхронные: реализации ходят на диск или в сеть.
+    """
+    
+    name = "base"
+    
+    def __init__(self, max_messages: int = 10, max_session_bytes: int = 32 * 1024, idle_ttl: float = 1800.0):
+        self.max_messages = max_messages
+        self.max_session_bytes = max_session_bytes
+        self.idle_ttl = idle_ttl
+        self._handler: Optional[BroadcastHandler] = None
+    
+    async def start(self, handler: Optional[BroadcastHandler] = None):
+        self._handler = handler
+    
+    async def close(self):
+        self._handler = None
+    
+    @abstractmethod
+    async def history(self, session_id: str) -> List[Dict[str, str]]:
+        ...
+    
+    @abstractmethod
+    async def append_history(self, session_id: str, messages: List[Dict[str, str]]):
+        ...
+    
+    @abstractmethod
+    async def clear_history(self, session_id: str):
+        ...
+    
+    @abstractmethod
+    async def register_connection(self, client_id: str):
+        ...
+    
+    @abstractmethod
+    async def unregister_connection(self, client_id: str):
+        ...
+    
+    @abstractmethod
+    async def publish(self, message: Dict[str, Any], client_id: Optional[str] = None):
+        """Рассылка всем воркерам; client_id — доставить только этому клиенту, где бы он ни был"""
+    
+    @abstractmethod
+    async def stats(self) -> Dict[str, Any]:
+        ...
+    
+    async def _deliver(self, message: Dict[str, Any], client_id: Optional[str]):
+        if self._handler is None:
+            return
+        try:
+            await self._handler(message, client_id)
+        except Exception as e:
+            logger.error(f"Error delivering broadcast: {e}")
+
+
+class MemoryStateBackend(StateBackend):
+    """Состояние в памяти процесса: прежнее поведение, только для одного воркера"""
+    
+    name = "memory"
+    
+    def __init__(self, max_messages: int = 10, max_session_bytes: int = 32 * 1024, idle_ttl: float = 1800.0, max_total_bytes: int = 64 * 1024 * 1024):
+        super().__init__(max_messages, max_session_bytes, idle_ttl)
+        self.sessions = SessionStore(
+            max_messages=max_messages,
+            max_session_bytes=max_session_bytes,
+            max_total_bytes=max_total_bytes,
+            idle_ttl=idle_ttl,
+        )
+        self._connections: Dict[str, str] = {}
+    
+    async def history(self, session_id: str) -> List[Dict[str, str]]:
+        return self.sessions.history(session_id)
+    
+    async def append_history(self, session_id: str, messages: List[Dict[str, str]]):
+        for message in messages:
+            self.sessions.append(session_id, message["role"], message["content"])
+    
+    async def clear_history(self, session_id: str):
+        self.sessions.clear(session_id)
+    
+    async def register_connection(self, client_id: str):
+        self._connections[client_id] = worker_id()
+    
+    async def unregister_connection(self, client_id: str):
+        self._connections.pop(client_id, None)
+    
+    async def publish(self, message: Dict[str, Any], client_id: Optional[str] = None):
+        await self._deliver(message, client_id)
+    
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            **self.sessions.stats(),
+            "connections": len(self._connections),
+        }
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    Состояние в файле SQLite для воркеров одного хоста. Режим WAL: читатели
+    не ждут писателя, а запись одного воркера не блокирует остальных дольше
+    короткой транзакции. Запросы выполняются в пуле потоков. Рассылка — таблица
+    broadcasts, которую каждый воркер опрашивает раз в poll_interval.
+    """
+    
+    name = "sqlite"
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            last_active REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active);
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS history_session ON history (session_id, id);
+        CREATE TABLE IF NOT EXISTS connections (
+            client_id TEXT PRIMARY KEY,
+            worker_id TEXT NOT NULL,
+            connected_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            client_id TEXT,
+            payload TEXT NOT NULL,
+            created REAL NOT NULL
+        );
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        max_messages: int = 10,
+        max_session_bytes: int = 32 * 1024,
+        idle_ttl: float = 1800.0,
+        poll_interval: float = 0.2,
+        broadcast_retention: float = 60.0,
+    ):
+        super().__init__(max_messages, max_session_bytes, idle_ttl)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.broadcast_retention = broadcast_retention
+        
+        # Соединение открывается при первом запросе, уже в процессе воркера:
+        # соединение SQLite нельзя наследовать через fork
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        
+        self._last_broadcast = 0
+        self._last_sweep = 0.0
+        self._poller: Optional[asyncio.Task] = None
+    
+    async def start(self, handler: Optional[BroadcastHandler] = None):
+        await super().start(handler)
+        await self._run(self._start_sync)
+        self._poller = asyncio.create_task(self._poll_broadcasts())
+    
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        await self._run(self._execute, "DELETE FROM connections WHERE worker_id = ?", (worker_id(),))
+        await super().close()
+        await self._run(self._close_sync)
+    
+    async def history(self, session_id: str) -> List[Dict[str, str]]:
+        return await self._run(self._history_sync, session_id)
+    
+    async def append_history(self, session_id: str, messages: List[Dict[str, str]]):
+        await self._run(self._append_sync, session_id, messages)
+    
+    async def clear_history(self, session_id: str):
+        await self._run(self._clear_sync, session_id)
+    
+    async def register_connection(self, client_id: str):
+        await self._run(
+            self._execute,
+            "INSERT OR REPLACE INTO connections (client_id, worker_id, connected_at) VALUES (?, ?, ?)",
+            (client_id, worker_id(), time.time()),
+        )
+    
+    async def unregister_connection(self, client_id: str):
+        await self._run(
+            self._execute,
+            "DELETE FROM connections WHERE client_id = ? AND worker_id = ?",
+            (client_id, worker_id()),
+        )
+    
+    async def publish(self, message: Dict[str, Any], client_id: Optional[str] = None):
+        # Свои клиенты получают сообщение сразу, остальные воркеры — при следующем опросе
+        await self._run(
+            self._execute,
+            "INSERT INTO broadcasts (origin, client_id, payload, created) VALUES (?, ?, ?, ?)",
+            (worker_id(), client_id, json.dumps(message, ensure_ascii=False), time.time()),
+        )
+        await self._deliver(message, client_id)
+    
+    async def stats(self) -> Dict[str, Any]:
+        counts = await self._run(self._fetch, """
+            SELECT
+                (SELECT COUNT(*) FROM sessions WHERE last_active > ?),
+                (SELECT COUNT(*) FROM history),
+                (SELECT COUNT(*) FROM connections)
+        """, (time.time() - self.idle_ttl,))
+        sessions, messages, connections = counts[0]
+        return {
+            "backend": self.name,
+            "sessions": sessions,
+            "messages": messages,
+            "connections": connections,
+        }
+    
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(self._locked, func, *args)
+    
+    def _locked(self, func, *args):
+        with self._lock:
+            if self._db is None:
+                self._connect_sync()
+            return func(*args)
+    
+    def _connect_sync(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Одно соединение на процесс под блокировкой: вызовы идут из пула потоков
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(self.SCHEMA)
+    
+    def _close_sync(self):
+        self._db.close()
+        self._db = None
+    
+    def _execute(self, sql: str, params: tuple):
+        self._db.execute(sql, params)
+    
+    def _fetch(self, sql: str, params: tuple) -> List[tuple]:
+        return self._db.execute(sql, params).fetchall()
+    
+    def _start_sync(self):
+        # Записи этого же pid от прошлого запуска устарели; рассылка читается с текущего конца
+        self._db.execute("DELETE FROM connections WHERE worker_id = ?", (worker_id(),))
+        self._last_broadcast = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM broadcasts").fetchone()[0]
+    
+    def _history_sync(self, session_id: str) -> List[Dict[str, str]]:
+        row = self._db.execute("SELECT last_active FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        now = time.time()
+        if row is None or row[0] <= now - self.idle_ttl:
+            return []
+        self._db.execute("UPDATE sessions SET last_active = ? WHERE session_id = ?", (now, session_id))
+        rows = self._db.execute("SELECT role, content FROM history WHERE session_id = ? ORDER BY id", (session_id,))
+        return [{"role": role, "content": content} for role, content in rows]
+    
+    def _append_sync(self, session_id: str, messages: List[Dict[str, str]]):
+        now = time.time()
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            row = self._db.execute("SELECT last_active FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is not None and row[0] <= now - self.idle_ttl:
+                # Сессия простояла дольше idle_ttl: начинается заново, как в SessionStore
+                self._db.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+            self._db.execute("INSERT OR REPLACE INTO sessions (session_id, last_active) VALUES (?, ?)", (session_id, now))
+            self._db.executemany(
+                "INSERT INTO history (session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, message["role"], message["content"]) for message in messages],
+            )
+            
+            rows = self._db.execute("SELECT id, role, content FROM history WHERE session_id = ? ORDER BY id", (session_id,)).fetchall()
+            drop = history_overflow([{"role": role, "content": content} for _, role, content in rows], self.max_messages, self.max_session_bytes)
+            if drop:
+                self._db.execute("DELETE FROM history WHERE session_id = ? AND id <= ?", (session_id, rows[drop - 1][0]))
+        
+        if now - self._last_sweep > 60:
+            self._sweep_sync(now)
+    
+    def _clear_sync(self, session_id: str):
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    
+    def _sweep_sync(self, now: float):
+        """Удаляет простаивающие сессии и прочитанную всеми воркерами рассылку"""
+        self._last_sweep = now
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "DELETE FROM history WHERE session_id IN (SELECT session_id FROM sessions WHERE last_active <= ?)",
+                (now - self.idle_ttl,),
+            )
+            evicted = self._db.execute("DELETE FROM sessions WHERE last_active <= ?", (now - self.idle_ttl,)).rowcount
+            self._db.execute("DELETE FROM broadcasts WHERE created <= ?", (now - self.broadcast_retention,))
+        if evicted:
+            logger.info(f"Evicted {evicted} idle conversation sessions")
+    
+    def _pending_broadcasts_sync(self) -> List[tuple]:
+        rows = self._db.execute(
+            "SELECT id, origin, client_id, payload FROM broadcasts WHERE id > ? ORDER BY id",
+            (self._last_broadcast,),
+        ).fetchall()
+        if rows:
+            self._last_broadcast = rows[-1][0]
+        return rows
+    
+    async def _poll_broadcasts(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                rows = await self._run(self._pending_broadcasts_sync)
+                for _, origin, client_id, payload in rows:
+                    if origin != worker_id():
+                        await self._deliver(json.loads(payload), client_id)
+                if time.time() - self._last_sweep > 60:
+                    await self._run(self._sweep_sync, time.time())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error polling broadcasts: {e}")
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Состояние в Redis (или сервере с тем же протоколом) для воркеров на разных хостах.
+    История — список на сессию с LTRIM и EXPIRE (idle_ttl), реестр соединений — хеш,
+    рассылка — PUB/SUB. client — готовый асинхронный клиент (например, тестовый),
+    иначе создаётся redis.asyncio по url.
+    """
+    
+    name = "redis"
+    
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        prefix: str = "jarvis",
+        max_messages: int = 10,
+        max_session_bytes: int = 32 * 1024,
+        idle_ttl: float = 1800.0,
+        client=None,
+    ):
+        super().__init__(max_messages, max_session_bytes, idle_ttl)
+        if client is None:
+            import redis.asyncio as redis
+            
+            client = redis.from_url(url, decode_responses=True)
+        self._client = client
+        self.prefix = prefix
+        self._channel = f"{prefix}:broadcast"
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+    
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+    
+    async def start(self, handler: Optional[BroadcastHandler] = None):
+        await super().start(handler)
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(self._channel)
+        self._listener = asyncio.create_task(self._listen())
+    
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        connections = await self._client.hgetall(self._key("connections"))
+        current = worker_id()
+        own = [client_id for client_id, owner in connections.items() if owner == current]
+        if own:
+            await self._client.hdel(self._key("connections"), *own)
+        await super().close()
+        await self._client.aclose()
+    
+    async def history(self, session_id: str) -> List[Dict[str, str]]:
+        key = self._key("history", session_id)
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.expire(key, int(self.idle_ttl))
+            items, _ = await pipe.execute()
+        return [json.loads(item) for item in items]
+    
+    async def append_history(self, session_id: str, messages: List[Dict[str, str]]):
+        key = self._key("history", session_id)
+        encoded = [json.dumps(message, ensure_ascii=False) for message in messages]
+        # Обрезка по числу сообщений и байтам идёт в той же транзакции, что и добавление:
+        # WATCH повторяет её, если историю сессии одновременно изменил другой воркер
+        async with self._client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    items = await pipe.lrange(key, 0, -1)
+                    current = [json.loads(item) for item in items] + messages
+                    drop = history_overflow(current, self.max_messages, self.max_session_bytes)
+                    pipe.multi()
+                    pipe.rpush(key, *encoded)
+                    if drop:
+                        pipe.ltrim(key, drop, -1)
+                    pipe.expire(key, int(self.idle_ttl))
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+    
+    async def clear_history(self, session_id: str):
+        await self._client.delete(self._key("history", session_id))
+    
+    async def register_connection(self, client_id: str):
+        await self._client.hset(self._key("connections"), client_id, worker_id())
+    
+    async def unregister_connection(self, client_id: str):
+        await self._client.hdel(self._key("connections"), client_id)
+    
+    async def publish(self, message: Dict[str, Any], client_id: Optional[str] = None):
+        envelope = {"origin": worker_id(), "client_id": client_id, "message": message}
+        await self._client.publish(self._channel, json.dumps(envelope, ensure_ascii=False))
+        await self._deliver(message, client_id)
+    
+    async def stats(self) -> Dict[str, Any]:
+        """
+        Сессии, сообщения и объём историй — как у SessionStore. Ключи перебираются
+        SCAN пачками (без блокировки Redis), поэтому стоимость растёт с числом сессий.
+        """
+        keys = [key async for key in self._client.scan_iter(match=self._key("history", "*"), count=500)]
+        sessions = messages = size = 0
+        for start in range(0, len(keys), 500):
+            async with self._client.pipeline(transaction=False) as pipe:
+                for key in keys[start:start + 500]:
+                    pipe.lrange(key, 0, -1)
+                histories = [items for items in await pipe.execute() if items]
+            sessions += len(histories)
+            messages += sum(len(items) for items in histories)
+            size += sum(ConversationSession.message_size(json.loads(item)) for items in histories for item in items)
+        
+        connections = await self._client.hlen(self._key("connections"))
+        return {
+            "backend": self.name,
+            "sessions": sessions,
+            "messages": messages,
+            "bytes": size,
+            "connections": connections,
+        }
+    
+    async def _listen(self):
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    envelope = json.loads(item["data"])
+                    if envelope["origin"] != worker_id():
+                        await self._deliver(envelope["message"], envelope["client_id"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reading broadcast channel: {e}")
+                await asyncio.sleep(1.0)
+
+
+def create_state_backend(backend: Optional[str] = None) -> StateBackend:
+    """Бэкенд состояния по настройкам (STATE_BACKEND); при недоступном Redis — память"""
+    backend = backend or settings.STATE_BACKEND
+    limits = {
+        "max_messages": settings.SESSION_MAX_MESSAGES,
+        "max_session_bytes": settings.SESSION_MAX_BYTES,
+        "idle_ttl": settings.SESSION_IDLE_TTL,
+    }
+    
+    if backend == SQLiteStateBackend.name:
+        return SQLiteStateBackend(
+            settings.STATE_SQLITE_PATH,
+            poll_interval=settings.STATE_BROADCAST_POLL_MS / 1000,
+            **limits,
+        )
+    
+    if backend == RedisStateBackend.name:
+        try:
+            return RedisStateBackend(settings.STATE_REDIS_URL, prefix=settings.STATE_REDIS_PREFIX, **limits)
+        except ImportError:
+            logger.warning("redis library not installed, falling back to in-memory state")
+    elif backend != MemoryStateBackend.name:
+        logger.warning(f"Unknown state backend: {backend}, using in-memory state")
+    
+    return MemoryStateBackend(max_total_bytes=settings.SESSION_STORE_MAX_MB * 1024 * 1024, **limits)
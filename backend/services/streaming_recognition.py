@@ -0,0 +1,110 @@
+import asyncio
+import json
+import logging
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Модели Vosk по пути; None — загрузка не удалась и повторно не пробуется
+_vosk_models: Dict[str, Optional[object]] = {}
+_vosk_lock = threading.Lock()
+
+
+def load_vosk_model(model_path: str):
+    """Загружает модель Vosk один раз на процесс; None если Vosk или модель недоступны"""
+    if model_path in _vosk_models:
+        return _vosk_models[model_path]
+    
+    with _vosk_lock:
+        if model_path in _vosk_models:
+            return _vosk_models[model_path]
+        
+        model = None
+        try:
+            import vosk
+            vosk.SetLogLevel(-1)
+            model = vosk.Model(model_path)
+            logger.info(f"Vosk model loaded from {model_path}")
+        except ImportError:
+            logger.warning("Vosk library not installed, streaming recognition disabled")
+        except Exception as e:
+            logger.warning(f"Could not load Vosk model from {model_path}: {e}")
+        # Неудача тоже запоминается: иначе каждое соединение заново читало бы диск
+        _vosk_models[model_path] = model
+        return model
+
+
+class StreamingRecognizer:
+    """
+    Потоковое распознавание для одного соединения: постоянный KaldiRecognizer,
+    в который аудио подаётся по мере поступления. Промежуточный текст доступен
+    во время речи, итоговый — сразу после окончания фразы.
+    """
+    
+    def __init__(self, model, sample_rate: int = 16000):
+        import vosk
+        
+        self.sample_rate = sample_rate
+        self._recognizer = vosk.KaldiRecognizer(model, sample_rate)
+        # KaldiRecognizer не потокобезопасен: вызовы одного соединения сериализуются
+        self._lock = asyncio.Lock()
+        self._segments: List[str] = []
+        self._last_partial = ""
+    
+    @classmethod
+    async def create(cls, model_path: str, sample_rate: int = 16000) -> Optional["StreamingRecognizer"]:
+        # Обычно модель уже загружена при старте воркера; иначе загрузка не блокирует цикл событий
+        model = await asyncio.to_thread(load_vosk_model, model_path)
+        if model is None:
+            return None
+        return cls(model, sample_rate)
+    
+    async def accept(self, pcm: bytes) -> Optional[str]:
+        """
+        Подаёт кусок PCM в распознаватель. Возвращает текст фразы на данный момент,
+        если он изменился с прошлого вызова, иначе None.
+        """
+        async with self._lock:
+            text = await asyncio.to_thread(self._accept_sync, pcm)
+        
+        if text == self._last_partial:
+            return None
+        self._last_partial = text
+        return text
+    
+    async def finish(self) -> str:
+        """Завершает фразу и возвращает итоговый текст; распознаватель готов к следующей"""
+        async with self._lock:
+            final = await asyncio.to_thread(self._final_sync)
+        
+        segments = self._segments + ([final] if final else [])
+        self._segments = []
+        self._last_partial = ""
+        return " ".join(segments).strip()
+    
+    def endpoint_reached(self) -> bool:
+        """Kaldi сам обнаружил конец фразы (используется без серверной VAD)"""
+        return bool(self._segments)
+    
+    def _accept_sync(self, pcm: bytes) -> str:
+        if self._recognizer.AcceptWaveform(pcm):
+            # Собственная точка окончания Kaldi: сегмент завершён, фраза продолжается
+            text = self._parse(self._recognizer.Result(), "text")
+            if text:
+                self._segments.append(text)
+            partial = ""
+        else:
+            partial = self._parse(self._recognizer.PartialResult(), "partial")
+        
+        return " ".join(self._segments + ([partial] if partial else [])).strip()
+    
+    def _final_sync(self) -> str:
+        return self._parse(self._recognizer.FinalResult(), "text")
+    
+    @staticmethod
+    def _parse(result: str, key: str) -> str:
+        try:
+            return json.loads(result).get(key, "").strip()
+        except (json.JSONDecodeError, AttributeError):
+            return ""
@@ -0,0 +1,73 @@
+import logging
+import struct
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Бинарный кадр уровня громкости: магия b"JVOL", RMS и пик (float16, доли полной шкалы)
+VOLUME_FRAME_MAGIC = b"JVOL"
+VOLUME_FRAME = struct.Struct("!4see")
+
+
+def pack_volume_frame(rms: float, peak: float) -> bytes:
+    return VOLUME_FRAME.pack(VOLUME_FRAME_MAGIC, rms, peak)
+
+
+def unpack_volume_frame(frame: bytes) -> Tuple[float, float]:
+    magic, rms, peak = VOLUME_FRAME.unpack_from(frame)
+    if magic != VOLUME_FRAME_MAGIC:
+        raise ValueError("Not a volume frame")
+    return rms, peak
+
+
+class VolumeTelemetry:
+    """
+    Измеритель уровня одного соединения. Уровни кадров копятся за интервал
+    (RMS — по энергии с учётом длины кадров, пик — максимум) и отдаются не чаще
+    одного раза за интервал, сколько бы кусков аудио ни пришло.
+    """
+    
+    def __init__(self, interval: float = 0.04, binary: bool = False):
+        self.interval = interval
+        self.binary = binary
+        
+        self._energy = 0.0
+        self._samples = 0
+        self._peak = 0.0
+        self._last_emit = 0.0
+        
+        self.frames = 0
+        self.sent = 0
+        self.dropped = 0
+    
+    def add(self, rms: float, peak: float, samples: int, now: Optional[float] = None) -> Optional[Tuple[float, float]]:
+        """Учитывает кадр; возвращает (rms, peak) за интервал, если пора отправлять"""
+        self.frames += 1
+        self._energy += rms * rms * samples
+        self._samples += samples
+        self._peak = max(self._peak, peak)
+        
+        now = time.monotonic() if now is None else now
+        if now - self._last_emit < self.interval or not self._samples:
+            return None
+        
+        levels = ((self._energy / self._samples) ** 0.5, self._peak)
+        self._energy = 0.0
+        self._samples = 0
+        self._peak = 0.0
+        self._last_emit = now
+        return levels
+    
+    def encode(self, levels: Tuple[float, float]):
+        """Бинарный кадр или JSON сообщение "volume" (громкость в процентах, как раньше)"""
+        rms, peak = levels
+        if self.binary:
+            return pack_volume_frame(rms, peak)
+        return {
+            "type": "volume",
+            "data": {"volume": round(min(100.0, rms * 100), 2), "peak": round(min(100.0, peak * 100), 2)},
+        }
+    
+    def stats(self) -> Dict[str, int]:
+        return {"frames": self.frames, "sent": self.sent, "dropped": self.dropped}
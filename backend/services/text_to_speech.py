@@ -1,23 +1,82 @@
+import asyncio
 import logging
-from typing import Optional
+from time import perf_counter
+from typing import Iterable, Optional
 import base64
-import aiohttp
 from backend.config import settings
+from .http_client import http_client
+from .tts_cache import TTSCache
+from .metrics import STAGE_DURATION, UPSTREAM_ERRORS
 
 logger = logging.getLogger(__name__)
 
 
 class TextToSpeech:
-    def __init__(self):
+    def __init__(self, cache: Optional[TTSCache] = None):
         self.api_key = settings.ELEVENLABS_API_KEY
         self.voice_id = settings.ELEVENLABS_VOICE_ID
         self.base_url = "https://api.elevenlabs.io/v1"
+        self.model_id = "eleven_multilingual_v2"
+        self.voice_settings = {
+            "stability": 0.5,
+            "similarity_boost": 0.75,
+            "style": 0.5,
+            "use_speaker_boost": True
+        }
+        self.cache = cache
     
     async def synthesize_speech(self, text: str) -> Optional[bytes]:
         if not self.api_key:
             logger.error("ElevenLabs API key not configured")
             return None
         
+        started = perf_counter()
+        if self.cache is None:
+            audio_data = await self._request_speech(text)
+            STAGE_DURATION.observe(perf_counter() - started, "tts")
+            return audio_data
+        
+        key = TTSCache.make_key(self.voice_id, self.model_id, self.voice_settings, text)
+        audio_data = await self.cache.get(key)
+        if audio_data is not None:
+            # Попадания в кэш замеряются отдельно: иначе гистограмма синтеза была бы двугорбой
+            STAGE_DURATION.observe(perf_counter() - started, "tts_cached")
+            logger.info(f"TTS cache hit for text: {text[:50]}...")
+            return audio_data
+        
+        audio_data = await self._request_speech(text)
+        STAGE_DURATION.observe(perf_counter() - started, "tts")
+        if audio_data:
+            await self.cache.put(key, audio_data)
+        return audio_data
+    
+    async def prewarm(self, texts: Iterable[str], concurrency: int = 2) -> int:
+        """
+        Прогрев кэша: синтезирует каждую фразу один раз (уже закэшированные, в том числе
+        на общем диске, берутся из кэша). При общем каталоге кэша прогревает один воркер:
+        остальные находят его файлы при первом обращении.
+        """
+        if self.cache is None or not self.api_key:
+            return 0
+        
+        with self.cache.exclusive("prewarm") as acquired:
+            if not acquired:
+                logger.info("TTS cache is being prewarmed by another worker")
+                return 0
+            
+            semaphore = asyncio.Semaphore(concurrency)
+            
+            async def warm(text: str) -> bool:
+                async with semaphore:
+                    return await self.synthesize_speech(text) is not None
+            
+            results = await asyncio.gather(*(warm(text) for text in dict.fromkeys(texts)))
+        
+        warmed = sum(results)
+        logger.info(f"TTS cache prewarmed with {warmed}/{len(results)} phrases")
+        return warmed
+    
+    async def _request_speech(self, text: str) -> Optional[bytes]:
         try:
             url = f"{self.base_url}/text-to-speech/{self.voice_id}"
             
@@ -29,30 +88,27 @@ class TextToSpeech:
             
             data = {
                 "text": text,
-                "model_id": "eleven_multilingual_v2",
-                "voice_settings": {
-                    "stability": 0.5,
-                    "similarity_boost": 0.75,
-                    "style": 0.5,
-                    "use_speaker_boost": True
-                }
+                "model_id": self.model_id,
+                "voice_settings": self.voice_settings
             }
             
             logger.info(f"Synthesizing speech for text: {text[:50]}...")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=data, headers=headers, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                    if response.status == 200:
-                        audio_data = await response.read()
-                        logger.info(f"Speech synthesized successfully (size: {len(audio_data)} bytes)")
-                        return audio_data
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"ElevenLabs API error: {response.status} - {error_text}")
-                        return None
+            session = await http_client.get_session()
+            async with session.post(url, json=data, headers=headers, timeout=http_client.timeout("elevenlabs")) as response:
+                if response.status == 200:
+                    audio_data = await response.read()
+                    logger.info(f"Speech synthesized successfully (size: {len(audio_data)} bytes)")
+                    return audio_data
+                else:
+                    error_text = await response.text()
+                    logger.error(f"ElevenLabs API error: {response.status} - {error_text}")
+                    UPSTREAM_ERRORS.inc("elevenlabs")
+                    return None
                         
         except Exception as e:
             logger.error(f"Error synthesizing speech: {e}")
+            UPSTREAM_ERRORS.inc("elevenlabs")
             return None
     
     async def synthesize_speech_base64(self, text: str) -> Optional[str]:
@@ -70,14 +126,14 @@ class TextToSpeech:
                 "xi-api-key": self.api_key
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("voices", [])
-                    else:
-                        logger.error(f"Error fetching voices: {response.status}")
-                        return None
+            session = await http_client.get_session()
+            async with session.get(url, headers=headers, timeout=http_client.timeout("elevenlabs")) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return data.get("voices", [])
+                else:
+                    logger.error(f"Error fetching voices: {response.status}")
+                    return None
                         
         except Exception as e:
             logger.error(f"Error getting available voices: {e}")
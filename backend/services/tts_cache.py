@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: межпроцессной блокировки нет, каждый процесс работает сам по себе
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class TTSCache:
+    """
+    Кэш синтезированной речи с адресацией по содержимому.
+    Ключ — SHA-256 от (voice_id, model_id, voice_settings, text).
+    Два уровня: LRU в памяти, ограниченный по байтам, и каталог на диске,
+    который переживает перезапуск сервера и общий для воркеров: запись,
+    сделанная другим воркером после старта, находится по файлу.
+    """
+    
+    def __init__(self, max_memory_bytes: int = 64 * 1024 * 1024, cache_dir: Optional[str] = None, max_disk_bytes: int = 512 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = cache_dir
+        
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        
+        # Индекс диска: ключ -> размер файла, в порядке от старых к новым
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        
+        if self.cache_dir:
+            self._load_disk_index()
+    
+    @staticmethod
+    def make_key(voice_id: str, model_id: str, voice_settings: dict, text: str) -> str:
+        payload = json.dumps(
+            [voice_id, model_id, voice_settings, text],
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    async def get(self, key: str) -> Optional[bytes]:
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return audio
+        
+        if self.cache_dir:
+            # Индекс загружен при старте: файл мог с тех пор записать другой воркер
+            audio = await asyncio.to_thread(self._read_file, key)
+            if audio is not None:
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                else:
+                    self._disk[key] = len(audio)
+                    self._disk_bytes += len(audio)
+                self._store_in_memory(key, audio)
+                self.hits += 1
+                self.disk_hits += 1
+                return audio
+            self._forget_disk_entry(key)
+        
+        self.misses += 1
+        return None
+    
+    async def put(self, key: str, audio: bytes):
+        self._store_in_memory(key, audio)
+        
+        if self.cache_dir and key not in self._disk:
+            try:
+                await asyncio.to_thread(self._write_file, key, audio)
+                self._disk[key] = len(audio)
+                self._disk_bytes += len(audio)
+                
+                evicted = self._evict_disk()
+                if evicted:
+                    await asyncio.to_thread(self._remove_files, evicted)
+            except Exception as e:
+                logger.warning(f"Could not write TTS cache entry to disk: {e}")
+    
+    @contextmanager
+    def exclusive(self, name: str) -> Iterator[bool]:
+        """
+        Межпроцессная блокировка на файле в каталоге кэша (flock снимается и при падении
+        процесса). True — блокировка получена или не нужна (кэш только в памяти, нет fcntl),
+        False — её держит другой процесс.
+        """
+        if not self.cache_dir or fcntl is None:
+            yield True
+            return
+        
+        fd = os.open(os.path.join(self.cache_dir, f".{name}.lock"), os.O_CREAT | os.O_RDWR)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
+    
+    def _store_in_memory(self, key: str, audio: bytes):
+        if len(audio) > self.max_memory_bytes:
+            return
+        
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.mp3")
+    
+    def _load_disk_index(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entries = []
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith(".mp3"):
+                        continue
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+            
+            for _, key, size in sorted(entries):
+                self._disk[key] = size
+                self._disk_bytes += size
+            
+            logger.info(f"TTS cache: {len(self._disk)} entries on disk ({self._disk_bytes} bytes)")
+        except Exception as e:
+            logger.warning(f"Could not load TTS disk cache from {self.cache_dir}: {e}")
+            self.cache_dir = None
+    
+    def _read_file(self, key: str) -> Optional[bytes]:
+        try:
+            path = self._path(key)
+            with open(path, "rb") as f:
+                audio = f.read()
+            # Обновляем mtime, чтобы порядок вытеснения пережил перезапуск
+            os.utime(path)
+            return audio
+        except OSError:
+            return None
+    
+    def _write_file(self, key: str, audio: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+    
+    def _forget_disk_entry(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+    
+    def _evict_disk(self) -> List[str]:
+        evicted = []
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.disk_evictions += 1
+            evicted.append(key)
+        return evicted
+    
+    def _remove_files(self, keys: List[str]):
+        for key in keys:
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
@@ -0,0 +1,178 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SILENCE, PENDING, SPEECH = "silence", "pending", "speech"
+
+
+@dataclass
+class VADEvent:
+    kind: str  # "speech_start" или "speech_end"
+    utterance: Optional[bytes] = None
+
+
+class StreamingVAD:
+    """
+    Потоковый детектор речевой активности для одного соединения.
+    Принимает сырой PCM (int16, моно) произвольными кусками, режет на кадры фиксированной длины,
+    классифицирует кадры по энергии (с адаптивным порогом шума) и частоте переходов через ноль,
+    собирает фразу в заранее выделенный буфер и отдаёт её сразу по окончании речи.
+    """
+    
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        threshold_db: float = -45.0,
+        noise_margin_db: float = 12.0,
+        max_zcr: float = 0.35,
+        min_speech_ms: int = 120,
+        hangover_ms: int = 500,
+        pre_roll_ms: int = 200,
+        max_utterance_s: float = 30.0,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.threshold_db = threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.max_zcr = max_zcr
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        # Буфер до начала речи вмещает и кадры, подтверждающие начало речи
+        self.pre_roll_frames = max(0, pre_roll_ms // frame_ms) + self.min_speech_frames
+        
+        # Заранее выделенные буферы: остаток неполного кадра, кадры до начала речи, сама фраза
+        self._remainder = np.zeros(self.frame_samples, dtype=np.int16)
+        self._remainder_len = 0
+        self._pre_roll = np.zeros((self.pre_roll_frames, self.frame_samples), dtype=np.int16)
+        self._pre_roll_pos = 0
+        self._pre_roll_count = 0
+        self._utterance = np.zeros(int(sample_rate * max_utterance_s), dtype=np.int16)
+        self._utterance_len = 0
+        
+        # Рабочие буферы для признаков кадра
+        self._scratch = np.zeros(self.frame_samples, dtype=np.float32)
+        self._signs = np.zeros(self.frame_samples, dtype=bool)
+        self._crossings = np.zeros(self.frame_samples - 1, dtype=bool)
+        
+        self.noise_floor_db = threshold_db - noise_margin_db
+        self.state = SILENCE
+        self._speech_run = 0
+        self._silence_run = 0
+    
+    def reset(self):
+        self.state = SILENCE
+        self._remainder_len = 0
+        self._pre_roll_count = 0
+        self._utterance_len = 0
+        self._speech_run = 0
+        self._silence_run = 0
+    
+    def buffered_speech(self) -> bytes:
+        """
+        Начало текущей фразы вместе с кадрами до speech_start и ещё не разобранным
+        хвостом куска — то, что потоковый распознаватель должен получить при speech_start.
+        """
+        return (self._utterance[:self._utterance_len].tobytes()
+                + self._remainder[:self._remainder_len].tobytes())
+    
+    def feed(self, pcm: bytes) -> List[VADEvent]:
+        samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+        events: List[VADEvent] = []
+        offset = 0
+        
+        # Дополняем неполный кадр из предыдущего куска
+        if self._remainder_len:
+            take = min(self.frame_samples - self._remainder_len, len(samples))
+            self._remainder[self._remainder_len:self._remainder_len + take] = samples[:take]
+            self._remainder_len += take
+            offset = take
+            if self._remainder_len == self.frame_samples:
+                self._process_frame(self._remainder, events)
+                self._remainder_len = 0
+        
+        while offset + self.frame_samples <= len(samples):
+            self._process_frame(samples[offset:offset + self.frame_samples], events)
+            offset += self.frame_samples
+        
+        tail = len(samples) - offset
+        if tail > 0:
+            self._remainder[:tail] = samples[offset:]
+            self._remainder_len = tail
+        
+        return events
+    
+    def _frame_features(self, frame: np.ndarray):
+        scratch = self._scratch
+        np.copyto(scratch, frame, casting="unsafe")
+        energy = float(np.dot(scratch, scratch)) / len(scratch)
+        energy_db = 10.0 * np.log10(energy / (32768.0 ** 2) + 1e-12)
+        
+        np.signbit(scratch, out=self._signs)
+        np.not_equal(self._signs[1:], self._signs[:-1], out=self._crossings)
+        zcr = np.count_nonzero(self._crossings) / len(self._crossings)
+        return energy_db, zcr
+    
+    def _is_speech(self, energy_db: float, zcr: float) -> bool:
+        threshold = max(self.threshold_db, self.noise_floor_db + self.noise_margin_db)
+        if energy_db < threshold:
+            return False
+        # Высокая частота переходов через ноль при умеренной энергии — шум, а не голос
+        return zcr <= self.max_zcr or energy_db > threshold + 10.0
+    
+    def _process_frame(self, frame: np.ndarray, events: List[VADEvent]):
+        energy_db, zcr = self._frame_features(frame)
+        speech = self._is_speech(energy_db, zcr)
+        
+        if self.state == SPEECH:
+            self._append_utterance(frame)
+            self._silence_run = 0 if speech else self._silence_run + 1
+            
+            if self._silence_run >= self.hangover_frames or self._utterance_len >= len(self._utterance):
+                # Хвост тишины после окончания речи распознавателю не нужен
+                end = self._utterance_len - self._silence_run * self.frame_samples
+                events.append(VADEvent("speech_end", self._utterance[:max(end, 0)].tobytes()))
+                self.state = SILENCE
+                self._utterance_len = 0
+                self._silence_run = 0
+                self._pre_roll_count = 0
+            return
+        
+        if not speech:
+            # Адаптация уровня шума только на участках без речи
+            self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * energy_db
+            self.state = SILENCE
+            self._speech_run = 0
+            self._push_pre_roll(frame)
+            return
+        
+        self._speech_run += 1
+        self._push_pre_roll(frame)
+        self.state = PENDING
+        
+        if self._speech_run >= self.min_speech_frames:
+            self.state = SPEECH
+            self._utterance_len = 0
+            self._drain_pre_roll()
+            self._speech_run = 0
+            events.append(VADEvent("speech_start"))
+    
+    def _push_pre_roll(self, frame: np.ndarray):
+        self._pre_roll[self._pre_roll_pos] = frame
+        self._pre_roll_pos = (self._pre_roll_pos + 1) % self.pre_roll_frames
+        self._pre_roll_count = min(self._pre_roll_count + 1, self.pre_roll_frames)
+    
+    def _drain_pre_roll(self):
+        start = (self._pre_roll_pos - self._pre_roll_count) % self.pre_roll_frames
+        for i in range(self._pre_roll_count):
+            self._append_utterance(self._pre_roll[(start + i) % self.pre_roll_frames])
+        self._pre_roll_count = 0
+    
+    def _append_utterance(self, frame: np.ndarray):
+        space = len(self._utterance) - self._utterance_len
+        take = min(space, len(frame))
+        self._utterance[self._utterance_len:self._utterance_len + take] = frame[:take]
+        self._utterance_len += take
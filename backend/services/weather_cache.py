@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from itertools import product
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# "погода в Лондоне", "погоду в Санкт-Петербурге", "weather in London"
+_WEATHER_PATTERN = re.compile(r"(?:погод[аеуы]|weather)\b", re.IGNORECASE)
+_PLACE_PATTERN = re.compile(r"\b(?:в|во|in|for|at)\s+([^\W\d_]+)(?:([\s-])([^\W\d_]+))?", re.IGNORECASE)
+
+# Слова после предлога, которые не являются частью названия города: время ("погода в Лондоне
+# завтра", "в выходные", "in the morning") и служебные слова ("в Москве на неделю")
+_NON_CITY_WORDS = frozenset({
+    "на", "и", "или", "по", "с", "а", "как", "какая", "будет", "был", "была",
+    "and", "or", "on", "at", "in", "for", "like", "will", "be", "is", "was",
+    "сегодня", "завтра", "послезавтра", "вчера", "сейчас", "теперь",
+    "утром", "днем", "вечером", "ночью", "утро", "день", "вечер", "ночь",
+    "выходные", "выходных", "будни", "неделю", "неделе", "месяц", "этот", "эту", "эти", "следующий", "следующую",
+    "понедельник", "вторник", "среду", "четверг", "пятницу", "субботу", "воскресенье",
+    "the", "a", "this", "next", "today", "tomorrow", "tonight", "now", "yesterday",
+    "morning", "afternoon", "evening", "night", "weekend", "week", "month",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+})
+
+# Исключения, которые не покрываются простыми правилами предложного падежа
+_CITY_OVERRIDES = {
+    "москве": "Москва",
+    "твери": "Тверь",
+    "перми": "Пермь",
+    "сочи": "Сочи",
+    "нижнем": "Нижний",
+    "великом": "Великий",
+}
+
+# Не больше стольких вариантов именительного падежа на один запрос к погоде
+MAX_CITY_CANDIDATES = 3
+
+
+def _to_nominative(word: str) -> List[str]:
+    """Варианты именительного падежа, самый вероятный первым: "Самаре" -> Самар, Самара"""
+    lower = word.lower()
+    if lower in _CITY_OVERRIDES:
+        return [_CITY_OVERRIDES[lower]]
+    if not re.search(r"[а-яё]", lower):
+        return [word]
+    if lower.endswith("ии"):
+        return [word[:-1] + "я"]
+    if lower.endswith("ани"):
+        return [word[:-1] + "ь"]
+    if lower.endswith("ье"):
+        return [word[:-1] + "я"]
+    if lower.endswith("е") and len(lower) > 3:
+        return [word[:-1], word[:-1] + "а"]
+    return [word]
+
+
+def extract_city(text: str) -> Optional[Tuple[List[str], str]]:
+    """
+    Извлекает город из фразы пользователя.
+    Возвращает (варианты названия для запроса к API, название в том виде, как его сказали).
+    Русские названия приводятся из предложного падежа к именительному эвристически,
+    поэтому вариантов может быть несколько — они проверяются по порядку.
+    """
+    weather = _WEATHER_PATTERN.search(text)
+    if not weather:
+        return None
+    
+    position = weather.end()
+    while True:
+        match = _PLACE_PATTERN.search(text, position)
+        if not match:
+            return None
+        first, separator, second = match.groups()
+        if first.lower() in _NON_CITY_WORDS:
+            # Следующий предлог может оказаться вторым словом этого совпадения: "for tomorrow in London"
+            position = match.end(1)
+            continue
+        words = [first]
+        if second and second.lower() not in _NON_CITY_WORDS:
+            words += [separator, second]
+        
+        variants = [_to_nominative(word) if word.strip(" -") else [word] for word in words]
+        candidates = ["".join(parts).title() for parts in product(*variants)]
+        return candidates[:MAX_CITY_CANDIDATES], "".join(words).title()
+
+
+class WeatherCache:
+    """
+    TTL-кэш данных о погоде по ключу (город, единицы измерения).
+    Устаревшие записи отдаются сразу с фоновым обновлением (stale-while-revalidate),
+    одновременные промахи по одному ключу объединяются в один запрос к upstream.
+    """
+    
+    def __init__(self, ttl: float = 600.0, stale_ttl: float = 1800.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, dict]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_requests = 0
+    
+    async def get(self, city: str, units: str, fetch: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        key = (city.lower(), units)
+        entry = self._entries.get(key)
+        
+        if entry is not None:
+            fetched_at, data = entry
+            age = time.monotonic() - fetched_at
+            
+            if age < self.ttl:
+                self.hits += 1
+                return data
+            
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._refresh(key, fetch)
+                return data
+        
+        self.misses += 1
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(self._refresh(key, fetch))
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_requests": self.upstream_requests,
+            "entries": len(self._entries),
+        }
+    
+    def _refresh(self, key: Tuple[str, str], fetch: Callable[[], Awaitable[Optional[dict]]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        
+        task = asyncio.create_task(self._fetch(key, fetch))
+        # Ошибку фонового обновления (и запроса, ожидавший которого отменён) никто не заберёт
+        task.add_done_callback(self._log_refresh_error)
+        self._inflight[key] = task
+        return task
+    
+    async def _fetch(self, key: Tuple[str, str], fetch: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        try:
+            self.upstream_requests += 1
+            data = await fetch()
+            if data is not None:
+                self._entries[key] = (time.monotonic(), data)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return data
+        finally:
+            self._inflight.pop(key, None)
+    
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Weather refresh failed: {task.exception()!r}")
@@ -0,0 +1,85 @@
+import json
+import logging
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Целочисленные коды типов сообщений компактного протокола. Коды только добавляются:
+# клиенты получают таблицу в ответе на hello, но могут держать её у себя
+MESSAGE_TYPES: Dict[str, int] = {
+    "hello": 0,
+    "status": 1,
+    "error": 2,
+    "transcription": 3,
+    "partial_transcription": 4,
+    "response": 5,
+    "response_delta": 6,
+    "response_done": 7,  # больше не отправляется: итог потокового ответа приходит в response
+    "audio_segment": 8,
+    "audio_done": 9,
+    "volume": 10,
+    "vad": 11,
+    "reminders": 12,
+    "text": 13,
+    "control": 14,
+    "audio": 15,
+    "reminder": 16,
+}
+MESSAGE_NAMES: Dict[int, str] = {code: name for name, code in MESSAGE_TYPES.items()}
+
+Frame = Union[str, bytes]
+
+
+class JSONCodec:
+    """Исходный протокол: JSON в текстовых кадрах, аудио — строкой base64"""
+    
+    name = "json"
+    binary = False
+    
+    def encode(self, message: Dict[str, Any]) -> str:
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+    
+    def decode(self, frame: Frame) -> Dict[str, Any]:
+        return json.loads(frame)
+
+
+class MsgPackCodec:
+    """
+    Компактный протокол: сообщение — массив MessagePack [код типа, data] в бинарном
+    кадре, байтовые поля (аудио) передаются как есть. Неизвестный тип уходит строкой.
+    От бинарных кадров JAUD/JVOL отличается первым байтом (0x92 — массив из двух).
+    """
+    
+    name = "msgpack"
+    binary = True
+    
+    def __init__(self):
+        import msgpack
+        
+        self._packer = msgpack.Packer(use_bin_type=True)
+        self._unpackb = msgpack.unpackb
+    
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        msg_type = message.get("type", "")
+        return self._packer.pack([MESSAGE_TYPES.get(msg_type, msg_type), message.get("data")])
+    
+    def decode(self, frame: Frame) -> Dict[str, Any]:
+        code, data = self._unpackb(frame, raw=False)
+        return {"type": MESSAGE_NAMES.get(code, code), "data": data}
+
+
+JSON_CODEC = JSONCodec()
+
+
+def create_codec(protocol: str) -> Optional[Union[JSONCodec, MsgPackCodec]]:
+    """Кодек по имени протокола; None, если протокол неизвестен или msgpack не установлен"""
+    if protocol == JSONCodec.name:
+        return JSON_CODEC
+    if protocol == MsgPackCodec.name:
+        try:
+            return MsgPackCodec()
+        except ImportError:
+            logger.warning("msgpack library not installed, falling back to JSON protocol")
+            return None
+    logger.warning(f"Unknown WebSocket protocol: {protocol}")
+    return None
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк подготовки фразы к распознаванию: прежний путь
+(wave + BytesIO → временный файл → sr.AudioFile → record, плюс копия для Whisper)
+против PCMBuffer (memoryview → sr.AudioData и потоковый WAV для загрузки).
+Меряется время и объём выделенной памяти на одну фразу.
+
+Запуск из корня проекта:
+    python benchmarks/bench_audio_path.py
+"""
+
+import io
+import os
+import sys
+import tempfile
+import timeit
+import tracemalloc
+import wave
+
+import numpy as np
+import speech_recognition as sr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.audio_buffer import PCMBuffer
+
+
+SAMPLE_RATE = 16000
+
+
+def legacy_path(pcm: bytes):
+    wav_buffer = io.BytesIO()
+    with wave.open(wav_buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(pcm)
+    wav_buffer.seek(0)
+    wav_data = wav_buffer.read()
+    
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
+        temp_file.write(wav_data)
+        temp_file.flush()
+        try:
+            with sr.AudioFile(temp_file.name) as source:
+                audio = sr.Recognizer().record(source)
+        finally:
+            os.unlink(temp_file.name)
+    
+    upload = io.BytesIO(wav_data)
+    upload.read()
+    return audio
+
+
+def buffer_path(pcm: bytes):
+    buffer = PCMBuffer.from_audio(pcm, SAMPLE_RATE)
+    audio = buffer.to_audio_data()
+    
+    upload = buffer.wav_file()
+    chunk = bytearray(64 * 1024)
+    while upload.readinto(chunk):
+        pass
+    return audio
+
+
+def allocated_kb(func, pcm: bytes) -> float:
+    tracemalloc.start()
+    func(pcm)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    print("=" * 66)
+    print("Utterance audio path benchmark")
+    print("=" * 66)
+    print(f"{'seconds':>8} {'legacy ms':>10} {'buffer ms':>10} {'legacy KiB':>11} {'buffer KiB':>11} {'speedup':>8}")
+    
+    rng = np.random.default_rng(0)
+    for seconds in (1, 3, 10, 30):
+        pcm = (rng.standard_normal(SAMPLE_RATE * seconds) * 2000).astype(np.int16).tobytes()
+        
+        runs = 50
+        legacy = timeit.timeit(lambda: legacy_path(pcm), number=runs) / runs * 1000
+        buffered = timeit.timeit(lambda: buffer_path(pcm), number=runs) / runs * 1000
+        
+        print(
+            f"{seconds:>8} {legacy:>10.3f} {buffered:>10.3f} "
+            f"{allocated_kb(legacy_path, pcm):>11.0f} {allocated_kb(buffer_path, pcm):>11.0f} "
+            f"{legacy / buffered:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
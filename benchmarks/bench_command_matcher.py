@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк сопоставления команд: автомат CommandMatcher против перебора
+фраз (str.find с тем же правилом выбора) при росте таблицы команд. Точка
+пересечения задаёт CommandMatcher.LINEAR_MAX; в последнем столбце — режим,
+который CommandMatcher выбирает для таблицы такого размера.
+
+Запуск из корня проекта:
+    python benchmarks/bench_command_matcher.py
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.command_matcher import CommandMatcher
+
+
+ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщыэюя"
+
+UTTERANCES = [
+    "привет джарвис как дела",
+    "джарвис какая погода сегодня в москве",
+    "расскажи пожалуйста какой-нибудь интересный анекдот про программистов",
+    "включить свет на кухне",
+    "сколько будет два плюс два",
+]
+
+
+def random_phrase(rng: random.Random) -> str:
+    words = [
+        "".join(rng.choice(ALPHABET) for _ in range(rng.randint(3, 9)))
+        for _ in range(rng.randint(1, 3))
+    ]
+    return " ".join(words)
+
+
+def build_table(size: int) -> dict:
+    rng = random.Random(size)
+    table = {random_phrase(rng): "handler" for _ in range(size - 2)}
+    table["включить свет"] = "light_on"
+    table["привет джарвис"] = "greeting"
+    return table
+
+
+def main():
+    print("=" * 60)
+    print("Command matcher benchmark (µs per utterance)")
+    print("=" * 60)
+    print(f"{'phrases':>8} {'linear':>12} {'automaton':>12} {'speedup':>10}  default")
+    
+    for size in (10, 32, 64, 100, 1000, 5000, 20000):
+        table = build_table(size)
+        matchers = []
+        for linear_max in (size + 1, 0):
+            matcher = CommandMatcher(linear_max=linear_max)
+            for phrase, handler in table.items():
+                matcher.register(phrase, handler)
+            matcher.compile()
+            matchers.append(matcher)
+        
+        runs = 200
+        linear, automaton = (
+            timeit.timeit(lambda: [matcher.match(text) for text in UTTERANCES], number=runs)
+            / (runs * len(UTTERANCES)) * 1e6
+            for matcher in matchers
+        )
+        default = "linear" if size < CommandMatcher.LINEAR_MAX else "automaton"
+        
+        print(f"{size:>8} {linear:>12.2f} {automaton:>12.2f} {linear / automaton:>9.1f}x  {default}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность DSP на одном ядре: измеритель громкости и нормализация
+AudioProcessor (float32 с рабочими буферами) против прежней реализации на float64,
+и полифазный ресемплер в кадрах в секунду.
+
+Запуск из корня проекта:
+    python benchmarks/bench_dsp.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.audio_processing import AudioProcessor
+from backend.services.dsp import PolyphaseResampler
+
+
+FRAME_MS = 20
+
+
+def legacy_volume(audio_data: bytes) -> float:
+    audio_array = np.frombuffer(audio_data, dtype=np.int16)
+    rms = np.sqrt(np.mean(np.square(audio_array.astype(float))))
+    return round(min(100, (rms / 32768.0) * 100), 2)
+
+
+def legacy_normalize(audio_data: bytes) -> bytes:
+    audio_array = np.frombuffer(audio_data, dtype=np.int16)
+    max_val = np.max(np.abs(audio_array))
+    return (audio_array.astype(float) / max_val * 32767).astype(np.int16).tobytes()
+
+
+def frames_per_second(func, frame, runs: int) -> float:
+    return runs / timeit.timeit(lambda: func(frame), number=runs)
+
+
+def main():
+    processor = AudioProcessor(sample_rate=16000)
+    rng = np.random.default_rng(0)
+    
+    print("=" * 60)
+    print(f"DSP throughput, {FRAME_MS} ms frames per second on one core")
+    print("=" * 60)
+    print(f"{'stage':<28} {'legacy':>12} {'float32':>12} {'speedup':>7}")
+    
+    for rate in (16000, 48000):
+        samples = rate * FRAME_MS // 1000
+        frame = (rng.standard_normal(samples) * 3000).astype(np.int16).tobytes()
+        runs = 20000
+        
+        legacy = frames_per_second(legacy_volume, frame, runs)
+        current = frames_per_second(processor.calculate_volume, frame, runs)
+        print(f"{f'volume @ {rate} Hz':<28} {legacy:>12,.0f} {current:>12,.0f} {current / legacy:>6.1f}x")
+        
+        legacy = frames_per_second(legacy_normalize, frame, runs)
+        current = frames_per_second(processor.normalize_audio, frame, runs)
+        print(f"{f'normalize @ {rate} Hz':<28} {legacy:>12,.0f} {current:>12,.0f} {current / legacy:>6.1f}x")
+    
+    print()
+    print(f"{'resampler':<28} {'frames/s':>12} {'x realtime':>12}")
+    for source_rate in (48000, 44100, 22050, 8000):
+        resampler = PolyphaseResampler(source_rate, 16000)
+        samples = source_rate * FRAME_MS // 1000
+        frame = (rng.standard_normal(samples) * 3000).astype(np.int16)
+        runs = 5000
+        fps = frames_per_second(resampler.process, frame, runs)
+        print(f"{f'{source_rate} -> 16000 Hz':<28} {fps:>12,.0f} {fps * FRAME_MS / 1000:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк нечёткого сопоставления намерений на фразах с типичными ошибками
+распознавания речи: доля попаданий, ложные срабатывания и время на фразу.
+
+Запуск из корня проекта:
+    python benchmarks/bench_intent_matcher.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.command_processor import CommandProcessor
+
+
+# (распознанный текст, ожидаемое намерение)
+MISRECOGNIZED = [
+    ("привет джервис", "greeting"),
+    ("привет жарвис", "greeting"),
+    ("привет джарвиз", "greeting"),
+    ("hello jarvi", "greeting"),
+    ("hello jervis", "greeting"),
+    ("включи свет", "light_on"),
+    ("включите свет", "light_on"),
+    ("включить свед", "light_on"),
+    ("turn on the light", "light_on"),
+    ("turn on lights", "light_on"),
+    ("выключи свет", "light_off"),
+    ("выключи свет пожалуйста", "light_off"),
+    ("выключить свед", "light_off"),
+    ("turn of light", "light_off"),
+    ("turn off the light", "light_off"),
+    ("какое сейчас время", "time"),
+    ("какое времени", "time"),
+    ("what time is it", "time"),
+    ("какая погоду", "weather"),
+    ("какая пагода", "weather"),
+    ("what is the weather", "weather"),
+    ("whats the weather", "weather"),
+    ("выключись пожалуйста", "shutdown"),
+    ("выключеись", "shutdown"),
+]
+
+# Фразы, которые должны уйти в GPT
+GPT_QUERIES = [
+    "расскажи анекдот",
+    "сколько будет 2 плюс 2",
+    "который час в токио",
+    "кто такой илон маск",
+    "включи музыку",
+    "что ты умеешь",
+    "какой сегодня день",
+    "привет",
+    "свет",
+    "стол",
+    "переведи на английский слово время",
+    "how are you today",
+    # Длинные вопросы, содержащие слова команд
+    "какая разница между погодой и климатом",
+    "расскажи мне историю про свет и тьму и как выключить их",
+    "what is the capital of weather stations in texas",
+    "how do i turn off the light on my car dashboard",
+    "can you explain how the weather affects mood",
+    "почему в пасмурную погоду болит голова",
+]
+
+
+async def run():
+    processor = CommandProcessor()
+    processor.fuzzy_enabled = True
+    # Без обращения к OpenWeatherMap: измеряется только сопоставление
+    for phrase in ("какая погода", "what's the weather"):
+        processor.register_command(phrase, weather_command)
+    
+    hits = exact = wrong = 0
+    latencies = []
+    
+    print("=" * 70)
+    print("Misrecognized commands")
+    print("=" * 70)
+    for text, expected in MISRECOGNIZED:
+        start = time.perf_counter()
+        result = await processor.process_command_detailed(text)
+        latencies.append(time.perf_counter() - start)
+        
+        status = "MISS"
+        if result.intent == expected:
+            hits += 1
+            status = "fuzzy" if result.fuzzy else "exact"
+            exact += 0 if result.fuzzy else 1
+        elif result.command_type == "predefined":
+            wrong += 1
+            status = "WRONG"
+        print(f"{text:32} -> {str(result.intent):10} score={result.score} [{status}]")
+    
+    false_positives = 0
+    print("\n" + "=" * 70)
+    print("GPT queries (must not match)")
+    print("=" * 70)
+    for text in GPT_QUERIES:
+        start = time.perf_counter()
+        result = await processor.process_command_detailed(text)
+        latencies.append(time.perf_counter() - start)
+        
+        if result.command_type != "gpt":
+            false_positives += 1
+        print(f"{text:32} -> {result.command_type:10} {result.intent or ''}")
+    
+    latencies.sort()
+    print("\n" + "=" * 70)
+    print(f"Hit rate: {hits}/{len(MISRECOGNIZED)} ({hits / len(MISRECOGNIZED):.0%}), exact-only would be {exact}")
+    print(f"Wrong intent: {wrong}, false positives: {false_positives}/{len(GPT_QUERIES)}")
+    print(f"Latency: median {latencies[len(latencies) // 2] * 1e3:.3f} ms, max {latencies[-1] * 1e3:.3f} ms")
+    print("=" * 70)
+
+
+async def weather_command(text: str) -> str:
+    return "weather"
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
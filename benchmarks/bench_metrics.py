@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Накладные расходы инструментирования: стоимость счётчика, наблюдения гистограммы
+и замера блока (Timer) в сравнении с обработкой одного куска аудио на горячем пути,
+процессорное время замеров на одно активное соединение в секунду и время сборки
+текста /metrics.
+
+Доля замера выводится для каждого шага отдельно, включая самый дешёвый (уровни
+громкости) — там она заметна, — и для всего пути куска без ресемплирования
+(уровни + VAD), который проходит каждый 100 мс кусок сырого PCM 16 кГц. Замер
+audio_chunk один на кусок и охватывает весь этот путь, поэтому его доля — строка
+«levels + VAD»; строки отдельных шагов показывают цену замера каждого шага.
+
+Запуск из корня проекта:
+    python benchmarks/bench_metrics.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.audio_processing import AudioProcessor
+from backend.services.dsp import PolyphaseResampler
+from backend.services.metrics import MetricsRegistry
+from backend.services.vad import StreamingVAD
+
+
+RUNS = 200_000
+# Замеров в секунду на активное соединение: куски аудио по 100 мс (audio_chunk)
+# и примерно столько же исходящих кадров (ws_send)
+TIMED_PER_SECOND = 20
+STAGES = [
+    "audio_chunk", "asr_local", "asr_whisper", "command", "llm_first_token", "llm",
+    "tts", "tts_cached", "ws_send", "response",
+]
+
+
+def nanos(stmt, runs: int = RUNS) -> float:
+    return min(timeit.repeat(stmt, number=runs, repeat=3)) / runs * 1e9
+
+
+def main():
+    registry = MetricsRegistry()
+    stages = registry.histogram("bench_stage_duration_seconds", "Stage duration", ["stage"])
+    commands = registry.counter("bench_commands_total", "Commands", ["type"])
+    for stage in STAGES:
+        for value in (0.002, 0.04, 0.3, 1.7):
+            stages.observe(value, stage)
+    
+    resampler = PolyphaseResampler(48000, 16000)
+    chunk = (np.sin(np.arange(4800) / 7) * 8000).astype(np.int16)
+    levels = AudioProcessor()
+    vad = StreamingVAD()
+    # Кусок 100 мс после декодирования: 16 кГц, как на входе распознавания
+    pcm = chunk[:1600].tobytes()
+    
+    def chunk_path():
+        levels.measure_levels(pcm)
+        vad.feed(pcm)
+    
+    def timed_block():
+        with stages.time("ws_send"):
+            pass
+    
+    rows = [
+        ("empty call", nanos(lambda: None)),
+        ("counter inc", nanos(lambda: commands.inc("gpt"))),
+        ("histogram observe", nanos(lambda: stages.observe(0.012, "ws_send"))),
+        ("timer block", nanos(timed_block)),
+    ]
+    hot_path = [
+        ("levels of 100 ms chunk", nanos(lambda: levels.measure_levels(chunk.tobytes()), runs=20_000)),
+        ("levels + VAD, 100 ms chunk", nanos(chunk_path, runs=20_000)),
+        ("resample 100 ms chunk", nanos(lambda: resampler.process(chunk), runs=2_000)),
+    ]
+    
+    print("=" * 64)
+    print("Instrumentation overhead (lower is better)")
+    print("=" * 64)
+    for name, cost in rows:
+        print(f"{name:<28} {cost:>10.0f} ns")
+    
+    timer = rows[-1][1] - rows[0][1]
+    print()
+    for name, cost in hot_path:
+        print(f"{name:<28} {cost:>10.0f} ns  timer adds {timer / cost:>6.1%}")
+    
+    per_second = timer * TIMED_PER_SECOND / 1e3
+    print(f"{'per connection':<28} {per_second:>10.1f} us/s  ({per_second / 1e6:.4%} of a core)")
+    
+    render = timeit.timeit(registry.render, number=200) / 200 * 1e6
+    print()
+    print(f"{'render /metrics':<28} {render:>10.1f} us ({len(STAGES)} stages)")
+
+
+if __name__ == "__main__":
+    main()
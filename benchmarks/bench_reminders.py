@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Планировщик напоминаний на 100 000 ожидающих: загрузка кучи из SQLite при старте,
+стоимость планирования одного напоминания (O(log n)), страница списка владельца
+и доставка пачки просроченных напоминаний подключённым владельцам одной спящей задачей.
+Отдельно — воркер с фильтром accepts: в куче только напоминания подключённых к нему
+владельцев, чужие announce отбрасываются.
+
+Запуск из корня проекта:
+    python benchmarks/bench_reminders.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.reminders import ReminderScheduler, ReminderStore
+
+
+PENDING = 100_000
+OWNERS = 1_000
+BURST = 10_000
+CONNECTED = 10
+
+
+def seed(path: str):
+    """Заполняет базу напрямую: через API каждое добавление — отдельный запрос в пуле потоков"""
+    store = ReminderStore(path)
+    store._locked(lambda: None)
+    now = time.time()
+    rows = [(f"client-{i % OWNERS}", f"reminder {i}", now, now + 3600 + i) for i in range(PENDING)]
+    rows += [(f"client-{i % OWNERS}", f"overdue {i}", now, now - 1) for i in range(BURST)]
+    with store._db:
+        store._db.executemany("INSERT INTO reminders (owner, text, created_at, due_at) VALUES (?, ?, ?, ?)", rows)
+    store._close_sync()
+
+
+async def main():
+    path = os.path.join(tempfile.mkdtemp(), "reminders.db")
+    seed(path)
+    
+    print("=" * 64)
+    print(f"Reminder scheduler benchmark: {PENDING} pending + {BURST} overdue")
+    print("=" * 64)
+    
+    fired = asyncio.Event()
+    delivered = 0
+    
+    async def handler(owner):
+        # Все владельцы подключены: каждый забирает свои наступившие напоминания
+        nonlocal delivered
+        reminders = await scheduler.claim_due(owner)
+        delivered += len(reminders)
+        if delivered == BURST:
+            fired.set()
+    
+    scheduler = ReminderScheduler(ReminderStore(path))
+    started = time.perf_counter()
+    await scheduler.start(handler)
+    print(f"{'load heap on start':<32} {(time.perf_counter() - started) * 1000:>10.1f} ms")
+    
+    started = time.perf_counter()
+    await fired.wait()
+    print(f"{'fire overdue burst':<32} {(time.perf_counter() - started) * 1000:>10.1f} ms ({BURST} reminders)")
+    
+    runs = 100_000
+    due = time.time() + 7200
+    started = time.perf_counter()
+    for i in range(runs):
+        scheduler.schedule(due + i, -i, "bench")
+    print(f"{'schedule (heap push)':<32} {(time.perf_counter() - started) / runs * 1e6:>10.2f} us (heap {len(scheduler._heap)})")
+    
+    runs = 200
+    started = time.perf_counter()
+    for i in range(runs):
+        await scheduler.add(f"client-{i}", "bench", None)
+    print(f"{'add (SQLite insert)':<32} {(time.perf_counter() - started) / runs * 1e6:>10.2f} us")
+    
+    started = time.perf_counter()
+    cursor, pages = 0, 0
+    while cursor is not None:
+        _, cursor = await scheduler.page("client-7", 20, cursor)
+        pages += 1
+    print(f"{'page owner listing':<32} {(time.perf_counter() - started) / pages * 1e6:>10.2f} us ({pages} pages)")
+    
+    await scheduler.close()
+    
+    # Воркер, к которому подключено CONNECTED владельцев из OWNERS
+    connected = {f"client-{i}" for i in range(CONNECTED)}
+    scheduler = ReminderScheduler(ReminderStore(path))
+    await scheduler.start(None, accepts=connected.__contains__)
+    started = time.perf_counter()
+    for owner in connected:
+        await scheduler.watch(owner)
+    print(f"{'watch on connect':<32} {(time.perf_counter() - started) / CONNECTED * 1e6:>10.2f} us (heap {len(scheduler._heap)})")
+    
+    runs = 100_000
+    started = time.perf_counter()
+    for i in range(runs):
+        scheduler.schedule(due + i, PENDING * 2 + i, f"client-{i % OWNERS}")
+    print(f"{'announce (filtered schedule)':<32} {(time.perf_counter() - started) / runs * 1e6:>10.2f} us (heap {len(scheduler._heap)})")
+    await scheduler.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Протоколы WebSocket: байты на проводе и время кодирования/декодирования одного
+сообщения для JSON (аудио строкой base64 в data URI) и MessagePack (целые коды
+типов, аудио сырыми байтами). Набор сообщений повторяет типичный голосовой ход.
+
+Запуск из корня проекта (нужен пакет msgpack):
+    python benchmarks/bench_ws_codec.py
+"""
+
+import base64
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.ws_codec import JSONCodec, MsgPackCodec
+
+
+AUDIO = os.urandom(24 * 1024)
+
+
+def sample_messages(binary: bool):
+    audio = AUDIO if binary else f"data:audio/mpeg;base64,{base64.b64encode(AUDIO).decode('utf-8')}"
+    return [
+        ("volume", {"type": "volume", "data": {"volume": 17.19, "peak": 24.41}}),
+        ("partial_transcription", {"type": "partial_transcription", "data": {"text": "какая сегодня пог"}}),
+        ("status", {"type": "status", "data": {"status": "processing", "message": "Обрабатываю команду..."}}),
+        ("response_delta", {"type": "response_delta", "data": {"text": " градусов"}}),
+        ("response", {"type": "response", "data": {
+            "text": "В Москве сейчас плюс пять градусов, облачно.",
+            "command_type": "weather",
+            "intent": "weather",
+            "intent_score": 1.0,
+            "segmented": False,
+            "timestamp": "2026-10-18T12:00:00.000000",
+            "response_id": "2b7f90b2dc914d1695c81b3476d0ddb2",
+            "audio": audio,
+        }}),
+    ]
+
+
+def micros(func, arg, runs: int) -> float:
+    return timeit.timeit(lambda: func(arg), number=runs) / runs * 1e6
+
+
+def main():
+    codecs = [JSONCodec(), MsgPackCodec()]
+    
+    print("=" * 84)
+    print("WebSocket codec benchmark: bytes on the wire and CPU per message")
+    print("=" * 84)
+    print(f"{'message':<22} {'codec':<8} {'bytes':>8} {'encode us':>10} {'decode us':>10} {'size':>7}")
+    
+    totals = {codec.name: 0 for codec in codecs}
+    for index in range(len(sample_messages(False))):
+        baseline = None
+        for codec in codecs:
+            name, message = sample_messages(codec.binary)[index]
+            frame = codec.encode(message)
+            size = len(frame.encode("utf-8")) if isinstance(frame, str) else len(frame)
+            totals[codec.name] += size
+            baseline = baseline or size
+            
+            runs = 200 if name == "response" else 20000
+            encode = micros(codec.encode, message, runs)
+            decode = micros(codec.decode, frame, runs)
+            print(f"{name:<22} {codec.name:<8} {size:>8} {encode:>10.2f} {decode:>10.2f} {size / baseline:>6.0%}")
+    
+    print()
+    for name, total in totals.items():
+        print(f"{'voice turn total':<22} {name:<8} {total:>8}")
+
+
+if __name__ == "__main__":
+    main()
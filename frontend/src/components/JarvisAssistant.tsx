@@ -13,6 +13,17 @@ interface CommandHistoryItem {
 }
 
 const WS_URL = import.meta.env.VITE_WS_URL || 'ws://localhost:8000';
+const OWNER_ID_KEY = 'jarvis_owner_id';
+
+// Постоянный id устройства для напоминаний; client_id меняется при каждой загрузке
+const getOwnerId = (): string => {
+  let ownerId = localStorage.getItem(OWNER_ID_KEY);
+  if (!ownerId) {
+    ownerId = `owner_${Date.now()}_${Math.random().toString(36).slice(2, 10)}`;
+    localStorage.setItem(OWNER_ID_KEY, ownerId);
+  }
+  return ownerId;
+};
 
 export const JarvisAssistant: React.FC = () => {
   const [isConnected, setIsConnected] = useState(false);
@@ -69,7 +80,7 @@ export const JarvisAssistant: React.FC = () => {
   const initializeWebSocket = async () => {
     try {
       const clientId = `client_${Date.now()}`;
-      wsClientRef.current = new WebSocketClient(WS_URL, clientId);
+      wsClientRef.current = new WebSocketClient(WS_URL, clientId, getOwnerId());
 
       await wsClientRef.current.connect({
         onConnect: () => {
@@ -1,5 +1,5 @@
 export interface WebSocketMessage {
-  type: 'audio' | 'text' | 'control' | 'transcription' | 'response' | 'status' | 'volume' | 'error' | 'reminders';
+  type: 'audio' | 'text' | 'control' | 'transcription' | 'response' | 'status' | 'volume' | 'error' | 'reminders' | 'reminder';
   data: any;
 }
 
@@ -11,28 +11,33 @@ export interface WebSocketCallbacks {
   onError?: (error: string) => void;
   onConnect?: () => void;
   onDisconnect?: () => void;
-  onReminders?: (reminders: any[]) => void;
+  onReminders?: (reminders: any[], nextCursor: number | null) => void;
+  onReminder?: (reminder: any) => void;
 }
 
 export class WebSocketClient {
   private ws: WebSocket | null = null;
   private clientId: string;
+  private ownerId: string | null;
   private callbacks: WebSocketCallbacks = {};
   private reconnectAttempts = 0;
   private maxReconnectAttempts = 5;
   private reconnectTimeout = 3000;
   private url: string;
 
-  constructor(url: string, clientId: string) {
+  constructor(url: string, clientId: string, ownerId: string | null = null) {
     this.url = url;
     this.clientId = clientId;
+    // Постоянный id устройства: напоминания переживают перезагрузку страницы
+    this.ownerId = ownerId;
   }
 
   connect(callbacks: WebSocketCallbacks): Promise<void> {
     return new Promise((resolve, reject) => {
       try {
         this.callbacks = callbacks;
-        const wsUrl = `${this.url}/ws/${this.clientId}`;
+        const query = this.ownerId ? `?owner=${encodeURIComponent(this.ownerId)}` : '';
+        const wsUrl = `${this.url}/ws/${this.clientId}${query}`;
         
         console.log(`Connecting to WebSocket: ${wsUrl}`);
         this.ws = new WebSocket(wsUrl);
@@ -113,7 +118,13 @@ export class WebSocketClient {
 
       case 'reminders':
         if (this.callbacks.onReminders) {
-          this.callbacks.onReminders(message.data.reminders);
+          this.callbacks.onReminders(message.data.reminders, message.data.next_cursor);
+        }
+        break;
+
+      case 'reminder':
+        if (this.callbacks.onReminder) {
+          this.callbacks.onReminder(message.data);
         }
         break;
     }
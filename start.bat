@@ -34,7 +34,7 @@ if errorlevel 1 (
 
 echo.
 echo Starting Backend...
-start "Jarvis Backend" cmd /k python -m backend.main
+start "Jarvis Backend" cmd /k python -m backend.server
 
 timeout /t 3 /nobreak >nul
 
@@ -31,7 +31,7 @@ fi
 # Start Backend
 echo ""
 echo "🚀 Starting Backend..."
-python3 -m backend.main &
+python3 -m backend.server &
 BACKEND_PID=$!
 echo "Backend started with PID: $BACKEND_PID"
 
@@ -0,0 +1,180 @@
+"""
+Тесты бэкендов общего состояния: SQLite во временном каталоге и Redis на fakeredis.
+
+Запуск из корня проекта (нужны pytest и fakeredis):
+    python -m pytest -q tests
+"""
+
+import asyncio
+import json
+import sqlite3
+import time
+
+import pytest
+
+from backend.services import state_backend
+from backend.services.state_backend import MemoryStateBackend, RedisStateBackend, SQLiteStateBackend, worker_id
+
+
+def message(role: str, content: str):
+    return {"role": role, "content": content}
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+# --- SQLite ---
+
+def insert_broadcast(path: str, origin: str, payload: dict, client_id=None):
+    """Сообщение рассылки от другого воркера, записанное в обход бэкенда"""
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute(
+        "INSERT INTO broadcasts (origin, client_id, payload, created) VALUES (?, ?, ?, ?)",
+        (origin, client_id, json.dumps(payload), time.time()),
+    )
+    db.close()
+
+
+def test_sqlite_broadcast_poll_advances_cursor(tmp_path):
+    path = str(tmp_path / "state.db")
+    
+    async def scenario():
+        received = []
+        
+        async def handler(msg, client_id):
+            received.append((msg, client_id))
+        
+        # Создаёт схему; рассылка до старта воркера ему не доставляется
+        setup = SQLiteStateBackend(path)
+        await setup.stats()
+        await setup.close()
+        insert_broadcast(path, "other:1", {"n": "old"})
+        
+        backend = SQLiteStateBackend(path, poll_interval=0.01)
+        await backend.start(handler)
+        try:
+            insert_broadcast(path, "other:1", {"n": 1})
+            insert_broadcast(path, "other:2", {"n": 2}, client_id="c1")
+            # Свою рассылку воркер уже доставил при publish, из таблицы она не читается
+            insert_broadcast(path, worker_id(), {"n": "own"})
+            await wait_for(lambda: len(received) >= 2)
+            
+            await backend.publish({"n": 3})
+            await asyncio.sleep(0.1)
+        finally:
+            await backend.close()
+        return received
+    
+    received = asyncio.run(scenario())
+    assert received == [({"n": 1}, None), ({"n": 2}, "c1"), ({"n": 3}, None)]
+
+
+def test_sqlite_append_trims_and_stats(tmp_path):
+    path = str(tmp_path / "state.db")
+    
+    async def scenario():
+        backend = SQLiteStateBackend(path, max_messages=4)
+        for i in range(3):
+            await backend.append_history("s1", [message("user", f"q{i}"), message("assistant", f"a{i}")])
+        await backend.append_history("s2", [message("user", "hi")])
+        await backend.register_connection("c1")
+        history = await backend.history("s1")
+        stats = await backend.stats()
+        await backend.close()
+        return history, stats
+    
+    history, stats = asyncio.run(scenario())
+    assert [item["content"] for item in history] == ["q1", "a1", "q2", "a2"]
+    assert stats == {"backend": "sqlite", "sessions": 2, "messages": 5, "connections": 1}
+
+
+def test_sqlite_trims_by_bytes(tmp_path):
+    async def scenario():
+        backend = SQLiteStateBackend(str(tmp_path / "state.db"), max_session_bytes=450)
+        for i in range(5):
+            await backend.append_history("s1", [message("user", f"{i}" * 100)])
+        history = await backend.history("s1")
+        await backend.close()
+        return history
+    
+    history = asyncio.run(scenario())
+    assert [item["content"][0] for item in history] == ["3", "4"]
+
+
+# --- Redis ---
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def redis_backend(server, **limits) -> RedisStateBackend:
+    client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    return RedisStateBackend(prefix="test", client=client, **limits)
+
+
+def test_redis_append_retries_on_watch_conflict(monkeypatch):
+    server = fakeredis.FakeServer()
+    other_worker = fakeredis.FakeRedis(server=server, decode_responses=True)
+    calls = []
+    overflow = state_backend.history_overflow
+    
+    def conflicting_overflow(messages, max_messages, max_bytes):
+        if len(calls) == 1:
+            # Другой воркер дописывает историю между WATCH и EXEC
+            other_worker.rpush("test:history:s1", json.dumps(message("user", "other")))
+        calls.append(len(messages))
+        return overflow(messages, max_messages, max_bytes)
+    
+    monkeypatch.setattr(state_backend, "history_overflow", conflicting_overflow)
+    
+    async def scenario():
+        backend = redis_backend(server, max_messages=3)
+        await backend.append_history("s1", [message("user", "q0"), message("assistant", "a0")])
+        await backend.append_history("s1", [message("user", "q1"), message("assistant", "a1")])
+        return await backend.history("s1")
+    
+    history = asyncio.run(scenario())
+    # Первая попытка второго добавления сорвалась на WATCH, повтор увидел сообщение другого воркера
+    assert calls == [2, 4, 5]
+    assert [item["content"] for item in history] == ["other", "q1", "a1"]
+
+
+def test_redis_trims_by_bytes():
+    async def scenario():
+        backend = redis_backend(fakeredis.FakeServer(), max_session_bytes=450)
+        for i in range(5):
+            await backend.append_history("s1", [message("user", f"{i}" * 100)])
+        return await backend.history("s1")
+    
+    history = asyncio.run(scenario())
+    assert [item["content"][0] for item in history] == ["3", "4"]
+
+
+def test_redis_stats_match_memory_backend():
+    sessions = {
+        "s1": [message("user", "привет"), message("assistant", "Здравствуйте!")],
+        "s2": [message("user", "который час")],
+    }
+    
+    async def scenario():
+        redis = redis_backend(fakeredis.FakeServer())
+        memory = MemoryStateBackend()
+        for backend in (redis, memory):
+            for session_id, messages in sessions.items():
+                await backend.append_history(session_id, messages)
+            await backend.register_connection("c1")
+        return await redis.stats(), await memory.stats()
+    
+    redis_stats, memory_stats = asyncio.run(scenario())
+    assert redis_stats == {
+        "backend": "redis",
+        "sessions": memory_stats["sessions"],
+        "messages": memory_stats["messages"],
+        "bytes": memory_stats["bytes"],
+        "connections": 1,
+    }
+    assert redis_stats["sessions"] == 2 and redis_stats["messages"] == 3